@@ -1,3 +1,71 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
 
-# Create your tests here.
+from listings import inbox
+from listings.models import Contact, RealtorStats
+from listings.tests import FreshCacheTestCase, make_listing, make_realtor
+
+
+class InboxTests(FreshCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.realtor = make_realtor(email="kyle@example.com")
+        self.other = make_realtor(name="Jenny Johnson", email="jenny@example.com")
+        self.contacts = [self.inquire(self.realtor) for _ in range(3)]
+        self.other_contact = self.inquire(self.other)
+        self.user = User.objects.create_user("kyle", "kyle@example.com", "password")
+        self.realtor.user = self.user
+        self.realtor.save(update_fields=["user"])
+        self.client.force_login(self.user)
+
+    def inquire(self, realtor):
+        listing = make_listing(realtor)
+        return Contact.objects.create(
+            listing=listing, realtor=realtor, name="Ann", email="ann@example.com",
+            phone="555", message="Visit?",
+        )
+
+    def unread(self, realtor):
+        return RealtorStats.objects.get(pk=realtor.pk).unread_contacts
+
+    def test_inquiries_are_counted_in_and_out(self):
+        self.assertEqual(self.unread(self.realtor), 3)
+        self.contacts[0].delete()
+        self.assertEqual(self.unread(self.realtor), 2)
+        response = self.client.get(reverse("inbox"))
+        self.assertEqual(response.context["unread"], 2)
+        self.assertEqual(len(response.context["contacts"]), 2)
+
+    def test_marking_read_counts_only_unread_inquiries_once(self):
+        posted = {"contact": [self.contacts[0].pk, self.contacts[1].pk], "next": reverse("inbox")}
+        response = self.client.post(reverse("inbox_read"), posted)
+        self.assertRedirects(response, reverse("inbox"))
+        self.assertEqual(self.unread(self.realtor), 1)
+        # already read
+        self.client.post(reverse("inbox_read"), posted)
+        self.assertEqual(self.unread(self.realtor), 1)
+        # read inquiries leave the counter alone when deleted
+        Contact.objects.get(pk=self.contacts[0].pk).delete()
+        self.assertEqual(self.unread(self.realtor), 1)
+
+    def test_realtors_only_mark_their_own_inquiries(self):
+        self.client.post(reverse("inbox_read"), {"contact": [self.other_contact.pk]})
+        self.assertEqual(self.unread(self.other), 1)
+        self.other_contact.refresh_from_db()
+        self.assertFalse(self.other_contact.is_read)
+
+    def test_a_matching_email_alone_opens_no_inbox(self):
+        # anyone can register with the email shown on a realtor's profile
+        impostor = User.objects.create_user("jenny", "Jenny@example.com", "password")
+        self.client.force_login(impostor)
+        self.assertEqual(self.client.get(reverse("inbox")).status_code, 403)
+        response = self.client.post(reverse("inbox_read"), {"contact": [self.other_contact.pk]})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.unread(self.other), 1)
+
+    def test_recount_repairs_the_counters(self):
+        RealtorStats.objects.update(unread_contacts=10)
+        self.assertEqual(inbox.recount(), 4)
+        self.assertEqual(self.unread(self.realtor), 3)
+        self.assertEqual(self.unread(self.other), 1)
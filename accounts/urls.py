@@ -3,6 +3,14 @@ from . import views
 
 urlpatterns = [
     path("dashboard/", views.dashboard, name="dashboard"),
+    path("dashboard/inbox/", views.inbox, name="inbox"),
+    path("dashboard/inbox/read/", views.mark_read, name="inbox_read"),
+    path("dashboard/searches/", views.save_search, name="save_search"),
+    path(
+        "dashboard/searches/<int:search_id>/delete/",
+        views.delete_saved_search,
+        name="delete_saved_search",
+    ),
     path("login/", views.login, name="login"),
     path("logout/", views.logout, name="logout"),
     path("register/", views.register, name="register"),
@@ -1,8 +1,26 @@
+from urllib.parse import urlencode
+
 from django.shortcuts import redirect, render
 from django.contrib import auth
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
 from django.contrib import messages
+from django.db.models import Sum
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils.dateparse import parse_date
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
+
+from listings import inbox as inboxes
+from listings import alerts
+from listings.models import Contact, Realtor, RealtorStats, SavedSearch
+from listings.pagination import keyset_page
+from listings.search import canonical_key, canonical_query, normalize_params
+
+
+MAX_SAVED_SEARCHES = 20
 
 # Create your views here.
 def login(request):
@@ -72,6 +90,157 @@ def register(request):
             
     return render(request, "accounts/register.html")
 
+def realtor_of(user):
+    """The realtor staff linked to the user's account, whose inbox they read."""
+    return Realtor.objects.select_related("stats").filter(user=user).first()
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _date(value):
+    try:
+        return parse_date(value or "")
+    except ValueError:
+        return None
+
+
 @login_required
 def dashboard(request):
-    return render(request, "accounts/dashboard.html")
\ No newline at end of file
+    realtor = realtor_of(request.user)
+    unread = None
+    if realtor is not None and hasattr(realtor, "stats"):
+        unread = realtor.stats.unread_contacts
+    elif request.user.is_staff:
+        unread = RealtorStats.objects.aggregate(unread=Sum("unread_contacts"))["unread"] or 0
+    saved_searches = list(request.user.saved_searches.order_by("-created_at"))
+    for saved in saved_searches:
+        saved.url = f"{reverse('search')}?{canonical_query(saved.params)}"
+    return render(request, "accounts/dashboard.html", {
+        "realtor": realtor,
+        "unread": unread,
+        "saved_searches": saved_searches,
+    })
+
+
+@login_required
+def inbox(request):
+    """
+    Contact inquiries of the realtor with the user's email, newest first;
+    staff see everyone's or one realtor's (?realtor=). Filtered by
+    ?listing=, ?unread=1 and ?since=/?until= dates.
+    """
+    realtor = realtor_of(request.user)
+    if request.user.is_staff:
+        realtor_id = _int(request.GET.get("realtor"))
+        realtor = (
+            Realtor.objects.select_related("stats").filter(pk=realtor_id).first()
+            if realtor_id
+            else None
+        )
+    elif realtor is None:
+        raise PermissionDenied("Only realtors have an inbox")
+
+    filters = {
+        "listing": _int(request.GET.get("listing")),
+        "unread": request.GET.get("unread") == "1",
+        "since": _date(request.GET.get("since")),
+        "until": _date(request.GET.get("until")),
+    }
+    page = keyset_page(
+        inboxes.inquiries(realtor, **filters),
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+        per_page=inboxes.PER_PAGE,
+        field="contact_date",
+    )
+    if realtor is not None:
+        unread = realtor.stats.unread_contacts if hasattr(realtor, "stats") else 0
+    else:
+        unread = RealtorStats.objects.aggregate(unread=Sum("unread_contacts"))["unread"] or 0
+    listing_unread = None
+    if filters["listing"]:
+        # a range of the (listing, contact_date) index, small per listing
+        listing_unread = inboxes.inquiries(realtor, listing=filters["listing"], unread=True).count()
+
+    # the filters again, for the pagination links
+    query = urlencode({
+        name: value
+        for name, value in {
+            "realtor": realtor.pk if request.user.is_staff and realtor else None,
+            "listing": filters["listing"],
+            "unread": "1" if filters["unread"] else None,
+            "since": filters["since"],
+            "until": filters["until"],
+        }.items()
+        if value
+    })
+    return render(request, "accounts/inbox.html", {
+        "realtor": realtor,
+        "contacts": page.object_list,
+        "page": page,
+        "filters": filters,
+        "query": query,
+        "unread": unread,
+        "listing_unread": listing_unread,
+        "realtors": Realtor.objects.order_by("name").only("name") if request.user.is_staff else None,
+    })
+
+
+@login_required
+@require_POST
+def mark_read(request):
+    contacts = Contact.objects.filter(
+        pk__in=[pk for pk in map(_int, request.POST.getlist("contact")) if pk is not None]
+    )
+    if not request.user.is_staff:
+        realtor = realtor_of(request.user)
+        if realtor is None:
+            raise PermissionDenied("Only realtors have an inbox")
+        contacts = contacts.filter(realtor=realtor)
+    marked = inboxes.mark_read(contacts)
+    messages.success(request, f"{marked} inquir{'y' if marked == 1 else 'ies'} marked as read")
+    next_url = request.POST.get("next", "")
+    if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect("inbox")
+
+
+@login_required
+@require_POST
+def save_search(request):
+    """Save the search of the results page (its canonical ``query``) for alerts."""
+    params = normalize_params(QueryDict(request.POST.get("query", "")))
+    search_url = f"{reverse('search')}?{canonical_query(params)}"
+    if not params:
+        messages.error(request, "Add some criteria before saving a search")
+        return redirect(search_url)
+    if request.user.saved_searches.count() >= MAX_SAVED_SEARCHES:
+        messages.error(request, f"You can save up to {MAX_SAVED_SEARCHES} searches")
+        return redirect(search_url)
+    _, created = SavedSearch.objects.get_or_create(
+        user=request.user,
+        key=canonical_key(params),
+        defaults={
+            "params": params,
+            "name": request.POST.get("name", "").strip()[:100],
+            "last_listing_id": alerts.newest_listing_id(),
+        },
+    )
+    if created:
+        messages.success(request, "Search saved, new listings matching it will be emailed to you")
+    else:
+        messages.info(request, "You already saved this search")
+    return redirect(search_url)
+
+
+@login_required
+@require_POST
+def delete_saved_search(request, search_id):
+    SavedSearch.objects.filter(pk=search_id, user=request.user).delete()
+    messages.success(request, "Saved search deleted")
+    return redirect("dashboard")
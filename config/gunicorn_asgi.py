@@ -0,0 +1,23 @@
+"""
+gunicorn settings for the ASGI application (config.asgi) on uvicorn workers:
+
+    gunicorn -c config/gunicorn_asgi.py config.asgi:application
+
+Each worker runs an event loop, so a slow client or a request waiting on
+the database doesn't hold the process: one worker per core is enough.
+For a single process without gunicorn:
+
+    uvicorn config.asgi:application --host 0.0.0.0 --port 8000
+"""
+import multiprocessing
+import os
+
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
+max_requests = 5000
+max_requests_jitter = 500
@@ -0,0 +1,19 @@
+"""
+gunicorn settings for the WSGI application (config.wsgi):
+
+    gunicorn -c config/gunicorn_wsgi.py config.wsgi:application
+
+Sync workers: one request per process at a time, so size the pool from the
+CPU count and keep it behind a buffering proxy.
+"""
+import multiprocessing
+import os
+
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "sync"
+timeout = 30
+graceful_timeout = 30
+max_requests = 5000
+max_requests_jitter = 500
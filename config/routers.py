@@ -0,0 +1,79 @@
+"""
+Database routing for read replicas.
+
+Reads of listings and realtors, the bulk of the traffic, go to a random
+``replica_*`` alias from ``settings.DATABASES`` (see the DB_REPLICA_HOSTS
+variable); everything else, and every write, goes to "default". Once a
+request (or command) has written anything its reads stay on the primary, so
+it never reads its own write back from a lagging replica; the signal
+handlers that re-read a saved listing rely on that. ``pin_middleware``
+starts every request unpinned.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICATED_MODELS = {("listings", "listing"), ("listings", "realtor")}
+
+_pinned = ContextVar("pinned_to_primary", default=False)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias.startswith("replica")]
+
+
+def pin_to_primary():
+    _pinned.set(True)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if (model._meta.app_label, model._meta.model_name) not in REPLICATED_MODELS:
+            return None
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        aliases = replicas()
+        return random.choice(aliases) if aliases else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def pin_middleware(get_response):
+    """Reset the primary pin at the start of every request."""
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            token = _pinned.set(False)
+            try:
+                return await get_response(request)
+            finally:
+                _pinned.reset(token)
+
+        return markcoroutinefunction(middleware)
+
+    def middleware(request):
+        token = _pinned.set(False)
+        try:
+            return get_response(request)
+        finally:
+            _pinned.reset(token)
+
+    return middleware
+
+
+pin_middleware.sync_capable = True
+pin_middleware.async_capable = True
@@ -45,7 +45,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "listings.instrumentation.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
+    "config.routers.pin_middleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -58,10 +60,20 @@ ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "listings.instrumentation.TimedDjangoTemplates",
         "DIRS": [os.path.join(BASE_DIR, "templates")],
-        "APP_DIRS": True,
         "OPTIONS": {
+            # compiled templates are kept per process; with DEBUG the cached
+            # loader still picks up edited files (the autoreloader resets it)
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
@@ -78,22 +90,112 @@ WSGI_APPLICATION = "config.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE picks the backend: "sqlite" (the default) or "postgresql", configured
+# by the DB_* variables. DB_CONN_MAX_AGE keeps connections open between requests
+# (seconds, 0 closes them after each request); with PostgreSQL, DB_POOL_SIZE > 0
+# uses a psycopg connection pool per process instead. DB_REPLICA_HOSTS adds
+# read replicas of the primary, see config/routers.py
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", 60))
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 0))
+
+if DB_ENGINE == "postgresql":
+    POSTGRES = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("DB_NAME", "realestate_db"),
+        "USER": os.environ.get("DB_USER", "yahia"),
+        "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+        "HOST": os.environ.get("DB_HOST", "localhost"),
+        "PORT": os.environ.get("DB_PORT", "5432"),
+        "CONN_MAX_AGE": CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
+    }
+    if DB_POOL_SIZE:
+        # pooled connections are returned to the pool, not kept by the request
+        POSTGRES["CONN_MAX_AGE"] = 0
+        POSTGRES["OPTIONS"]["pool"] = {
+            "min_size": min(2, DB_POOL_SIZE),
+            "max_size": DB_POOL_SIZE,
+            "timeout": 10,
+        }
+    DATABASES = {"default": POSTGRES}
+    replica_hosts = os.environ.get("DB_REPLICA_HOSTS", "")
+    for number, host in enumerate(filter(None, replica_hosts.split(",")), 1):
+        host, _, port = host.strip().partition(":")
+        DATABASES[f"replica_{number}"] = {
+            **POSTGRES,
+            "HOST": host,
+            "PORT": port or POSTGRES["PORT"],
+            "TEST": {"MIRROR": "default"},
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("DB_NAME", BASE_DIR / "db.sqlite3"),
+            "CONN_MAX_AGE": CONN_MAX_AGE,
+            "OPTIONS": {
+                # WAL lets readers carry on while one connection writes;
+                # synchronous=NORMAL only fsyncs at checkpoints in WAL mode
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    "PRAGMA synchronous=NORMAL;"
+                    "PRAGMA busy_timeout=5000;"
+                    "PRAGMA mmap_size=268435456;"
+                    "PRAGMA cache_size=-20000;"
+                    "PRAGMA temp_store=MEMORY;"
+                ),
+                # take the write lock when the transaction starts: a deferred
+                # transaction upgrading its read lock fails at once with
+                # "database is locked" instead of waiting busy_timeout
+                "transaction_mode": "IMMEDIATE",
+            },
+        }
+    }
+
+DATABASE_ROUTERS = ["config.routers.ReplicaRouter"]
+
+# CACHES
+# "default" is shared by every worker (Redis if REDIS_URL is set, the filesystem
+# otherwise) and holds the listing version numbers; "fragments" puts a
+# per-process LRU in front of it for rendered template fragments
+if os.environ.get("REDIS_URL"):
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["REDIS_URL"],
     }
+else:
+    # shared by every worker process, which locmem isn't. Counting the files
+    # lists the whole directory, ~70 ms per set at 20,000 files with Django's
+    # FileBasedCache, so listings.cache.FileCache counts them every
+    # CULL_EVERY sets only (~1 ms per set at any size); past MAX_ENTRIES a
+    # cull deletes a random 1/CULL_FREQUENCY of them, dropping live fragments
+    # that are re-rendered on their next request
+    SHARED_CACHE = {
+        "BACKEND": "listings.cache.FileCache",
+        "LOCATION": BASE_DIR / ".cache",
+        "OPTIONS": {"MAX_ENTRIES": 50000, "CULL_FREQUENCY": 4, "CULL_EVERY": 200},
+    }
+
+CACHES = {
+    "default": SHARED_CACHE,
+    "fragments": {
+        "BACKEND": "listings.cache.TwoTierCache",
+        # names the per-process tier, see listings.cache
+        "LOCATION": "fragments",
+        "TIMEOUT": None,
+        "OPTIONS": {"SHARED": "default", "MAX_BYTES": 16 * 1024 * 1024},
+    },
+    # listing cards: cheap to render, so a miss renders at once without the
+    # cross-worker lock, see partials/__listing_card.html
+    "cards": {
+        "BACKEND": "listings.cache.TwoTierCache",
+        "LOCATION": "cards",
+        "TIMEOUT": None,
+        "OPTIONS": {"SHARED": "default", "MAX_BYTES": 8 * 1024 * 1024, "LOCK": False},
+    },
 }
-# DATABASES = {
-#     "default": {
-#         "ENGINE": "django.db.backends.postgresql",
-#         "NAME":"realestate_db",
-#         "USER":"yahia",
-#         "PASSWORD":"system",
-#         "HOST":"localhost",
-#         "PORT":"5432",
-#     }
-# }
 
 STORAGES = {
     "staticfiles": {
@@ -153,13 +255,21 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
 # EMAILING VARIBLBES
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
-EMAIL_HOST = "smtp.gmail.com"
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+# contact emails go through the outbox (manage.py send_outbox); for local runs
+# point it at the console/locmem backend or an aiosmtpd stand-in:
+#   python -m aiosmtpd -n -l localhost:1025
+#   EMAIL_HOST=localhost EMAIL_PORT=1025 EMAIL_USE_TLS=0 python manage.py send_outbox
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
+EMAIL_HOST = os.environ.get("EMAIL_HOST", "smtp.gmail.com")
+EMAIL_PORT = int(os.environ.get("EMAIL_PORT", 587))
+EMAIL_USE_TLS = os.environ.get("EMAIL_USE_TLS", "1") == "1"
 # EMAIL CREDENTIALS
 EMAIL_HOST_USER = "yahialinus21alg@gmail.com"
 EMAIL_HOST_PASSWORD = "reuy ewxz ybtl hevu"
+# absolute links in emails (saved search digests, listings.alerts); run the
+# digests locally with EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend
+SITE_URL = os.environ.get("SITE_URL", "http://localhost:8000")
+EMAIL_FILE_PATH = os.environ.get("EMAIL_FILE_PATH", BASE_DIR / "sent_emails")
 
 
 
@@ -169,3 +279,97 @@ LOGIN_URL = "login"
 
 
 
+# SEARCH
+# dotted path to a listings.search backend class, empty = pick by database vendor
+SEARCH_BACKEND = ""
+# in-process inverted index (listings.search_index) instead of database search
+SEARCH_INDEX_ENABLED = False
+SEARCH_INDEX_SNAPSHOT = BASE_DIR / "search_index.snapshot"
+# seconds browsers and shared caches may reuse a search results page
+SEARCH_MAX_AGE = int(os.environ.get("SEARCH_MAX_AGE", "60"))
+# memory-mapped price analytics columns (listings.analytics)
+ANALYTICS_SNAPSHOT = BASE_DIR / "analytics.snapshot"
+# seconds between background checks of the index and analytics snapshots
+# against the listings table (listings.snapshots), None = no background thread
+SNAPSHOT_CHECK_INTERVAL = 30
+
+# IMAGES
+# processes deriving thumbnails/WebP/AVIF after uploads, 0 = only build_thumbnails
+IMAGE_WORKERS = 2
+
+# GEO
+# zipcode,[state,]latitude,longitude CSV (or the Census ZCTA gazetteer) used to geocode listings
+GEO_ZIPCODE_CENTROIDS = BASE_DIR / "listings" / "data" / "zip_centroids.csv"
+
+# INSTRUMENTATION
+# per URL name limits checked by listings.instrumentation on every request:
+# over budget is a warning in production and a failure under the test runner
+REQUEST_BUDGETS = {
+    "home": {"queries": 5, "repeated": 2},
+    "listings": {"queries": 5, "repeated": 2},
+    "listing": {"queries": 10, "repeated": 2},
+    "search": {"queries": 6, "repeated": 2},
+    "realtors": {"queries": 4, "repeated": 1},
+    "realtor": {"queries": 4, "repeated": 1},
+    "inbox": {"queries": 7, "repeated": 1},
+    "api_listings": {"queries": 2, "repeated": 1},
+    "api_listing": {"queries": 2, "repeated": 1},
+    "api_search": {"queries": 3, "repeated": 1},
+}
+TEST_RUNNER = "listings.testing.BudgetTestRunner"
+
+# LOGGING
+# JSON lines written from a background thread (listings.logs), so logging never
+# blocks a request; the *_SAMPLE_RATE variables keep that fraction of the
+# per-request and per-search info records (warnings are always kept)
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "listings.logs.JsonFormatter"},
+    },
+    "filters": {
+        "sample_requests": {
+            "()": "listings.logs.SampledFilter",
+            "rate": os.environ.get("REQUEST_LOG_SAMPLE_RATE", "1.0"),
+        },
+        "sample_searches": {
+            "()": "listings.logs.SampledFilter",
+            "rate": os.environ.get("SEARCH_LOG_SAMPLE_RATE", "1.0"),
+        },
+    },
+    "handlers": {
+        "json_requests": {
+            "class": "listings.logs.BackgroundHandler",
+            "formatter": "json",
+            "filters": ["sample_requests"],
+        },
+        "json_searches": {
+            "class": "listings.logs.BackgroundHandler",
+            "formatter": "json",
+            "filters": ["sample_searches"],
+        },
+        # the SearchLog table read by the aggregate_searches command
+        "search_log": {
+            "class": "listings.logs.BackgroundHandler",
+            "handler_class": "listings.search_log.SearchLogHandler",
+            "capacity": 500,
+            "interval": 5.0,
+            "filters": ["sample_searches"],
+        },
+    },
+    "loggers": {
+        # one record per request, see listings.instrumentation
+        "listings.requests": {
+            "handlers": ["json_requests"],
+            "level": os.environ.get("REQUEST_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+        # one record per search: normalized parameters, result count, timing
+        "listings.search": {
+            "handlers": ["json_searches", "search_log"],
+            "level": os.environ.get("SEARCH_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
@@ -4,5 +4,23 @@ from django.contrib import admin
 from .models import *
 
 
-admin.site.register(Listing)
-admin.site.register(Realtor)
+class ListingPhotoInline(admin.TabularInline):
+    model = ListingPhoto
+    fields = ["image", "position", "width", "height"]
+    readonly_fields = ["width", "height"]
+    extra = 1
+
+
+@admin.register(Listing)
+class ListingAdmin(admin.ModelAdmin):
+    inlines = [ListingPhotoInline]
+
+
+@admin.register(Realtor)
+class RealtorAdmin(admin.ModelAdmin):
+    raw_id_fields = ["user"]
+
+
+admin.site.register(OutboundEmail)
+admin.site.register(SearchLog)
+admin.site.register(SavedSearch)
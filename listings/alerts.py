@@ -0,0 +1,226 @@
+"""
+New-listing alerts for saved searches.
+
+Instead of running every ``SavedSearch`` as a query, the searches are turned
+around into an index: ``SearchIndex`` files each one under the exact
+(state, city, bedrooms) it filters on, with ``None`` for the ones it leaves
+open, and a new listing looks up the 8 combinations of its own values and
+``None``. Only the searches found there are tested further (price, keywords,
+radius/box), in Python, so a run costs one pass over the new listings
+whatever the number of saved searches.
+
+``run()`` (the send_search_alerts command) streams the listings with ids
+above the lowest search watermark, up to the newest listing that has
+settled (``newest_listing_id``), and groups the matches per user into one
+digest outside any transaction, then queues the digests in the outbox with
+one insert and moves the watermarks in one short transaction; send_outbox
+delivers them in batches over one mail connection. Runs must not overlap.
+"""
+import itertools
+from collections import defaultdict, deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from . import geo, outbox
+from .models import Listing, SavedSearch
+from .search import canonical_query, tokenize
+
+
+LISTING_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "address",
+    "city",
+    "state",
+    "bedrooms",
+    "price",
+    "latitude",
+    "longitude",
+    "realtor__name",
+)
+# what keywords are matched against, as in listings.search_index
+TEXT_FIELDS = ("title", "description", "address", "city", "realtor__name")
+# newest listings shown per search in a digest, the others are behind a link
+DIGEST_LISTINGS = 10
+CHUNK_SIZE = 2000
+# longer than any transaction that inserts listings (feed batches,
+# populate_db chunks), see newest_listing_id
+SETTLE_TIME = timedelta(minutes=10)
+
+
+def _located(listing, params):
+    if "bbox" not in params and "radius" not in params:
+        return True
+    lat, lng = listing["latitude"], listing["longitude"]
+    if lat is None or lng is None:
+        return False
+    if "bbox" in params and not geo.in_box(lat, lng, *params["bbox"]):
+        return False
+    if "radius" in params:
+        return geo.distance(params["lat"], params["lng"], lat, lng) <= params["radius"]
+    return True
+
+
+class SearchIndex:
+    """Saved searches by the (state, city, bedrooms) they require."""
+
+    def __init__(self, searches):
+        # key -> (id, params, watermark, max price, keywords) of each search
+        self.buckets = defaultdict(list)
+        for search in searches:
+            params = search.params
+            key = (params.get("state"), params.get("city"), params.get("bedrooms"))
+            self.buckets[key].append((
+                search.pk,
+                params,
+                search.last_listing_id,
+                params.get("price"),
+                tuple(tokenize(params.get("keywords", ""))),
+            ))
+
+    def candidates(self, listing):
+        keys = itertools.product(
+            (listing["state"], None),
+            ((listing["city"] or "").lower(), None),
+            (listing["bedrooms"], None),
+        )
+        for key in keys:
+            yield from self.buckets.get(key, ())
+
+    def matches(self, listing):
+        """Ids of the saved searches ``listing`` (a dict of ``LISTING_FIELDS``) is new to and matches."""
+        found = []
+        tokens = None
+        # keyword -> whether it starts a token of the listing, the full text
+        # backend matches prefixes
+        words = {}
+        for search_id, params, watermark, max_price, keywords in self.candidates(listing):
+            if listing["id"] <= watermark:
+                continue
+            if max_price is not None and listing["price"] > max_price:
+                continue
+            if keywords:
+                if tokens is None:
+                    tokens = set(
+                        tokenize(" ".join(str(listing[name] or "") for name in TEXT_FIELDS))
+                    )
+                matched = True
+                for word in keywords:
+                    if word not in words:
+                        words[word] = word in tokens or any(
+                            token.startswith(word) for token in tokens
+                        )
+                    if not words[word]:
+                        matched = False
+                        break
+                if not matched:
+                    continue
+            if _located(listing, params):
+                found.append(search_id)
+        return found
+
+
+def _url(path):
+    return settings.SITE_URL.rstrip("/") + path
+
+
+def digest(user, matches):
+    """
+    (subject, body, from_email, to) of the email telling ``user`` about
+    ``matches``: (search, count, newest listings) triples.
+    """
+    total = sum(count for _, count, _ in matches)
+    lines = [f"Hi {user.get_username()},", ""]
+    for search, count, listings in matches:
+        lines.append(f"{search}: {count} new listing{'s' if count != 1 else ''}")
+        for listing in reversed(listings):
+            lines.append(f"  {listing['title']}, ${listing['price']:,} {listing['url']}")
+        if count > len(listings):
+            lines.append(
+                f"  and {count - len(listings)} more: "
+                f"{_url(reverse('search'))}?{canonical_query(search.params)}"
+            )
+        lines.append("")
+    subject = f"{total} new listing{'s' if total != 1 else ''} for your saved searches"
+    return subject, "\n".join(lines), settings.EMAIL_HOST_USER, [user.email]
+
+
+def newest_listing_id(now=None):
+    """
+    The highest watermark a run can move searches to: the id of the newest
+    listing listed ``SETTLE_TIME`` ago. Ids are handed out at insert, not at
+    commit (PostgreSQL sequences), so the newest id can be committed while a
+    lower one is not yet. The lower ids of a listing that old were inserted
+    earlier still, by transactions that have ended since; the listings above
+    it wait for a later run.
+    """
+    cutoff = (now or timezone.now()) - SETTLE_TIME
+    # a seek on listing_date_id_idx
+    newest = (
+        Listing.objects.filter(list_date__lte=cutoff)
+        .order_by("-list_date", "-id")
+        .values_list("id", flat=True)
+        .first()
+    )
+    return newest or 0
+
+
+def run(chunk_size=CHUNK_SIZE, now=None):
+    """
+    Match the listings added since the last run against every saved search
+    and queue one digest per user. Returns (listings scanned, searches
+    matched, digests queued).
+    """
+    newest = newest_listing_id(now)
+    searches = list(
+        SavedSearch.objects.filter(last_listing_id__lt=newest).select_related("user")
+    )
+    if not searches:
+        return 0, 0, 0
+    index = SearchIndex(searches)
+
+    # search id -> [count, newest listings]
+    found = {}
+    scanned = 0
+    listings = (
+        Listing.objects.filter(
+            id__gt=min(search.last_listing_id for search in searches), id__lte=newest
+        )
+        .order_by("id")
+        .values(*LISTING_FIELDS)
+    )
+    for listing in listings.iterator(chunk_size=chunk_size):
+        scanned += 1
+        matches = index.matches(listing)
+        if not matches:
+            continue
+        # what digests show, shared by every search it matches
+        shown = {
+            "title": listing["title"],
+            "price": listing["price"],
+            "url": _url(reverse("listing", args=[listing["id"]])),
+        }
+        for search_id in matches:
+            if search_id not in found:
+                found[search_id] = [0, deque(maxlen=DIGEST_LISTINGS)]
+            found[search_id][0] += 1
+            found[search_id][1].append(shown)
+
+    by_user = defaultdict(list)
+    for search in searches:
+        if search.pk in found and search.user.email:
+            count, newest_listings = found[search.pk]
+            by_user[search.user].append((search, count, list(newest_listings)))
+
+    # the digests are queued if and only if the watermarks move past them
+    with transaction.atomic():
+        outbox.enqueue_many(digest(user, matches) for user, matches in by_user.items())
+        # searches saved meanwhile start at a newer listing and keep it
+        SavedSearch.objects.filter(last_listing_id__lt=newest).update(last_listing_id=newest)
+        SavedSearch.objects.filter(pk__in=list(found)).update(last_notified=timezone.now())
+    return scanned, len(found), len(by_user)
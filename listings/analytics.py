@@ -0,0 +1,393 @@
+"""
+Columnar price analytics and comparables.
+
+``Snapshot`` keeps ``id, price, sqft, bedrooms, bathrooms, lot_size`` plus
+city/state codes of every listing as NumPy columns, so market statistics and
+nearest-neighbour comparables are a few vectorized passes over contiguous
+arrays instead of a walk over model instances:
+
+* ``market(city=..., state=...)`` - price per sqft percentiles and histogram;
+* ``comparables(listing_id, k)``  - the k listings of the same state closest
+  in size, bedrooms, bathrooms and lot (z-scored), preferring the same city.
+
+Snapshots are written to ``settings.ANALYTICS_SNAPSHOT`` (a JSON header
+followed by the raw columns, ``manage.py build_analytics``) and
+memory-mapped when loaded, so every worker process shares the same page
+cache instead of holding its own copy. Like ``listings.search_index``, a
+process applies the listing writes it sees through the signals as an
+in-memory overlay, and ``listings.snapshots`` loads, catches up and checks
+the snapshot in the background: requests never build one, they get None
+until it is ready. Reads merge the overlay into the base columns once per
+change; past ``COMPACT_AFTER`` overlay rows the merged columns become the
+base (a private copy of this process) and the overlay starts over.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .models import Listing
+from .snapshots import Refresher
+
+
+SNAPSHOT_VERSION = 2
+FIELDS = ("id", "price", "sqft", "bedrooms", "bathrooms", "lot_size", "city", "state", "updated_at")
+COLUMNS = (
+    ("id", np.int64),
+    ("price", np.float64),
+    ("sqft", np.float32),
+    ("bedrooms", np.int16),
+    ("bathrooms", np.int16),
+    ("lot_size", np.float32),
+    ("city", np.int32),
+    ("state", np.int16),
+)
+# what makes two homes comparable, see Snapshot.comparables
+FEATURES = ("sqft", "bedrooms", "bathrooms", "lot_size")
+OTHER_CITY_PENALTY = 1.0
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = 20
+ALIGN = 64
+# overlay rows folded into the base columns, see Snapshot.columns
+COMPACT_AFTER = 10000
+
+
+class Snapshot:
+
+    def __init__(self, columns, cities, states):
+        # base columns, possibly memory-mapped read only; ids ascending
+        self.base = columns
+        self.cities = list(cities)
+        self.states = list(states)
+        self.city_codes = {name: code for code, name in enumerate(self.cities)}
+        self.state_codes = {name: code for code, name in enumerate(self.states)}
+        # id -> row tuple, or None for a deleted listing; merged on read
+        self.overlay = {}
+        self._merged = None
+        # newest updated_at seen, where catch_up starts
+        self.updated = 0.0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    # building
+
+    def encode(self, row):
+        city = " ".join((row["city"] or "").lower().split())
+        state = (row["state"] or "").upper()
+        with self.lock:
+            if city not in self.city_codes:
+                self.city_codes[city] = len(self.cities)
+                self.cities.append(city)
+            if state not in self.state_codes:
+                self.state_codes[state] = len(self.states)
+                self.states.append(state)
+        return (
+            row["id"],
+            row["price"],
+            row["sqft"],
+            row["bedrooms"],
+            row["bathrooms"],
+            row["lot_size"],
+            self.city_codes[city],
+            self.state_codes[state],
+        )
+
+    @classmethod
+    def build(cls, queryset=None, chunk_size=50000):
+        if queryset is None:
+            queryset = Listing.objects.all()
+        snapshot = cls(_empty_columns(), [], [])
+        rows = queryset.order_by("id").values(*FIELDS).iterator(chunk_size=chunk_size)
+        chunks, chunk = [], []
+        for row in rows:
+            chunk.append(snapshot.encode(row))
+            snapshot.updated = max(snapshot.updated, row["updated_at"].timestamp())
+            if len(chunk) == chunk_size:
+                chunks.append(_to_columns(chunk))
+                chunk = []
+        chunks.append(_to_columns(chunk))
+        snapshot.base = {
+            name: np.concatenate([columns[name] for columns in chunks]) for name, _ in COLUMNS
+        }
+        return snapshot
+
+    # incremental updates
+
+    def upsert(self, row):
+        with self.lock:
+            self.overlay[row["id"]] = self.encode(row)
+            self.updated = max(self.updated, row["updated_at"].timestamp())
+            self._merged = None
+
+    def remove(self, listing_id):
+        with self.lock:
+            self.overlay[listing_id] = None
+            self._merged = None
+
+    def catch_up(self):
+        """Apply the listings written since the newest one seen."""
+        since = datetime.fromtimestamp(self.updated, tz=timezone.utc)
+        rows = Listing.objects.filter(updated_at__gte=since).values(*FIELDS)
+        for row in rows.iterator(chunk_size=2000):
+            self.upsert(row)
+
+    @property
+    def columns(self):
+        """Base columns with the overlay applied, cached until the next change."""
+        merged = self._merged
+        if merged is None:
+            with self.lock:
+                merged = self._merged
+                if merged is None:
+                    merged = self._merge()
+                    if len(self.overlay) >= COMPACT_AFTER:
+                        # keep the base sorted by id for the next merges' seeks
+                        order = np.argsort(merged["id"], kind="stable")
+                        merged = {name: merged[name][order] for name, _ in COLUMNS}
+                        self.base, self.overlay = merged, {}
+                    self._merged = merged
+        return merged
+
+    def _merge(self):
+        if not self.overlay:
+            return self.base
+        changed = np.fromiter(self.overlay, dtype=np.int64, count=len(self.overlay))
+        # base ids are ascending: a binary search per changed id, not a
+        # membership test of every base row
+        ids = self.base["id"]
+        positions = np.searchsorted(ids, changed)
+        found = positions < len(ids)
+        found[found] = ids[positions[found]] == changed[found]
+        keep = np.ones(len(ids), dtype=bool)
+        keep[positions[found]] = False
+        added = _to_columns([row for row in self.overlay.values() if row is not None])
+        return {name: np.concatenate([self.base[name][keep], added[name]]) for name, _ in COLUMNS}
+
+    # queries
+
+    def market(self, city=None, state=None):
+        """Price per sqft distribution of the listings of a city and/or state."""
+        columns = self.columns
+        mask = columns["sqft"] > 0
+        if state:
+            code = self.state_codes.get(state.upper())
+            if code is None:
+                return None
+            mask &= columns["state"] == code
+        if city:
+            code = self.city_codes.get(" ".join(city.lower().split()))
+            if code is None:
+                return None
+            mask &= columns["city"] == code
+        price = columns["price"][mask]
+        if not len(price):
+            return None
+        per_sqft = price / columns["sqft"][mask]
+        counts, edges = np.histogram(per_sqft, bins=HISTOGRAM_BINS)
+        return {
+            "city": city or None,
+            "state": state or None,
+            "count": int(len(price)),
+            "median_price": float(np.median(price)),
+            "price_per_sqft": {
+                f"p{p}": round(float(value), 2)
+                for p, value in zip(PERCENTILES, np.percentile(per_sqft, PERCENTILES))
+            },
+            "histogram": {
+                "edges": [round(float(edge), 2) for edge in edges],
+                "counts": counts.tolist(),
+            },
+        }
+
+    def comparables(self, listing_id, k=5):
+        """
+        Ids and distances of the ``k`` listings most like ``listing_id``, with
+        a price estimate from their median price per sqft; None if unknown.
+        """
+        columns = self.columns
+        ids = columns["id"]
+        position = np.flatnonzero(ids == listing_id)
+        if not len(position):
+            return None
+        position = position[0]
+
+        candidates = np.flatnonzero(columns["state"] == columns["state"][position])
+        candidates = candidates[candidates != position]
+        if not len(candidates):
+            return {
+                "ids": [],
+                "distances": [],
+                "estimate": None,
+                "city": self.cities[columns["city"][position]],
+                "state": self.states[columns["state"][position]],
+            }
+
+        # z-scored so a bedroom weighs as much as a few hundred sqft
+        features = np.column_stack(
+            [columns[name][candidates].astype(np.float64) for name in FEATURES]
+        )
+        target = np.array([columns[name][position] for name in FEATURES], dtype=np.float64)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1.0
+        distances = np.sqrt((((features - target) / scale) ** 2).sum(axis=1))
+        other_city = columns["city"][candidates] != columns["city"][position]
+        distances += OTHER_CITY_PENALTY * other_city
+
+        k = min(k, len(candidates))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        chosen = candidates[nearest]
+
+        sqft = columns["sqft"][chosen]
+        priced = sqft > 0
+        estimate = None
+        if priced.any() and columns["sqft"][position] > 0:
+            per_sqft = np.median(columns["price"][chosen][priced] / sqft[priced])
+            estimate = round(float(per_sqft * columns["sqft"][position]), -3)
+        return {
+            "ids": ids[chosen].tolist(),
+            "distances": [round(float(d), 3) for d in distances[nearest]],
+            "estimate": estimate,
+            "city": self.cities[columns["city"][position]],
+            "state": self.states[columns["state"][position]],
+        }
+
+    # snapshots
+
+    def fingerprint(self):
+        ids = self.columns["id"]
+        return len(ids), int(ids.max()) if len(ids) else 0, self.updated
+
+    def save(self, path):
+        columns = self.columns
+        header = {
+            "version": SNAPSHOT_VERSION,
+            "rows": len(columns["id"]),
+            "updated": self.updated,
+            "cities": self.cities,
+            "states": self.states,
+            "columns": [],
+        }
+        # the column offsets are in the header, so its length decides them
+        data_start = 0
+        while True:
+            offsets, offset = [], data_start
+            for name, dtype in COLUMNS:
+                offsets.append([name, np.dtype(dtype).str, offset])
+                offset = _align(offset + columns[name].nbytes)
+            header["columns"] = offsets
+            encoded = json.dumps(header).encode() + b"\n"
+            if len(encoded) <= data_start:
+                break
+            data_start = _align(len(encoded))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as snapshot:
+            snapshot.write(encoded)
+            for (name, dtype), (_, _, offset) in zip(COLUMNS, offsets):
+                snapshot.write(b"\0" * (offset - snapshot.tell()))
+                snapshot.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+        # processes that mapped the old file keep reading its inode
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a snapshot written by ``save``; None if missing or incompatible."""
+        try:
+            with open(path, "rb") as snapshot:
+                header = json.loads(snapshot.readline())
+        except (OSError, ValueError):
+            return None
+        if header.get("version") != SNAPSHOT_VERSION:
+            return None
+        rows = header["rows"]
+        columns = {}
+        for name, dtype, offset in header["columns"]:
+            if rows:
+                columns[name] = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(rows,))
+            else:
+                columns[name] = np.empty(0, dtype=dtype)
+        snapshot = cls(columns, header["cities"], header["states"])
+        snapshot.updated = header["updated"]
+        return snapshot
+
+
+def describe(listing_id, k=5):
+    """
+    Price estimate, comparables (with the fields a summary shows) and the
+    city market of a listing, JSON serializable; None if it isn't known or
+    the snapshot isn't loaded yet.
+    """
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return None
+    result = snapshot.comparables(listing_id, k)
+    if result is None:
+        return None
+    rows = Listing.objects.only(
+        "id", "title", "price", "sqft", "bedrooms", "city", "state"
+    ).in_bulk(result["ids"])
+    comparables = [
+        {
+            "id": pk,
+            "title": rows[pk].title,
+            "price": rows[pk].price,
+            "sqft": rows[pk].sqft,
+            "bedrooms": rows[pk].bedrooms,
+            "city": rows[pk].city,
+            "state": rows[pk].state,
+            "distance": distance,
+        }
+        for pk, distance in zip(result["ids"], result["distances"])
+        # deleted since the snapshot was taken
+        if pk in rows
+    ]
+    return {
+        "listing_id": listing_id,
+        "estimate": result["estimate"],
+        "comparables": comparables,
+        "market": snapshot.market(city=result["city"], state=result["state"]),
+    }
+
+
+def _align(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def _empty_columns():
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+
+
+def _to_columns(rows):
+    if not rows:
+        return _empty_columns()
+    transposed = list(zip(*rows))
+    return {
+        name: np.array(values, dtype=dtype)
+        for (name, dtype), values in zip(COLUMNS, transposed)
+    }
+
+
+_refresher = Refresher(Snapshot, "ANALYTICS_SNAPSHOT")
+
+
+def get_snapshot():
+    """The process-wide snapshot, None while it is first loaded in the background."""
+    return _refresher.get()
+
+
+def refresh_snapshot():
+    """Load or catch up the snapshot now, in this thread (commands, tests)."""
+    return _refresher.refresh()
+
+
+def loaded_snapshot():
+    """The snapshot if this process has already loaded it, without loading it."""
+    return _refresher.loaded()
+
+
+def reset_snapshot():
+    _refresher.reset()
@@ -0,0 +1,13 @@
+"""
+Read-only JSON API over the listings, for the mobile app and partners.
+
+* ``listings/api/listings/``       - newest first, keyset paginated like the
+  browse page (``?after=``/``?before=`` cursors)
+* ``listings/api/listings/<id>/``  - one listing, with its gallery
+* ``listings/api/search/``         - the search form's parameters as a query
+  string, ranked and paged like the search page
+
+Every endpoint takes ``?fields=id,price,city`` (see ``listings.api.fields``),
+and the list and search endpoints stream every matching row as NDJSON with
+``?format=ndjson``.
+"""
@@ -0,0 +1,91 @@
+"""
+The fields of the API and their projection.
+
+``?fields=`` becomes a ``values()`` projection, so only the requested columns
+are read and rows stay plain dicts from the cursor to the encoder, no model
+instance is built. Card fields can also be read from ``ListingSummary``: a
+request for card fields only is answered from its narrow rows, without the
+realtor join.
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from ..models import Listing
+
+
+# field -> (Listing lookup, ListingSummary lookup or None)
+FIELDS = {
+    "id": ("id", "listing_id"),
+    "title": ("title", "title"),
+    "realtor_id": ("realtor_id", "realtor_id"),
+    "realtor_name": ("realtor__name", "realtor_name"),
+    "address": ("address", None),
+    "city": ("city", None),
+    "state": ("state", None),
+    "zipcode": ("zipcode", None),
+    "latitude": ("latitude", None),
+    "longitude": ("longitude", None),
+    "description": ("description", None),
+    "price": ("price", "price"),
+    "bedrooms": ("bedrooms", "bedrooms"),
+    "bathrooms": ("bathrooms", "bathrooms"),
+    "garage": ("garage", "garage"),
+    "sqft": ("sqft", "sqft"),
+    "lot_size": ("lot_size", None),
+    "list_date": ("list_date", "list_date"),
+    "updated_at": ("updated_at", None),
+    "photo_main": ("photo_main", "photo_main"),
+}
+CARD_FIELDS = [name for name, (_, summary) in FIELDS.items() if summary]
+# computed by a radius search
+DISTANCE = "distance"
+# listing detail only, one more query
+PHOTOS = "photos"
+
+encoder = DjangoJSONEncoder(separators=(",", ":"))
+
+
+def parse_fields(value, default, extra=()):
+    """The field names of a ``?fields=`` value, ``default`` when empty."""
+    if not value:
+        return list(default)
+    fields = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in fields if name not in FIELDS and name not in extra]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return fields or list(default)
+
+
+def from_summary(fields):
+    return all(name in CARD_FIELDS for name in fields)
+
+
+def project(queryset, fields):
+    """``queryset.values()`` of ``fields``, keyed by their API names."""
+    column = 0 if queryset.model is Listing else 1
+    plain, renamed = [], {}
+    for name in fields:
+        lookup = name if name == DISTANCE else FIELDS[name][column]
+        if lookup == name:
+            plain.append(name)
+        else:
+            renamed[name] = F(lookup)
+    return queryset.values(*plain, **renamed)
+
+
+def finish(rows, fields):
+    """``rows`` with their photo names as urls and only ``fields`` kept."""
+    storage = Listing._meta.get_field("photo_main").storage
+    photo = "photo_main" in fields
+    out = []
+    for row in rows:
+        if photo:
+            row["photo_main"] = storage.url(row["photo_main"]) if row["photo_main"] else None
+        # in the requested order, without the columns only read for a cursor
+        out.append({name: row[name] for name in fields})
+    return out
+
+
+def encode_lines(rows, fields):
+    """NDJSON of a chunk of rows."""
+    return "".join([encoder.encode(row) + "\n" for row in finish(rows, fields)])
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("listings/", views.listings, name="api_listings"),
+    path("listings/<int:listing_id>/", views.listing, name="api_listing"),
+    path("search/", views.search, name="api_search"),
+]
@@ -0,0 +1,132 @@
+import itertools
+
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
+from django.http import JsonResponse, StreamingHttpResponse
+
+from ..models import Listing, ListingPhoto, ListingSummary
+from ..pagination import keyset_page
+from ..search import normalize_params, search_listings
+from .fields import (
+    CARD_FIELDS,
+    DISTANCE,
+    FIELDS,
+    PHOTOS,
+    encode_lines,
+    finish,
+    from_summary,
+    parse_fields,
+    project,
+)
+
+
+PER_PAGE = 20
+MAX_PER_PAGE = 100
+CHUNK_SIZE = 2000
+
+
+def _error(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def _per_page(request):
+    try:
+        return min(max(int(request.GET.get("per_page", PER_PAGE)), 1), MAX_PER_PAGE)
+    except ValueError:
+        return PER_PAGE
+
+
+def _lines(rows, fields):
+    rows = rows.iterator(chunk_size=CHUNK_SIZE)
+    while chunk := list(itertools.islice(rows, CHUNK_SIZE)):
+        yield encode_lines(chunk, fields)
+
+
+async def _alines(rows, fields):
+    chunk = []
+    async for row in rows.aiterator(chunk_size=CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            yield encode_lines(chunk, fields)
+            chunk = []
+    if chunk:
+        yield encode_lines(chunk, fields)
+
+
+def ndjson(request, rows, fields):
+    """
+    Every row of the ``values()`` queryset ``rows`` as one JSON object per
+    line, read in chunks from a server-side cursor and encoded a chunk at a
+    time, so memory stays constant whatever the export size. Under ASGI the
+    rows are read by an async iterator: a sync one would be buffered whole.
+    """
+    if isinstance(request, ASGIRequest):
+        content = _alines(rows, fields)
+    else:
+        content = _lines(rows, fields)
+    return StreamingHttpResponse(content, content_type="application/x-ndjson")
+
+
+def listings(request):
+    try:
+        fields = parse_fields(request.GET.get("fields"), CARD_FIELDS)
+    except ValueError as error:
+        return _error(str(error))
+    # card fields only: the summaries, no realtor join
+    source = ListingSummary if from_summary(fields) else Listing
+    if request.GET.get("format") == "ndjson":
+        return ndjson(request, project(source.objects.order_by("pk"), fields), fields)
+
+    # the cursor is built from list_date and id, read even when not asked for
+    columns = list(dict.fromkeys([*fields, "id", "list_date"]))
+    page = keyset_page(
+        project(source.objects.all(), columns),
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+        per_page=_per_page(request),
+    )
+    return JsonResponse({
+        "results": finish(page.object_list, fields),
+        "next": page.next_cursor if page.has_next else None,
+        "previous": page.previous_cursor if page.has_previous else None,
+    })
+
+
+def listing(request, listing_id):
+    try:
+        fields = parse_fields(request.GET.get("fields"), [*FIELDS, PHOTOS], extra=(PHOTOS,))
+    except ValueError as error:
+        return _error(str(error))
+    columns = [name for name in fields if name != PHOTOS]
+    row = project(Listing.objects.filter(pk=listing_id), columns or ["id"]).first()
+    if row is None:
+        return _error("No listing matches the given query.", status=404)
+    (row,) = finish([row], columns)
+    if PHOTOS in fields:
+        storage = ListingPhoto._meta.get_field("image").storage
+        row[PHOTOS] = [
+            storage.url(name)
+            for name in ListingPhoto.objects.filter(listing_id=listing_id).values_list("image", flat=True)
+        ]
+    return JsonResponse(row)
+
+
+def search(request):
+    params = normalize_params(request.GET)
+    extra = (DISTANCE,) if "radius" in params else ()
+    try:
+        fields = parse_fields(request.GET.get("fields"), [*CARD_FIELDS, *extra], extra=extra)
+    except ValueError as error:
+        return _error(str(error))
+    rows = project(search_listings(params), fields)
+    if request.GET.get("format") == "ndjson":
+        return ndjson(request, rows, fields)
+
+    page = Paginator(rows, _per_page(request)).get_page(request.GET.get("page"))
+    return JsonResponse({
+        "params": params,
+        "count": page.paginator.count,
+        "page": page.number,
+        "pages": page.paginator.num_pages,
+        "results": finish(page.object_list, fields),
+    })
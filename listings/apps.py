@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def ensure_fulltext(using, **kwargs):
+    from django.db import connections
+    from . import fulltext
+
+    fulltext.ensure_installed(connections[using])
 
 
 class ListingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'listings'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .instrumentation import install_recorder
+
+        connection_created.connect(install_recorder)
+
+        post_migrate.connect(ensure_fulltext, sender=self)
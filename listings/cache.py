@@ -0,0 +1,262 @@
+"""
+Two-tier cache backend for rendered fragments.
+
+``TwoTierCache`` is a regular Django cache backend (so the built-in
+``{% cache %}`` tag can use it with ``using="fragments"``) that layers a
+per-process, byte-bounded LRU in front of a shared backend (Redis when
+``REDIS_URL`` is set, the filesystem cache otherwise):
+
+* reads check the local LRU, then the shared tier, promoting shared hits;
+* writes go to both tiers;
+* a miss on both tiers takes a short lock in the shared tier, so when a cold
+  key is requested by many workers at once only one renders it and the
+  others wait briefly for its result instead of all rendering it. Caches of
+  fragments cheaper to render than the lock round trips (listing cards) turn
+  it off with ``"LOCK": False``;
+* ``get_many`` fetches everything the local tier lacks in one shared round
+  trip and takes no locks, to prefetch the fragments of a whole page.
+
+Django creates a backend instance per thread and per async context, so the
+LRU and the hit counters live at module level, keyed by ``LOCATION`` (the
+alias name in settings) like the dicts of Django's locmem cache: every
+request of a worker process shares them. The locks a context is holding
+stay on its instance, and the ``{% cache %}`` tag of
+``listings.templatetags.fragment_cache`` releases them when rendering the
+fragment fails.
+
+Nothing is invalidated by TTL: keys carry the version numbers from
+``listings.versions`` that the Listing/Realtor signals bump, so a write
+simply makes the old keys unreachable and the LRU evicts them.
+
+``FileCache`` is the shared tier without Redis: Django's filesystem cache,
+which lists its whole directory to count entries on every set, checking
+only every ``CULL_EVERY`` sets instead.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+COUNTERS = ("local_hits", "shared_hits", "misses", "lock_waits", "lock_timeouts")
+
+# LOCATION -> LocalLRU / counters / FileCache sets of this process
+_locals = {}
+_counters = {}
+_file_sets = {}
+_state_lock = threading.Lock()
+
+
+class LocalLRU:
+    """Thread-safe LRU bounded by the approximate byte size of its values."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def sizeof(value):
+        if isinstance(value, (str, bytes)):
+            return len(value)
+        return sys.getsizeof(value)
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                self.data.move_to_end(key)
+            except KeyError:
+                return default
+            return self.data[key][0]
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.data:
+                self.size -= self.data.pop(key)[1]
+            self.data[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self.size -= self.data.popitem(last=False)[1][1]
+
+    def delete(self, key):
+        with self.lock:
+            item = self.data.pop(key, None)
+            if item is not None:
+                self.size -= item[1]
+            return item is not None
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.size = 0
+
+
+class TwoTierCache(BaseCache):
+    """
+    CACHES entry::
+
+        "fragments": {
+            "BACKEND": "listings.cache.TwoTierCache",
+            "LOCATION": "fragments",
+            "OPTIONS": {"SHARED": "default", "MAX_BYTES": 16 * 1024 * 1024},
+        }
+    """
+
+    lock_timeout = 10
+    lock_wait = 2.0
+    lock_poll = 0.05
+
+    _missing = object()
+
+    def __init__(self, location, params):
+        options = params.get("OPTIONS", {})
+        super().__init__(params)
+        self.shared_alias = options.get("SHARED", "default")
+        self.lock_wait = options.get("LOCK_WAIT", self.lock_wait)
+        self.locking = options.get("LOCK", True)
+        # keys whose lock this context holds, released by set() or release()
+        self.building = set()
+        with _state_lock:
+            if location not in _locals:
+                _locals[location] = LocalLRU(options.get("MAX_BYTES", 16 * 1024 * 1024))
+                _counters[location] = dict.fromkeys(COUNTERS, 0)
+            self.local = _locals[location]
+            self.counters = _counters[location]
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def count(self, name):
+        with _state_lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with _state_lock:
+            stats = dict(self.counters)
+        lookups = stats["local_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = (
+            (stats["local_hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        )
+        stats["local_bytes"] = self.local.size
+        stats["local_entries"] = len(self.local.data)
+        return stats
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self.local.get(key, self._missing)
+        if value is not self._missing:
+            self.count("local_hits")
+            return value
+
+        value = self.shared.get(key, self._missing)
+        if value is not self._missing:
+            self.count("shared_hits")
+            self.local.set(key, value)
+            return value
+
+        self.count("misses")
+        if not self.locking:
+            return default
+        if self.shared.add(f"lock:{key}", 1, self.lock_timeout):
+            # we build it; set() releases the lock
+            self.building.add(key)
+            return default
+
+        # somebody else is building this key, give them a moment
+        self.count("lock_waits")
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_poll)
+            value = self.shared.get(key, self._missing)
+            if value is not self._missing:
+                self.local.set(key, value)
+                return value
+        self.count("lock_timeouts")
+        return default
+
+    def get_many(self, keys, version=None):
+        found, wanted = {}, {}
+        for key in keys:
+            made = self.make_and_validate_key(key, version=version)
+            value = self.local.get(made, self._missing)
+            if value is not self._missing:
+                self.count("local_hits")
+                found[key] = value
+            else:
+                wanted[made] = key
+        if wanted:
+            for made, value in self.shared.get_many(list(wanted)).items():
+                self.count("shared_hits")
+                self.local.set(made, value)
+                found[wanted[made]] = value
+        return found
+
+    def _timeout(self, timeout):
+        # the local tier ignores timeouts, see the module docstring
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self.local.set(key, value)
+        self.shared.set(key, value, self._timeout(timeout))
+        self._release(key)
+
+    def release(self, key, version=None):
+        """Give up the lock a miss on ``key`` took, if this context holds it."""
+        self._release(self.make_and_validate_key(key, version=version))
+
+    def _release(self, key):
+        if key in self.building:
+            self.building.discard(key)
+            self.shared.delete(f"lock:{key}")
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        if not self.shared.add(key, value, self._timeout(timeout)):
+            return False
+        self.local.set(key, value)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.shared.touch(key, self._timeout(timeout))
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self.local.delete(key)
+        return self.shared.delete(key)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.local.get(key, self._missing) is not self._missing or self.shared.has_key(key)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+
+class FileCache(FileBasedCache):
+    """
+    ``FileBasedCache`` counting its files for culling every ``CULL_EVERY``
+    sets of a process rather than on each one. The directory may outgrow
+    ``MAX_ENTRIES`` by up to ``CULL_EVERY`` files per process in between.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self.cull_every = int(params.get("OPTIONS", {}).get("CULL_EVERY", 100))
+
+    def _cull(self):
+        with _state_lock:
+            sets = _file_sets[self._dir] = _file_sets.get(self._dir, 0) + 1
+        if sets % self.cull_every == 0:
+            super()._cull()
@@ -0,0 +1,117 @@
+"""
+Validators for conditional GET (``django.views.decorators.http.condition``).
+
+A listing page's ETag/Last-Modified come from the ``updated_at`` of the
+listing and its realtor, read with one narrow primary key lookup, so a
+``304 Not Modified`` costs neither the full row nor a template render. Its
+market/comparables section depends on the other listings too, so the
+listings generation is part of them as well, and so is whether this
+process has loaded the analytics snapshot yet.
+Browse and search pages use the listings generation from the shared cache,
+which changes on any listing or realtor write.
+
+Pages also show who is logged in and flash messages, so validators include
+the user id and are skipped entirely while messages are pending.
+
+``acondition`` is ``condition`` for async views: the validators touch the
+ORM, the session and the cache, so they run in a worker thread.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.views.decorators.http import condition
+
+from . import analytics
+from .models import Listing
+from .versions import generation_modified, listings_generation
+
+
+def _viewer(request):
+    """Per-viewer part of the validators, or None when the page can't be reused."""
+    if len(messages.get_messages(request)):
+        return None
+    return str(request.user.pk or 0)
+
+
+def _strong_etag(*parts):
+    return '"%s"' % hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _listing_validators(request, listing_id):
+    # memoized on the request, condition() asks for the etag and the date separately
+    cache_attr = f"_listing_validators_{listing_id}"
+    if not hasattr(request, cache_attr):
+        validators = None
+        viewer = _viewer(request)
+        row = (
+            Listing.objects.filter(pk=listing_id)
+            .values_list("updated_at", "realtor__updated_at")
+            .first()
+            if viewer is not None
+            else None
+        )
+        if row:
+            generation = listings_generation()
+            modified = max(*row, generation_modified(generation))
+            validators = (
+                _strong_etag(
+                    "listing",
+                    listing_id,
+                    *[value.timestamp() for value in row],
+                    generation,
+                    analytics.loaded_snapshot() is not None,
+                    viewer,
+                ),
+                modified,
+            )
+        setattr(request, cache_attr, validators)
+    return getattr(request, cache_attr)
+
+
+def listing_etag(request, listing_id):
+    validators = _listing_validators(request, listing_id)
+    return validators and validators[0]
+
+
+def listing_last_modified(request, listing_id):
+    validators = _listing_validators(request, listing_id)
+    return validators and validators[1]
+
+
+def listings_etag(request, *args, **kwargs):
+    viewer = _viewer(request)
+    if viewer is None:
+        return None
+    return _strong_etag("listings", listings_generation(), viewer)
+
+
+def listings_last_modified(request, *args, **kwargs):
+    if _viewer(request) is None:
+        return None
+    return generation_modified(listings_generation())
+
+
+def acondition(etag_func=None, last_modified_func=None):
+    def decorator(view):
+        conditional = condition(
+            etag_func=etag_func and (lambda request, *args, **kwargs: request._validators[0]),
+            last_modified_func=last_modified_func
+            and (lambda request, *args, **kwargs: request._validators[1]),
+        )(view)
+
+        def validators(request, *args, **kwargs):
+            return (
+                etag_func and etag_func(request, *args, **kwargs),
+                last_modified_func and last_modified_func(request, *args, **kwargs),
+            )
+
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            request._validators = await sync_to_async(validators)(request, *args, **kwargs)
+            return await conditional(request, *args, **kwargs)
+
+        return inner
+
+    return decorator
@@ -0,0 +1,118 @@
+"""
+Facet counts for the search form dropdowns.
+
+All counts for a result set come from one conditional-aggregate query
+(``COUNT(*) FILTER (WHERE ...)`` per option, a single scan of the matching
+rows) or, when the in-process index answers searches, from one pass over the
+matching documents. Results are cached per normalized filter set and listings
+generation.
+"""
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .choices import bedroom_choices, price_choices, state_choices
+from .search import canonical_key
+from .versions import listings_generation
+
+
+PRICE_STEP = 100000
+# upper bounds of the price buckets, (0, 100k], (100k, 200k] ... (900k, 1M],
+# plus an open-ended bucket above the last dropdown value
+PRICE_EDGES = [int(value) for value in price_choices]
+
+
+def price_bucket(price):
+    """Index into PRICE_EDGES of the bucket ``price`` falls in, len() for above."""
+    if price <= 0:
+        return 0
+    return min((price - 1) // PRICE_STEP, len(PRICE_EDGES))
+
+
+def _empty():
+    return {
+        "state": dict.fromkeys(state_choices, 0),
+        "bedrooms": dict.fromkeys(bedroom_choices, 0),
+        "price_buckets": [0] * (len(PRICE_EDGES) + 1),
+    }
+
+
+def _finish(facets):
+    """Add "price": count at or under each max-price dropdown value."""
+    running = 0
+    facets["price"] = {}
+    for edge, count in zip(PRICE_EDGES, facets["price_buckets"]):
+        running += count
+        facets["price"][str(edge)] = running
+    facets["total"] = sum(facets["price_buckets"])
+    return facets
+
+
+def aggregate_facets(queryset):
+    """All facet counts of ``queryset`` in a single aggregate query."""
+    aggregates = {"total": Count("id")}
+    for code in state_choices:
+        aggregates[f"state_{code}"] = Count("id", filter=Q(state=code))
+    for beds in bedroom_choices:
+        aggregates[f"beds_{beds}"] = Count("id", filter=Q(bedrooms=int(beds)))
+    lower = None
+    for i, edge in enumerate(PRICE_EDGES + [None]):
+        condition = Q()
+        if lower is not None:
+            condition &= Q(price__gt=lower)
+        if edge is not None:
+            condition &= Q(price__lte=edge)
+        aggregates[f"price_{i}"] = Count("id", filter=condition)
+        lower = edge
+    row = queryset.order_by().aggregate(**aggregates)
+
+    facets = _empty()
+    for code in state_choices:
+        facets["state"][code] = row[f"state_{code}"]
+    for beds in bedroom_choices:
+        facets["bedrooms"][beds] = row[f"beds_{beds}"]
+    facets["price_buckets"] = [row[f"price_{i}"] for i in range(len(PRICE_EDGES) + 1)]
+    return _finish(facets)
+
+
+def count_facets(rows):
+    """Facet counts from an iterable of (state, bedrooms, price) tuples."""
+    facets = _empty()
+    states, bedrooms, buckets = facets["state"], facets["bedrooms"], facets["price_buckets"]
+    for state, beds, price in rows:
+        if state in states:
+            states[state] += 1
+        beds = str(beds)
+        if beds in bedrooms:
+            bedrooms[beds] += 1
+        buckets[price_bucket(price)] += 1
+    return _finish(facets)
+
+
+def cache_key(params):
+    return f"facets:{listings_generation()}:{canonical_key(params)}"
+
+
+def facets_for(params, compute):
+    """Cached facet counts of normalized ``params``; ``compute()`` on a miss."""
+    key = cache_key(params)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute()
+        cache.set(key, facets, None)
+    return facets
+
+
+def dropdown_options(facets, params):
+    """(value, label, count, selected) per option of each search dropdown."""
+    selected = {name: str(params.get(name, "")) for name in ("state", "bedrooms", "price")}
+    return {
+        name: [
+            (value, label, facets[name][value], value == selected[name])
+            for value, label in choices.items()
+        ]
+        for name, choices in (
+            ("state", state_choices),
+            ("bedrooms", bedroom_choices),
+            ("price", price_choices),
+        )
+    }
@@ -0,0 +1,320 @@
+"""
+Streaming listing feeds for the import_listings/export_listings commands.
+
+Records are flat dicts of ``FEED_FIELDS``: the realtor is referenced by email
+and the listing by its partner ``external_id``, or ``pk:<id>`` for one
+without (``feed_key``), so every exported record can be imported and
+imported again. Readers and writers work one record at a time, so memory
+stays constant whatever the feed size:
+
+* ``csv``     - header row plus one row per listing
+* ``jsonl``   - one JSON object per line
+* ``fixture`` - a Django JSON fixture (``dumpdata`` format, e.g. database.json);
+  read incrementally, realtor objects in it only serve to resolve the
+  ``realtor`` pk of the listing objects that follow
+"""
+import csv
+import itertools
+import json
+from collections import Counter
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+from . import realtor_stats, summaries
+from .models import Listing, ListingPhoto
+
+
+FEED_FIELDS = (
+    "external_id",
+    "realtor_email",
+    "title",
+    "address",
+    "city",
+    "state",
+    "zipcode",
+    "description",
+    "price",
+    "bedrooms",
+    "bathrooms",
+    "garage",
+    "sqft",
+    "lot_size",
+    "photo_main",
+    "photo_1",
+    "photo_2",
+    "photo_3",
+    "photo_4",
+    "photo_5",
+    "photo_6",
+)
+# photo_main is the cover, the first photo of the gallery; photo_1..6 are
+# the next ones (ListingPhoto rows), feeds carry at most those seven
+GALLERY_FIELDS = FEED_FIELDS[-6:]
+LISTING_FIELDS = FEED_FIELDS[2:-6]
+# what an upsert overwrites on an existing listing; list_date keeps the
+# original listing date, updated_at records the import
+UPDATE_FIELDS = [
+    *LISTING_FIELDS,
+    "photo_main_variants",
+    "realtor",
+    "latitude",
+    "longitude",
+    "geohash",
+    "updated_at",
+]
+FORMATS = ("csv", "jsonl", "fixture")
+# external_id of a listing that has no partner one, made from its pk
+PK_KEY_PREFIX = "pk:"
+
+
+class FeedError(ValueError):
+    pass
+
+
+def feed_key(pk, external_id):
+    """The key identifying a listing in feeds: its external_id, else ``pk:<id>``."""
+    return external_id or f"{PK_KEY_PREFIX}{pk}"
+
+
+# readers
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def read_jsonl(stream):
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                raise FeedError(f"line {number}: {error}") from error
+
+
+def iter_json_array(stream, chunk_size=64 * 1024):
+    """Objects of a top-level JSON array, decoded one at a time."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started and buffer:
+            if buffer[0] != "[":
+                raise FeedError("fixture must be a JSON array")
+            buffer = buffer[1:]
+            started = True
+            continue
+        if started and buffer[:1] == ",":
+            buffer = buffer[1:]
+            continue
+        if started and buffer[:1] == "]":
+            return
+        if buffer:
+            try:
+                obj, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise FeedError("truncated or invalid fixture") from None
+            else:
+                yield obj
+                buffer = buffer[end:]
+                continue
+        if eof:
+            if started:
+                raise FeedError("fixture ends before its closing bracket")
+            return
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+
+
+def read_fixture(stream):
+    realtor_emails = {}
+    for obj in iter_json_array(stream):
+        fields = obj.get("fields", {})
+        if obj.get("model") == "listings.realtor":
+            realtor_emails[obj["pk"]] = fields.get("email", "")
+        elif obj.get("model") == "listings.listing":
+            record = {name: fields.get(name) for name in (*LISTING_FIELDS, *GALLERY_FIELDS)}
+            record["external_id"] = feed_key(obj["pk"], fields.get("external_id"))
+            record["realtor_email"] = realtor_emails.get(fields.get("realtor"), "")
+            yield record
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl, "fixture": read_fixture}
+
+
+# writers
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Feed records of ``queryset`` straight from a server-side cursor."""
+    rows = queryset.order_by("pk").values_list(
+        "pk", "external_id", "realtor__email", *LISTING_FIELDS
+    ).iterator(chunk_size=chunk_size)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        # one gallery query per chunk
+        galleries = {}
+        photos = ListingPhoto.objects.filter(listing_id__in=[row[0] for row in chunk])
+        for listing_id, name in photos.values_list("listing_id", "image"):
+            galleries.setdefault(listing_id, []).append(name)
+        for pk, external_id, *values in chunk:
+            gallery = galleries.get(pk, [])[1 : len(GALLERY_FIELDS) + 1]
+            gallery += [""] * (len(GALLERY_FIELDS) - len(gallery))
+            yield pk, dict(zip(FEED_FIELDS, [feed_key(pk, external_id), *values, *gallery]))
+
+
+def write_csv(stream, rows):
+    writer = csv.DictWriter(stream, fieldnames=FEED_FIELDS)
+    writer.writeheader()
+    count = 0
+    for _, record in rows:
+        writer.writerow(record)
+        count += 1
+    return count
+
+
+def write_jsonl(stream, rows):
+    count = 0
+    for _, record in rows:
+        stream.write(json.dumps(record, cls=DjangoJSONEncoder) + "\n")
+        count += 1
+    return count
+
+
+def write_fixture(stream, rows):
+    # realtors are written as listings.realtor stubs carrying only the email,
+    # which is all read_fixture needs to resolve them again
+    seen_realtors = {}
+    count = 0
+    separator = "\n"
+
+    def write(obj):
+        nonlocal separator
+        stream.write(separator + json.dumps(obj, cls=DjangoJSONEncoder))
+        separator = ",\n"
+
+    stream.write("[")
+    for pk, record in rows:
+        email = record.pop("realtor_email")
+        realtor_pk = seen_realtors.get(email)
+        if realtor_pk is None:
+            realtor_pk = seen_realtors[email] = len(seen_realtors) + 1
+            write({"model": "listings.realtor", "pk": realtor_pk, "fields": {"email": email}})
+        fields = {**record, "realtor": realtor_pk}
+        write({"model": "listings.listing", "pk": pk, "fields": fields})
+        count += 1
+    stream.write("\n]\n")
+    return count
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "fixture": write_fixture}
+
+
+# import
+
+
+def to_listing(record, realtor_ids):
+    """An unsaved Listing from a feed record; FeedError or ValidationError if invalid."""
+    external_id = (record.get("external_id") or "").strip()
+    if not external_id:
+        raise FeedError("missing external_id")
+    email = (record.get("realtor_email") or "").strip().lower()
+    realtor_id = realtor_ids.get(email)
+    if realtor_id is None:
+        raise FeedError(f"unknown realtor {email!r}")
+    values = {}
+    for name in LISTING_FIELDS:
+        field = Listing._meta.get_field(name)
+        value = record.get(name)
+        if name == "photo_main":
+            # partners may send a listing before its photos
+            values[name] = value or ""
+        else:
+            values[name] = field.clean(value, None)
+    listing = Listing(external_id=external_id, realtor_id=realtor_id, **values)
+    listing.locate()
+    listing.gallery = [
+        name for name in (values["photo_main"], *map(record.get, GALLERY_FIELDS)) if name
+    ]
+    return listing
+
+
+def claim_pk_keys(keys):
+    """
+    Give the ``pk:<id>`` keys among ``keys`` to the listings without an
+    external_id they name, so a feed exported from this database updates its
+    listings instead of adding copies.
+    """
+    ids = [
+        int(key[len(PK_KEY_PREFIX):])
+        for key in keys
+        if key.startswith(PK_KEY_PREFIX) and key[len(PK_KEY_PREFIX):].isdigit()
+    ]
+    if ids:
+        Listing.objects.filter(pk__in=ids, external_id__isnull=True).update(
+            external_id=Concat(Value(PK_KEY_PREFIX), Cast("id", CharField()))
+        )
+
+
+def upsert(listings):
+    """Insert-or-update by external_id in one statement, then replace the galleries."""
+    # the same external_id twice in one statement is an error on PostgreSQL
+    unique = list({listing.external_id: listing for listing in listings}.values())
+    keys = [listing.external_id for listing in unique]
+    claim_pk_keys(keys)
+    # external_id -> (realtor, price) of the rows being replaced, for the
+    # realtor figures
+    previous = {}
+    # file -> variants recorded for it on the rows being replaced; a file
+    # the batch doesn't show again has none until build_thumbnails runs
+    variants = {}
+    stored = Listing.objects.filter(external_id__in=keys).values_list(
+        "external_id", "realtor_id", "price", "photo_main", "photo_main_variants"
+    )
+    for external_id, realtor_id, price, photo, recorded in stored:
+        previous[external_id] = (realtor_id, price)
+        if recorded:
+            variants[photo] = recorded
+    variants.update(
+        ListingPhoto.objects.filter(listing__external_id__in=keys)
+        .exclude(image_variants="")
+        .values_list("image", "image_variants")
+    )
+    for listing in unique:
+        listing.photo_main_variants = variants.get(listing.photo_main.name, "")
+    # sets the pk of updated rows as well as of inserted ones
+    Listing.objects.bulk_create(
+        unique,
+        update_conflicts=True,
+        unique_fields=["external_id"],
+        update_fields=UPDATE_FIELDS,
+    )
+    ListingPhoto.objects.filter(listing__in=unique).delete()
+    ListingPhoto.objects.bulk_create(
+        ListingPhoto(
+            listing=listing, image=name, image_variants=variants.get(name, ""), position=position
+        )
+        for listing in unique
+        for position, name in enumerate(listing.gallery)
+    )
+    summaries.refresh(listing.pk for listing in unique)
+    # as the Listing signals do: exact counts, medians left to recount()
+    counts, repriced = Counter(), set()
+    for listing in unique:
+        realtor_id, price = previous.get(listing.external_id, (None, None))
+        if realtor_id != listing.realtor_id:
+            counts[listing.realtor_id] += 1
+            repriced.add(listing.realtor_id)
+            if realtor_id is not None:
+                counts[realtor_id] -= 1
+                repriced.add(realtor_id)
+        elif price != listing.price:
+            repriced.add(listing.realtor_id)
+    realtor_stats.listings_changed(counts, repriced)
+    return len(unique)
+
@@ -0,0 +1,124 @@
+"""
+Raw SQL for the full text structures Django has no portable field for: an FTS5
+external-content table plus sync triggers on SQLite, a generated tsvector
+column with a GIN index on PostgreSQL. Other vendors get nothing and
+listings.search falls back to the icontains backend.
+
+Kept free of model imports so migrations can use it.
+"""
+from contextlib import contextmanager
+
+
+FTS_TABLE = "listings_listing_fts"
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS listings_listing_fts USING fts5(
+        title, description, address, city,
+        content='listings_listing', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS listings_listing_fts_ai AFTER INSERT ON listings_listing BEGIN
+        INSERT INTO listings_listing_fts(rowid, title, description, address, city)
+        VALUES (new.id, new.title, new.description, new.address, new.city);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS listings_listing_fts_ad AFTER DELETE ON listings_listing BEGIN
+        INSERT INTO listings_listing_fts(listings_listing_fts, rowid, title, description, address, city)
+        VALUES ('delete', old.id, old.title, old.description, old.address, old.city);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS listings_listing_fts_au AFTER UPDATE ON listings_listing BEGIN
+        INSERT INTO listings_listing_fts(listings_listing_fts, rowid, title, description, address, city)
+        VALUES ('delete', old.id, old.title, old.description, old.address, old.city);
+        INSERT INTO listings_listing_fts(rowid, title, description, address, city)
+        VALUES (new.id, new.title, new.description, new.address, new.city);
+    END
+    """,
+    "INSERT INTO listings_listing_fts(listings_listing_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS listings_listing_fts_ai",
+    "DROP TRIGGER IF EXISTS listings_listing_fts_ad",
+    "DROP TRIGGER IF EXISTS listings_listing_fts_au",
+    "DROP TABLE IF EXISTS listings_listing_fts",
+]
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE listings_listing ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(address, '') || ' ' || coalesce(city, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS listing_search_vector_gin
+    ON listings_listing USING gin (search_vector)
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS listing_search_vector_gin",
+    "ALTER TABLE listings_listing DROP COLUMN IF EXISTS search_vector",
+]
+
+FORWARD = {"sqlite": SQLITE_FORWARD, "postgresql": POSTGRES_FORWARD}
+BACKWARD = {"sqlite": SQLITE_BACKWARD, "postgresql": POSTGRES_BACKWARD}
+
+
+def install(connection):
+    for statement in FORWARD.get(connection.vendor, []):
+        with connection.cursor() as cursor:
+            cursor.execute(statement)
+
+
+def uninstall(connection):
+    for statement in BACKWARD.get(connection.vendor, []):
+        with connection.cursor() as cursor:
+            cursor.execute(statement)
+
+
+def ensure_installed(connection):
+    """
+    SQLite drops triggers when Django rebuilds the listings table during an
+    ALTER, so re-create them (and re-index) whenever they've gone missing.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+        if "listings_listing" not in tables:
+            return
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN "
+            "('listings_listing_fts_ai', 'listings_listing_fts_ad', 'listings_listing_fts_au')"
+        )
+        if cursor.fetchone()[0] == 3:
+            return
+    install(connection)
+
+
+@contextmanager
+def suspended(connection):
+    """
+    Drop the SQLite sync triggers for a bulk load and re-index once at the
+    end: the per-row trigger inserts cost more than one rebuild. The
+    PostgreSQL column is generated by the table itself and stays as is.
+    """
+    if connection.vendor != "sqlite":
+        yield
+        return
+    with connection.cursor() as cursor:
+        for statement in SQLITE_BACKWARD:
+            if "TRIGGER" in statement:
+                cursor.execute(statement)
+    try:
+        yield
+    finally:
+        install(connection)
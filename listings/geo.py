@@ -0,0 +1,220 @@
+"""
+Offline geocoding and geohash helpers for radius/bounding-box search.
+
+Listings are located from their zipcode with a centroid table
+(``settings.GEO_ZIPCODE_CENTROIDS``, CSV ``zipcode,latitude,longitude`` or the
+Census ZCTA gazetteer file as published), falling back to the centroid of
+their state, so no network geocoder is needed. The bundled table has the
+~42,000 US zipcodes with their state; pointing the setting at a newer
+gazetteer needs a ``manage.py geocode_listings --all``.
+
+Each located listing also stores the geohash of its position. Geohash cells
+are prefixes, so a cell is a plain range ``[cell, cell + "~")`` of the indexed
+column on any database: searches first keep the few cells covering the
+query's bounding box, then the exact lat/lng box, then the haversine
+distance.
+
+Boxes are (south, west, north, east). One crossing the antimeridian, in the
+Aleutians or a viewport panned over the Pacific, has west > east and is
+searched as two longitude ranges.
+"""
+import csv
+import math
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import F, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = 69.0
+MAX_RADIUS_MILES = 250
+GEOHASH_PRECISION = 9
+MAX_COVER_CELLS = 12
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# sorts after every BASE32 character, closes a prefix range
+PREFIX_END = "~"
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+# geocoding
+
+
+def _read_centroids(path, key_columns):
+    centroids = {}
+    with open(path, newline="", encoding="utf-8") as stream:
+        delimiter = "\t" if "\t" in stream.readline() else ","
+        stream.seek(0)
+        reader = csv.reader(stream, delimiter=delimiter)
+        header = [name.strip().lower() for name in next(reader)]
+        key = next(header.index(name) for name in key_columns if name in header)
+        lat = next(header.index(name) for name in ("latitude", "intptlat") if name in header)
+        lng = next(header.index(name) for name in ("longitude", "intptlong") if name in header)
+        for row in reader:
+            if row:
+                centroids[row[key].strip().upper()] = (float(row[lat]), float(row[lng]))
+    return centroids
+
+
+@lru_cache(maxsize=None)
+def zipcode_centroids():
+    path = getattr(settings, "GEO_ZIPCODE_CENTROIDS", DATA_DIR / "zip_centroids.csv")
+    return _read_centroids(path, ("zipcode", "geoid"))
+
+
+@lru_cache(maxsize=None)
+def zipcodes_by_state():
+    """state -> zipcodes of the bundled table, what synthetic listings draw from."""
+    by_state = {}
+    with open(DATA_DIR / "zip_centroids.csv", newline="", encoding="utf-8") as stream:
+        for row in csv.DictReader(stream):
+            by_state.setdefault(row["state"], []).append(row["zipcode"])
+    return by_state
+
+
+@lru_cache(maxsize=None)
+def state_centroids():
+    return _read_centroids(DATA_DIR / "state_centroids.csv", ("state",))
+
+
+def geocode_zipcode(zipcode):
+    return zipcode_centroids().get((zipcode or "").strip()[:5])
+
+
+def geocode(zipcode, state=""):
+    """(latitude, longitude) of a zipcode, else of the state, else None."""
+    return geocode_zipcode(zipcode) or state_centroids().get((state or "").strip().upper())
+
+
+# geohash
+
+
+def _cell_size(precision):
+    """(height, width) in degrees of a geohash cell of ``precision`` characters."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bit = value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            interval[0] = middle
+        else:
+            value *= 2
+            interval[1] = middle
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(BASE32[value])
+            bit = value = 0
+    return "".join(chars)
+
+
+def cover(south, west, north, east, max_cells=MAX_COVER_CELLS):
+    """
+    Geohash cells covering a bounding box: the longest cells for which at
+    most ``max_cells`` are needed, so the index is probed with a few short
+    ranges rather than many tiny ones.
+    """
+    best = [""]
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        height, width = _cell_size(precision)
+        rows = math.floor((north + 90) / height) - math.floor((south + 90) / height) + 1
+        columns = math.floor((east + 180) / width) - math.floor((west + 180) / width) + 1
+        if rows * columns > max_cells:
+            break
+        first_lat = (math.floor((south + 90) / height) + 0.5) * height - 90
+        first_lng = (math.floor((west + 180) / width) + 0.5) * width - 180
+        best = [
+            encode(first_lat + row * height, first_lng + column * width, precision)
+            for row in range(rows)
+            for column in range(columns)
+        ]
+    return best
+
+
+def _wrap(longitude):
+    return (longitude + 180.0) % 360.0 - 180.0
+
+
+def bounding_box(latitude, longitude, radius):
+    """
+    (south, west, north, east) enclosing a circle of ``radius`` miles; west >
+    east when the circle crosses the antimeridian.
+    """
+    dlat = radius / MILES_PER_DEGREE
+    south, north = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    dlng = radius / (MILES_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    if dlng >= 180.0 or south == -90.0 or north == 90.0:
+        # around the whole parallel, or over a pole
+        return south, -180.0, north, 180.0
+    return south, _wrap(longitude - dlng), north, _wrap(longitude + dlng)
+
+
+def longitude_ranges(west, east):
+    """The (west, east) ranges of a box's longitudes, two when it crosses the antimeridian."""
+    if west <= east:
+        return [(west, east)]
+    return [(west, 180.0), (-180.0, east)]
+
+
+def in_box(latitude, longitude, south, west, north, east):
+    """Whether the point is inside the box, as ``within_box`` filters."""
+    return south <= latitude <= north and any(
+        low <= longitude <= high for low, high in longitude_ranges(west, east)
+    )
+
+
+def distance(latitude, longitude, other_latitude, other_longitude):
+    """Haversine distance in miles between two points, as ``distance_to`` computes it."""
+    lat, other_lat = math.radians(latitude), math.radians(other_latitude)
+    a = (
+        math.sin((other_lat - lat) / 2) ** 2
+        + math.cos(lat) * math.cos(other_lat) * math.sin(math.radians(other_longitude - longitude) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+
+# queries
+
+
+def within_box(queryset, south, west, north, east):
+    """Listings inside the box: geohash ranges for the index, then exact bounds."""
+    cells = Q()
+    bounds = Q()
+    for low, high in longitude_ranges(west, east):
+        for cell in cover(south, low, north, high):
+            cells |= Q(geohash__gte=cell, geohash__lt=cell + PREFIX_END)
+        bounds |= Q(longitude__range=(low, high))
+    return queryset.filter(cells).filter(bounds, latitude__range=(south, north))
+
+
+def distance_to(latitude, longitude):
+    """Haversine distance in miles from the point to each row, as an expression."""
+    lat, lng = math.radians(latitude), math.radians(longitude)
+    half_dlat = (Radians(F("latitude")) - Value(lat)) / 2
+    half_dlng = (Radians(F("longitude")) - Value(lng)) / 2
+    a = Power(Sin(half_dlat), 2) + Value(math.cos(lat)) * Cos(Radians(F("latitude"))) * Power(
+        Sin(half_dlng), 2
+    )
+    return Value(2 * EARTH_RADIUS_MILES) * ASin(Sqrt(a))
+
+
+def within_radius(queryset, latitude, longitude, radius):
+    """Listings within ``radius`` miles, annotated with their ``distance``."""
+    return (
+        within_box(queryset, *bounding_box(latitude, longitude, radius))
+        .annotate(distance=distance_to(latitude, longitude))
+        .filter(distance__lte=radius)
+    )
@@ -0,0 +1,194 @@
+"""
+Derived images (resized WebP/AVIF/JPEG variants) for listing and realtor photos.
+
+For an original ``listings/2024/01/31/home-1.jpg`` the variants live next to
+the other media under ``derived/listings/2024/01/31/home-1.jpg-<width>w.<ext>``,
+one per width in ``WIDTHS`` and format in ``FORMATS``; the original's
+extension stays in the name so ``home-1.png`` gets its own. Images narrower
+than a width are saved at their own size rather than upscaled, so every
+variant always exists once an original is processed.
+
+Rendering never asks the storage: the formats written for a file are
+recorded in the ``<field>_variants`` column of the rows that show it (see
+``listings.models.DerivedImagesMixin``), and templates fall back to the
+original while it is blank. Generation runs in a process pool, after the
+transaction that saved another file into a row commits (see
+``listings.signals``), never on the request path; the build_thumbnails
+command backfills existing media, including the rows bulk inserted by feed
+imports and populate_db, with the same code.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+
+WIDTHS = (320, 640, 1280)
+QUALITY = 80
+FORMATS = tuple(
+    fmt for fmt, available in (
+        ("avif", features.check("avif")),
+        ("webp", features.check("webp")),
+        ("jpeg", True),
+    )
+    if available
+)
+EXTENSIONS = {"avif": "avif", "webp": "webp", "jpeg": "jpg"}
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+# every (model, image field) whose files have variants; labels, as pool
+# workers import this module before setting Django up
+IMAGE_COLUMNS = (
+    ("listings.Listing", "photo_main"),
+    ("listings.ListingSummary", "photo_main"),
+    ("listings.ListingPhoto", "image"),
+    ("listings.Realtor", "photo"),
+)
+RECORD_CHUNK_SIZE = 2000
+
+
+def variant_name(name, width, fmt):
+    return f"derived/{name}-{width}w.{EXTENSIONS[fmt]}"
+
+
+def variant_formats(image):
+    """Formats recorded for the variants of ``image``, an ImageField value; empty until generated."""
+    recorded = getattr(image.instance, f"{image.field.name}_variants", "")
+    return [fmt for fmt in recorded.split(",") if fmt]
+
+
+def has_variants(image):
+    return bool(image) and bool(variant_formats(image))
+
+
+def generate_variants(name, force=False):
+    """
+    Write the variants of the stored image ``name`` unless a complete set
+    exists; returns how many were written, None if there is no image to
+    derive them from.
+    """
+    if not name:
+        return None
+    # variants are written largest last, so the last one marks a complete set
+    if not force and default_storage.exists(variant_name(name, WIDTHS[-1], FORMATS[-1])):
+        return 0
+    try:
+        with default_storage.open(name, "rb") as original:
+            image = ImageOps.exif_transpose(Image.open(original))
+            image.load()
+    except (OSError, ValueError):
+        # missing or not an image, nothing to derive from
+        return None
+
+    written = 0
+    for width in WIDTHS:
+        resized = image.copy()
+        resized.thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+        for fmt in FORMATS:
+            target = variant_name(name, width, fmt)
+            converted = resized
+            if fmt == "jpeg" and resized.mode not in ("RGB", "L"):
+                converted = resized.convert("RGB")
+            buffer = BytesIO()
+            converted.save(buffer, fmt.upper(), quality=QUALITY)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+            written += 1
+    return written
+
+
+def record_variants(name, rows, formats=FORMATS):
+    """
+    Record ``formats`` as the variants of ``name`` on ``rows``, (model, image
+    field, pks) triples, skipping the ones holding another file by now.
+    Returns how many rows changed.
+    """
+    value = ",".join(formats)
+    changed = 0
+    for model, field, pks in rows:
+        column = f"{field}_variants"
+        changed += (
+            model.objects.filter(pk__in=pks, **{field: name})
+            .exclude(**{column: value})
+            .update(**{column: value})
+        )
+    return changed
+
+
+def derive(name, rows, force=False):
+    """Generate the variants of ``name`` and record them on ``rows``; returns how many rows changed."""
+    if generate_variants(name, force) is None:
+        return 0
+    return record_variants(name, rows)
+
+
+def record_derived(names, formats=FORMATS, chunk_size=RECORD_CHUNK_SIZE):
+    """
+    Record ``formats`` on every row of ``IMAGE_COLUMNS`` showing one of
+    ``names``, for build_thumbnails. Returns the ``(kind, pk)`` pairs of the
+    listings and realtors whose rows changed.
+    """
+    value = ",".join(formats)
+    changed = set()
+    for label, field in IMAGE_COLUMNS:
+        model = apps.get_model(label)
+        column = f"{field}_variants"
+        owner = "listing_id" if label == "listings.ListingPhoto" else "pk"
+        kind = "realtor" if label == "listings.Realtor" else "listing"
+        rows = model.objects.exclude(**{column: value}).values_list("pk", owner, field)
+        # collected first: SQLite can't update a table while reading it
+        found = [row for row in rows.iterator(chunk_size=chunk_size) if row[2] in names]
+        for start in range(0, len(found), chunk_size):
+            chunk = found[start:start + chunk_size]
+            # a row given another file meanwhile keeps its blank column; only
+            # this chunk's names, all of them could pass the variable limit
+            model.objects.filter(
+                pk__in=[pk for pk, _, _ in chunk],
+                **{f"{field}__in": {name for _, _, name in chunk}},
+            ).update(**{column: value})
+            changed.update((kind, owner_pk) for _, owner_pk, _ in chunk)
+    return changed
+
+
+def init_worker():
+    import django
+
+    django.setup()
+
+
+_executor = None
+
+
+def executor(workers=None):
+    """Process pool shared by the web process; spawned so workers don't inherit sockets."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=workers or settings.IMAGE_WORKERS or 2,
+            mp_context=get_context("spawn"),
+            initializer=init_worker,
+        )
+    return _executor
+
+
+def schedule(images, on_recorded=None):
+    """
+    Derive the ``(name, rows)`` ``images`` (see ``derive``) in the
+    background; ``on_recorded()`` is called (in a pool thread) once for
+    every image recorded on a row.
+    """
+    for name, rows in images:
+        if not name:
+            continue
+        future = executor().submit(derive, name, rows)
+        if on_recorded is not None:
+            future.add_done_callback(
+                lambda done: done.exception() is None and done.result() and on_recorded()
+            )
@@ -0,0 +1,93 @@
+"""
+Realtor inboxes of contact inquiries.
+
+A Contact carries a copy of its listing's realtor, so an inbox page is one
+range of the (realtor, contact_date) index, the (listing, contact_date) one
+for a single listing, however many inquiries the table holds. The unread
+count of a realtor is a counter in ``RealtorStats``: the Contact signals
+count inquiries in and out, ``mark_read`` counts them as read, and
+``recount()`` recomputes every counter after bulk inserts.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Contact, Listing, RealtorStats
+
+
+PER_PAGE = 20
+
+
+def inquiries(realtor=None, listing=None, unread=False, since=None, until=None):
+    """
+    Inquiries to ``realtor`` (everyone's when None), optionally about one
+    ``listing``, unread only, or sent between the ``since`` and ``until`` dates.
+    """
+    contacts = Contact.objects.select_related("listing").only(
+        "name", "email", "phone", "message", "contact_date", "is_read", "realtor_id",
+        "listing__title",
+    )
+    if realtor is not None:
+        contacts = contacts.filter(realtor=realtor)
+    if listing is not None:
+        contacts = contacts.filter(listing=listing)
+    if unread:
+        contacts = contacts.filter(is_read=False)
+    # bounds on the column itself, a __date lookup wraps it and skips the index
+    if since is not None:
+        contacts = contacts.filter(contact_date__gte=_midnight(since))
+    if until is not None:
+        contacts = contacts.filter(contact_date__lt=_midnight(until + timedelta(days=1)))
+    return contacts
+
+
+def _midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def count_unread(changes):
+    """Add ``{realtor_id: delta}`` to the unread counters."""
+    for realtor_id, delta in changes.items():
+        if realtor_id is not None and delta:
+            RealtorStats.objects.filter(pk=realtor_id).update(
+                unread_contacts=F("unread_contacts") + delta
+            )
+
+
+def mark_read(contacts):
+    """Mark the unread ones of ``contacts`` read; returns how many were."""
+    marked = 0
+    with transaction.atomic():
+        unread = contacts.filter(is_read=False)
+        # one update per realtor: its row count is what that realtor's
+        # counter loses, whatever was marked read concurrently
+        for realtor_id in set(unread.order_by().values_list("realtor_id", flat=True)):
+            count = unread.filter(realtor_id=realtor_id).update(is_read=True)
+            count_unread({realtor_id: -count})
+            marked += count
+    return marked
+
+
+def assign_realtors():
+    """Copy the realtor of their listing into bulk inserted contacts."""
+    return Contact.objects.filter(realtor__isnull=True, listing__isnull=False).update(
+        realtor_id=Subquery(Listing.objects.filter(pk=OuterRef("listing_id")).values("realtor_id"))
+    )
+
+
+def recount():
+    """Recompute every realtor's unread counter."""
+    counts = dict(
+        Contact.objects.filter(is_read=False, realtor__isnull=False)
+        .order_by()
+        .values("realtor_id")
+        .annotate(count=Count("id"))
+        .values_list("realtor_id", "count")
+    )
+    with transaction.atomic():
+        RealtorStats.objects.exclude(pk__in=counts).update(unread_contacts=0)
+        for realtor_id, count in counts.items():
+            RealtorStats.objects.filter(pk=realtor_id).update(unread_contacts=count)
+    return sum(counts.values())
@@ -0,0 +1,223 @@
+"""
+Per-request query and timing instrumentation.
+
+``metrics_middleware`` (first in ``MIDDLEWARE``) opens a ``RequestMetrics``
+for every request. An execute wrapper installed on every database connection
+(see ``ListingsConfig.ready``) adds each query's duration and fingerprint to
+the current request's metrics, and ``TimedDjangoTemplates`` adds template
+render time. Lazy querysets evaluated while rendering count as both. When
+the response leaves, the metrics go out as one record on the
+``listings.requests`` logger (JSON, sampled, see ``listings.logs``) and, in
+DEBUG or for staff users only, as a ``Server-Timing`` header (shown in the
+browser's network panel): query counts and database time would tell anyone
+else about the schema and the load.
+
+A fingerprint is the SQL with its parameters left out, so an N+1 loop shows
+up as one fingerprint run once per row. ``settings.REQUEST_BUDGETS`` caps
+queries, repeated queries and database time per URL name; a request over
+budget is logged as a warning, and raises ``BudgetExceeded`` once
+``enforce_budgets()`` has been called, as the test runner
+(``listings.testing.BudgetTestRunner``) does, so the regression fails the
+test that made the request.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+
+logger = logging.getLogger("listings.requests")
+
+# placeholder lists of any length, IN (%s, %s, ...), fingerprint the same
+PLACEHOLDER_LIST = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+REPORTED_DUPLICATES = 3
+
+_metrics = ContextVar("request_metrics", default=None)
+_strict = False
+
+
+class BudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.fingerprints = Counter()
+
+    @property
+    def duplicates(self):
+        """(sql, count) of the fingerprints run more than once, most repeated first."""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count > 1]
+
+    @property
+    def repeated(self):
+        return sum(count - 1 for _, count in self.duplicates)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        return ", ".join([
+            f'db;desc="{self.queries} queries";dur={self.db_time * 1000:.1f}',
+            f'dup;desc="{self.repeated} repeated"',
+            f"tpl;dur={self.template_time * 1000:.1f}",
+            f"total;dur={self.elapsed() * 1000:.1f}",
+        ])
+
+    def as_dict(self):
+        return {
+            "queries": self.queries,
+            "db_ms": round(self.db_time * 1000, 2),
+            "template_ms": round(self.template_time * 1000, 2),
+            "total_ms": round(self.elapsed() * 1000, 2),
+            "repeated": self.repeated,
+            "duplicates": [
+                {"sql": sql[:200], "count": count}
+                for sql, count in self.duplicates[:REPORTED_DUPLICATES]
+            ],
+        }
+
+    def over_budget(self, budget):
+        """Descriptions of the limits of ``budget`` this request went over."""
+        exceeded = []
+        if self.queries > budget.get("queries", self.queries):
+            exceeded.append(f"{self.queries} queries > {budget['queries']}")
+        if self.repeated > budget.get("repeated", self.repeated):
+            exceeded.append(f"{self.repeated} repeated queries > {budget['repeated']}")
+        db_ms = self.db_time * 1000
+        if db_ms > budget.get("db_ms", db_ms):
+            exceeded.append(f"{db_ms:.1f}ms in the database > {budget['db_ms']}ms")
+        return exceeded
+
+
+def enforce_budgets(enabled=True):
+    global _strict
+    _strict = enabled
+
+
+def current_metrics():
+    return _metrics.get()
+
+
+def fingerprint(sql):
+    return PLACEHOLDER_LIST.sub("(...)", sql)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.queries += 1
+        metrics.fingerprints[fingerprint(sql)] += 1
+
+
+def install_recorder(connection, **kwargs):
+    """connection_created receiver: time the queries of every new connection."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        metrics = _metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, adding render time to the request metrics."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def _shows_timing(user):
+    return settings.DEBUG or bool(user is not None and user.is_staff)
+
+
+def finish(request, response, metrics, user=None):
+    response.metrics = metrics
+    if _shows_timing(user):
+        response["Server-Timing"] = metrics.server_timing()
+    match = request.resolver_match
+    url_name = match.url_name if match else None
+    line = {
+        "method": request.method,
+        "path": request.path,
+        "url_name": url_name,
+        "status": response.status_code,
+        **metrics.as_dict(),
+    }
+    budget = getattr(settings, "REQUEST_BUDGETS", {}).get(url_name)
+    exceeded = metrics.over_budget(budget) if budget else []
+    if exceeded:
+        line["over_budget"] = exceeded
+        logger.warning("request over budget", extra={"data": line})
+        if _strict:
+            raise BudgetExceeded(
+                f"{request.method} {request.path} ({url_name}) over budget: "
+                + "; ".join(exceeded)
+                + "".join(f"\n  {count}x {sql}" for sql, count in metrics.duplicates)
+            )
+    else:
+        logger.info("request", extra={"data": line})
+    return response
+
+
+def metrics_middleware(get_response):
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            metrics = RequestMetrics()
+            token = _metrics.set(metrics)
+            try:
+                response = await get_response(request)
+            finally:
+                _metrics.reset(token)
+            # cached on the request when the view already asked for it
+            auser = getattr(request, "auser", None)
+            user = await auser() if auser is not None and not settings.DEBUG else None
+            return finish(request, response, metrics, user)
+
+        return markcoroutinefunction(middleware)
+
+    def middleware(request):
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        try:
+            response = get_response(request)
+        finally:
+            _metrics.reset(token)
+        return finish(request, response, metrics, getattr(request, "user", None))
+
+    return middleware
+
+
+metrics_middleware.sync_capable = True
+metrics_middleware.async_capable = True
+
@@ -0,0 +1,101 @@
+"""
+Structured, sampled, non-blocking logging (wired up in ``settings.LOGGING``).
+
+* ``JsonFormatter`` writes one JSON object per record: time, level, logger,
+  message and the ``data`` dict passed as ``extra={"data": {...}}``.
+* ``SampledFilter(rate)`` keeps that fraction of the records below WARNING,
+  so per-request and per-search lines can stay on in production.
+* ``BackgroundHandler`` only puts the record on a bounded queue; a listener
+  thread formats it and writes it with the real handler (``handler_class``),
+  so a request never waits on the disk or the terminal. When the queue is
+  full records are dropped and counted rather than blocking the request.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from datetime import datetime, timezone
+
+from django.utils.module_loading import import_string
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        line = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        line.update(getattr(record, "data", None) or {})
+        if record.exc_info:
+            line["exception"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+
+class SampledFilter(logging.Filter):
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+
+    def __init__(self, handler_class="logging.StreamHandler", max_queue=10000, **options):
+        super().__init__(queue.Queue(max_queue))
+        self.target = import_string(handler_class)(**options)
+        self.listener = None
+        self.pid = None
+        self.dropped = 0
+
+    def setFormatter(self, formatter):
+        # formatting happens in the listener thread, by the target handler
+        self.target.setFormatter(formatter)
+
+    def prepare(self, record):
+        # resolve the message now, while its arguments hold their current values
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        # the listener thread doesn't survive a fork (gunicorn --preload)
+        if self.pid != os.getpid():
+            self.start()
+        super().emit(record)
+
+    def start(self):
+        self.pid = os.getpid()
+        self.listener = logging.handlers.QueueListener(
+            self.queue, self.target, respect_handler_level=True
+        )
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+
+    def close(self):
+        self.stop()
+        self.target.close()
+        super().close()
@@ -0,0 +1,82 @@
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from listings import search_cache
+from listings.facets import aggregate_facets, facets_for
+from listings.models import SearchLog
+from listings.search import match_listings
+
+
+class Command(BaseCommand):
+    help = (
+        "Rank the searches of the search log, precompute the results of the top ones "
+        "and report the share of searches the result cache answers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=50, help="searches to precompute")
+        parser.add_argument("--days", type=float, default=7, help="window of the log to rank")
+        parser.add_argument("--no-warm", action="store_true", help="only report")
+        parser.add_argument(
+            "--keep-days", type=float, default=90,
+            help="delete log rows older than this, 0 keeps everything",
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options["days"])
+        window = SearchLog.objects.filter(searched_at__gte=since)
+        totals = window.aggregate(searches=Count("id"), hits=Count("id", filter=Q(source="cache")))
+        if not totals["searches"]:
+            self.stdout.write(f"no searches logged in the last {options['days']:g} days")
+            self.prune(options["keep_days"])
+            return
+
+        top = list(
+            window.values("key")
+            .annotate(searches=Count("id"), last=Max("id"))
+            .order_by("-searches", "key")[: options["top"]]
+        )
+        params = dict(
+            SearchLog.objects.filter(id__in=[row["last"] for row in top]).values_list("key", "params")
+        )
+
+        self.stdout.write(f"{'searches':>9} {'share':>7} {'results':>8}  params")
+        warmed = covered = 0
+        start = time.perf_counter()
+        for row in top:
+            query = params[row["key"]]
+            results = ""
+            if not options["no_warm"]:
+                results = search_cache.warm(query)
+                facets_for(query, lambda: aggregate_facets(match_listings(query)))
+                warmed += 1
+            covered += row["searches"]
+            self.stdout.write(
+                f"{row['searches']:>9} {row['searches'] / totals['searches']:>7.1%} "
+                f"{results:>8}  {json.dumps(query, sort_keys=True)}"
+            )
+
+        self.stdout.write(
+            f"{totals['searches']} searches in the last {options['days']:g} days, "
+            f"{len(top)} distinct in the top {options['top']} cover {covered / totals['searches']:.1%}"
+        )
+        self.stdout.write(
+            f"result cache hit ratio: {totals['hits'] / totals['searches']:.1%} "
+            f"({totals['hits']} of {totals['searches']})"
+        )
+        if warmed:
+            self.stdout.write(f"precomputed {warmed} searches in {time.perf_counter() - start:.2f}s")
+        self.prune(options["keep_days"])
+
+    def prune(self, keep_days):
+        if keep_days:
+            deleted, _ = SearchLog.objects.filter(
+                searched_at__lt=timezone.now() - timedelta(days=keep_days)
+            ).delete()
+            if deleted:
+                self.stdout.write(f"deleted {deleted} log rows older than {keep_days:g} days")
@@ -0,0 +1,84 @@
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from listings.analytics import COLUMNS, Snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark market statistics and comparables on a synthetic in-memory "
+        "snapshot (the database isn't touched)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--cities", type=int, default=2000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+        rng = np.random.default_rng(options["seed"])
+        bedrooms = rng.integers(1, 11, rows)
+        sqft = rng.integers(500, 1200, rows) + bedrooms * rng.integers(250, 600, rows)
+        values = {
+            "id": np.arange(1, rows + 1),
+            "price": rng.integers(50, 2000, rows) * 1000,
+            "sqft": sqft,
+            "bedrooms": bedrooms,
+            "bathrooms": np.maximum(1, rng.integers(1, 11, rows) % (bedrooms + 1)),
+            "lot_size": rng.uniform(0, 2, rows).round(2),
+            "city": rng.integers(0, options["cities"], rows),
+            "state": rng.integers(0, 51, rows),
+        }
+        columns = {name: values[name].astype(dtype) for name, dtype in COLUMNS}
+        snapshot = Snapshot(
+            columns,
+            [f"city {n}" for n in range(options["cities"])],
+            [f"S{n:02d}" for n in range(51)],
+        )
+        self.stdout.write(f"{rows:,} synthetic listings")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "analytics.snapshot")
+            self.report("save", self.measure(lambda: snapshot.save(path), 1))
+            self.stdout.write(f"{'size':>28} {os.path.getsize(path) / 2**20:>9.1f} MiB")
+            self.report("load (mmap)", self.measure(lambda: Snapshot.load(path), repeat))
+            mapped = Snapshot.load(path)
+
+            ids = rng.integers(1, rows + 1, repeat)
+            for name, target in (("in memory", snapshot), ("memory-mapped", mapped)):
+                self.report(
+                    f"market, state {name}",
+                    self.measure(lambda: target.market(state="S07"), repeat),
+                )
+                self.report(
+                    f"market, city {name}",
+                    self.measure(lambda: target.market(city="city 7"), repeat),
+                )
+                ids_iter = iter(ids.tolist())
+                self.report(
+                    f"comparables {name}",
+                    self.measure(lambda: target.comparables(next(ids_iter), 10), repeat),
+                )
+            # with pending writes the overlay is merged once, then cached
+            for listing_id in ids[:100].tolist():
+                mapped.remove(listing_id)
+            self.report("overlay merge (100 writes)", self.measure(lambda: mapped.columns, 1))
+            del mapped
+
+    def measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def report(self, name, ms):
+        self.stdout.write(f"{name:>28} {ms:>9.2f} ms")
@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from listings.models import Listing
+from listings.pagination import PER_PAGE, encode_cursor
+
+
+class Command(BaseCommand):
+    help = "Benchmark keyset vs offset pagination of the listings browse page"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--depths", default="0,1000,10000,100000,500000")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        total = Listing.objects.count()
+        self.stdout.write(f"{total} listings in the database")
+        if not total:
+            self.stdout.write("nothing to benchmark, run populate_db first")
+            return
+
+        client = Client()
+        url = reverse("listings")
+        depths = [int(d) for d in options["depths"].split(",") if int(d) < total]
+
+        self.stdout.write(
+            f"{'depth':>10} {'keyset q':>9} {'keyset ms':>10} "
+            f"{'offset q':>9} {'offset ms':>10}"
+        )
+        for depth in depths:
+            query = ""
+            if depth:
+                # locating the cursor row is setup, not part of the timed request
+                anchor = Listing.objects.newest().only("id", "list_date")[depth - 1]
+                query = f"?after={encode_cursor(anchor)}"
+
+            keyset_queries, keyset_ms = self.measure(
+                lambda: client.get(url + query), options["repeat"]
+            )
+            offset_queries, offset_ms = self.measure(
+                lambda: self.offset_page(depth), options["repeat"]
+            )
+            self.stdout.write(
+                f"{depth:>10} {keyset_queries:>9} {keyset_ms:>10.2f} "
+                f"{offset_queries:>9} {offset_ms:>10.2f}"
+            )
+
+    def offset_page(self, depth):
+        """The old approach: unbounded queryset sliced by Paginator."""
+        paginator = Paginator(Listing.objects.newest(), PER_PAGE)
+        page = paginator.get_page(depth // PER_PAGE + 1)
+        for listing in page:
+            listing.realtor.name
+
+    def measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - start) * 1000)
+        return len(ctx.captured_queries), statistics.median(timings)
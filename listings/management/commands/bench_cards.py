@@ -0,0 +1,88 @@
+import re
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template import Context, Engine
+from django.template.backends.django import get_installed_libraries
+
+from listings.models import ListingSummary
+from listings.versions import bump_object_version
+
+
+CARD = "partials/__listing_card.html"
+CACHE_TAGS = re.compile(r"\{% (?:cache [^%]*|endcache) %\}")
+PAGE = (
+    "{% load listing_cards %}"
+    "{% for listing in listings|with_card_versions %}{% include card %}{% endfor %}"
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Render a page of listing cards: the card markup re-rendered per request "
+        "(before) vs the fragment-cached card include (after), with and without the "
+        "cached template loader"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cards", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        listings = list(ListingSummary.objects.newest()[: options["cards"]])
+        if not listings:
+            self.stdout.write("nothing to benchmark, run populate_db first")
+            return
+
+        def invalidate():
+            for listing in listings:
+                bump_object_version("listing", listing.pk)
+
+        self.stdout.write(f"{len(listings)} cards, median ms of {options['repeat']} renders")
+        self.stdout.write(f"{'loader':>8} {'uncached':>9} {'cold':>9} {'warm':>9} {'load':>9}")
+        for loader in ("plain", "cached"):
+            engine = self.engine(cached=loader == "cached")
+            # the card without its {% cache %} tags, as every page rendered it before
+            source = open(engine.find_template(CARD)[0].origin.name, encoding="utf-8").read()
+            inline = engine.from_string(CACHE_TAGS.sub("", source))
+            page = engine.from_string(PAGE)
+
+            def render(card):
+                return page.render(Context({"listings": listings, "card": card}))
+
+            uncached = self.measure(lambda: render(inline), options["repeat"])
+            # every card changed since it was cached
+            cold = self.measure(lambda: render(CARD), options["repeat"], setup=invalidate)
+            warm = self.measure(lambda: render(CARD), options["repeat"])
+            # what the loader changes: finding and compiling a page per request
+            load = self.measure(lambda: engine.get_template("listings/listings.html"), options["repeat"])
+            self.stdout.write(
+                f"{loader:>8} {uncached:>9.2f} {cold:>9.2f} {warm:>9.2f} {load:>9.2f}"
+            )
+
+    @staticmethod
+    def engine(cached):
+        loaders = [
+            "django.template.loaders.filesystem.Loader",
+            "django.template.loaders.app_directories.Loader",
+        ]
+        if cached:
+            loaders = [("django.template.loaders.cached.Loader", loaders)]
+        return Engine(
+            dirs=settings.TEMPLATES[0]["DIRS"],
+            loaders=loaders,
+            libraries=get_installed_libraries(),
+        )
+
+    @staticmethod
+    def measure(func, repeat, setup=None):
+        timings = []
+        for _ in range(repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
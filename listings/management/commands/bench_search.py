@@ -0,0 +1,57 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings.models import Listing
+from listings.search import ContainsBackend, get_backend, normalize_params, search_listings
+
+
+SAMPLE_QUERIES = [
+    {"keywords": "pool"},
+    {"keywords": "family home", "state": "CA"},
+    {"keywords": "ocean views", "price": "1000000"},
+    {"state": "CA", "bedrooms": "3", "price": "500000"},
+    {"city": "Los Angeles", "bedrooms": "2"},
+    {"keywords": "garage", "city": "San Diego", "bedrooms": "3", "price": "400000"},
+]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the indexed search engine against the original Q(...) chain"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--limit", type=int, default=9, help="rows fetched per query")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{Listing.objects.count()} listings, backend {type(get_backend()).__name__}")
+        self.stdout.write(f"{'query':<80} {'q-chain ms':>11} {'engine ms':>10} {'rows':>6}")
+        for raw in SAMPLE_QUERIES:
+            params = normalize_params(raw)
+            old_ms, _ = self.measure(lambda: self.q_chain(params), options)
+            new_ms, rows = self.measure(lambda: search_listings(params), options)
+            self.stdout.write(f"{str(params):<80} {old_ms:>11.2f} {new_ms:>10.2f} {rows:>6}")
+
+    def q_chain(self, params):
+        """The pre-engine view: icontains chain plus case-insensitive exact filters."""
+        queryset = Listing.objects.all()
+        if "keywords" in params:
+            queryset = ContainsBackend().search(queryset, params["keywords"])
+        if "city" in params:
+            queryset = queryset.filter(city__iexact=params["city"])
+        if "state" in params:
+            queryset = queryset.filter(state__iexact=params["state"])
+        if "bedrooms" in params:
+            queryset = queryset.filter(bedrooms=params["bedrooms"])
+        if "price" in params:
+            queryset = queryset.filter(price__lte=params["price"])
+        return queryset.order_by("-list_date")
+
+    def measure(self, build, options):
+        timings = []
+        for _ in range(options["repeat"]):
+            start = time.perf_counter()
+            rows = list(build()[: options["limit"]])
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), len(rows)
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from listings.models import Listing
+
+
+SERVERS = {
+    "wsgi": ("config/gunicorn_wsgi.py", "config.wsgi:application"),
+    "asgi": ("config/gunicorn_asgi.py", "config.asgi:application"),
+}
+
+
+async def fetch(reader, writer, host, path):
+    """One keep-alive GET; returns (status, keep_alive)."""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = dict(
+        (name.strip().lower(), value.strip())
+        for name, _, value in (line.partition(":") for line in lines[1:] if line)
+    )
+    await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers.get("connection", "").lower() != "close"
+
+
+async def client(host, port, paths, deadline, latencies, errors):
+    connection = None
+    i = 0
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(host, port)
+            status, keep_alive = await fetch(*connection, f"{host}:{port}", path)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors.append(path)
+            connection = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        if status >= 400:
+            errors.append(path)
+        if not keep_alive:
+            connection[1].close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def slow_client(host, port, path, deadline):
+    """Sends its request a byte at a time, holding a connection like a bad mobile link."""
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n".encode()
+    try:
+        _, writer = await asyncio.open_connection(host, port)
+        for byte in request:
+            if time.monotonic() >= deadline:
+                break
+            writer.write(bytes([byte]))
+            await writer.drain()
+            await asyncio.sleep(0.5)
+        writer.close()
+    except OSError:
+        pass
+
+
+async def load(host, port, paths, concurrency, duration, slow_clients):
+    deadline = time.monotonic() + duration
+    latencies, errors = [], []
+    slow = [
+        asyncio.create_task(slow_client(host, port, paths[0], deadline))
+        for _ in range(slow_clients)
+    ]
+    await asyncio.sleep(0.5 if slow_clients else 0)
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(client(host, port, paths, deadline, latencies, errors) for _ in range(concurrency))
+    )
+    elapsed = time.perf_counter() - started
+    for task in slow:
+        task.cancel()
+    return latencies, errors, elapsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the read-heavy pages on gunicorn sync workers (WSGI) vs "
+        "uvicorn workers (ASGI): throughput and p50/p99 latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--servers", default="wsgi,asgi")
+        parser.add_argument("--workers", type=int, default=2, help="processes per server")
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--duration", type=float, default=10.0, help="seconds per server")
+        parser.add_argument(
+            "--slow-clients", type=int, default=0,
+            help="extra connections that trickle their request in during the run",
+        )
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--url", default="",
+            help="host:port of an already running server to test instead of starting them",
+        )
+
+    def handle(self, *args, **options):
+        listing_id = Listing.objects.values_list("id", flat=True).first()
+        if listing_id is None:
+            raise CommandError("no listings, run populate_db first")
+        # POST-only search needs a CSRF token, the GET pages are the hot path
+        paths = [reverse("home"), reverse("listings"), reverse("listing", args=[listing_id])]
+
+        self.stdout.write(
+            f"{'server':>8} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}"
+        )
+        if options["url"]:
+            host, _, port = options["url"].rpartition(":")
+            self.report(options["url"], self.run_load(host, int(port), paths, options))
+            return
+        for name in options["servers"].split(","):
+            if name not in SERVERS:
+                raise CommandError(f"unknown server {name!r}, expected one of {', '.join(SERVERS)}")
+            process = self.start(name, options)
+            try:
+                self.report(name, self.run_load("127.0.0.1", options["port"], paths, options))
+            finally:
+                process.send_signal(signal.SIGTERM)
+                process.wait(timeout=30)
+
+    def start(self, name, options):
+        config, app = SERVERS[name]
+        env = {**os.environ, "WEB_CONCURRENCY": str(options["workers"])}
+        process = subprocess.Popen(
+            [
+                sys.executable, "-m", "gunicorn", "-c", config, app,
+                "--bind", f"127.0.0.1:{options['port']}", "--log-level", "warning",
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"{name} server exited with {process.returncode}")
+            try:
+                socket.create_connection(("127.0.0.1", options["port"]), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.2)
+        else:
+            process.kill()
+            raise CommandError(f"{name} server didn't start listening")
+        # warm the workers' caches and imports before measuring
+        asyncio.run(load("127.0.0.1", options["port"], ["/"], options["workers"], 1.0, 0))
+        return process
+
+    def run_load(self, host, port, paths, options):
+        return asyncio.run(
+            load(
+                host, port, paths,
+                options["concurrency"], options["duration"], options["slow_clients"],
+            )
+        )
+
+    def report(self, name, result):
+        latencies, errors, elapsed = result
+        latencies.sort()
+        if latencies:
+            p50 = statistics.median(latencies) * 1000
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        else:
+            p50 = p99 = 0.0
+        self.stdout.write(
+            f"{name:>8} {len(latencies):>9} {len(errors):>7} "
+            f"{len(latencies) / elapsed if elapsed else 0:>9.1f} {p50:>8.2f} {p99:>8.2f}"
+        )
@@ -0,0 +1,101 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from listings.models import Listing, ListingSummary
+from listings.pagination import PER_PAGE
+
+
+def table_bytes_per_row(model):
+    """Average stored bytes per row (pages of the table / rows), None if unknown."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        try:
+            if connection.vendor == "sqlite":
+                cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = %s", [table])
+            elif connection.vendor == "postgresql":
+                cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+            else:
+                return None
+        except Exception:
+            # SQLite built without the dbstat table
+            return None
+        size = cursor.fetchone()[0]
+    rows = model.objects.count()
+    return size / rows if size and rows else None
+
+
+class Command(BaseCommand):
+    help = "Compare card queries on Listing (+Realtor join) with the ListingSummary read model"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--depth", type=int, default=10000, help="rows skipped by the deep page")
+
+    def handle(self, *args, **options):
+        total = Listing.objects.count()
+        if not total:
+            self.stdout.write("nothing to benchmark, run populate_db first")
+            return
+        if ListingSummary.objects.count() != total:
+            self.stdout.write("summaries out of date, run build_summaries first")
+            return
+
+        listing_row = table_bytes_per_row(Listing)
+        summary_row = table_bytes_per_row(ListingSummary)
+        if listing_row and summary_row:
+            self.stdout.write(
+                f"bytes per row: listing {listing_row:.0f}, summary {summary_row:.0f} "
+                f"({summary_row / listing_row:.0%})"
+            )
+
+        ids = list(Listing.objects.values_list("id", flat=True))
+        depth = min(options["depth"], total - 1)
+        cases = [
+            (
+                "newest page",
+                lambda: Listing.objects.cards().newest()[:PER_PAGE],
+                lambda: ListingSummary.objects.newest()[:PER_PAGE],
+            ),
+            (
+                f"page at {depth}",
+                lambda: Listing.objects.cards().newest()[depth:depth + PER_PAGE],
+                lambda: ListingSummary.objects.newest()[depth:depth + PER_PAGE],
+            ),
+            (
+                "cheapest page",
+                lambda: Listing.objects.cards().order_by("price", "id")[:PER_PAGE],
+                lambda: ListingSummary.objects.cheapest()[:PER_PAGE],
+            ),
+            (
+                "priciest page",
+                lambda: Listing.objects.cards().order_by("-price", "-id")[:PER_PAGE],
+                lambda: ListingSummary.objects.priciest()[:PER_PAGE],
+            ),
+            (
+                "search page ids",
+                lambda: Listing.objects.cards().in_bulk(random.sample(ids, PER_PAGE)).values(),
+                lambda: ListingSummary.objects.in_bulk(random.sample(ids, PER_PAGE)).values(),
+            ),
+        ]
+
+        self.stdout.write(f"{'query':>16} {'listing ms':>11} {'summary ms':>11} {'speedup':>8}")
+        for name, listing_query, summary_query in cases:
+            listing_ms = self.measure(listing_query, lambda card: card.realtor.name, options["repeat"])
+            summary_ms = self.measure(summary_query, lambda card: card.realtor_name, options["repeat"])
+            self.stdout.write(
+                f"{name:>16} {listing_ms:>11.3f} {summary_ms:>11.3f} "
+                f"{listing_ms / summary_ms if summary_ms else 0:>7.1f}x"
+            )
+
+    def measure(self, query, touch, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for card in query():
+                touch(card)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
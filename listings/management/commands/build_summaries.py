@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings import realtor_stats, summaries
+from listings.models import ListingSummary
+from listings.versions import bump_listings_generation
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ListingSummary card read model and the RealtorStats from the listings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=summaries.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = summaries.rebuild(options["batch_size"])
+        realtors = realtor_stats.rebuild()
+        # cached cards may have been rendered from stale summaries
+        bump_listings_generation()
+        self.stdout.write(
+            f"wrote {written} summaries in {time.perf_counter() - start:.2f}s, "
+            f"{ListingSummary.objects.count()} in the table, and the stats of {realtors} realtors"
+        )
@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+
+from listings.images import (
+    FORMATS,
+    RECORD_CHUNK_SIZE,
+    WIDTHS,
+    generate_variants,
+    init_worker,
+    record_derived,
+)
+from listings.models import Listing, ListingPhoto, Realtor
+from listings.versions import bump_listings_generation, forget_object_versions
+
+
+def image_names():
+    """Every distinct stored listing/realtor photo name."""
+    seen = set()
+    columns = chain(
+        Listing.objects.values_list("photo_main", flat=True).iterator(chunk_size=2000),
+        ListingPhoto.objects.values_list("image", flat=True).iterator(chunk_size=2000),
+        Realtor.objects.values_list("photo", flat=True).iterator(chunk_size=2000),
+    )
+    for name in columns:
+        if name and name not in seen:
+            seen.add(name)
+            yield name
+
+
+class Command(BaseCommand):
+    help = "Generate the responsive variants of existing listing and realtor photos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--force", action="store_true", help="regenerate existing variants")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        images = variants = 0
+        with ProcessPoolExecutor(
+            max_workers=options["workers"],
+            mp_context=get_context("spawn"),
+            initializer=init_worker,
+        ) as pool:
+            futures = {
+                pool.submit(generate_variants, name, options["force"]): name
+                for name in image_names()
+            }
+            derived = set()
+            for future in as_completed(futures):
+                written = future.result()
+                if written is None:
+                    continue
+                derived.add(futures[future])
+                images += bool(written)
+                variants += written
+        # the rows that show them render the variants from now on
+        changed = list(record_derived(derived))
+        for start in range(0, len(changed), RECORD_CHUNK_SIZE):
+            forget_object_versions(changed[start:start + RECORD_CHUNK_SIZE])
+        if changed:
+            bump_listings_generation()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{len(futures)} images checked, {images} processed into {variants} variants "
+            f"({', '.join(FORMATS)} at {', '.join(map(str, WIDTHS))}w) "
+            f"in {elapsed:.2f}s ({images / elapsed if elapsed else 0:.1f} images/s), "
+            f"recorded on the rows of {len(changed)} listings and realtors"
+        )
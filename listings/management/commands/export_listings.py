@@ -0,0 +1,34 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings.feeds import FORMATS, WRITERS, export_rows
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Stream every listing to a CSV/JSONL/fixture feed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="output file, - for stdout")
+        parser.add_argument("--format", choices=FORMATS, default="jsonl")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options["path"] == "-":
+            stream = sys.stdout
+        else:
+            stream = open(options["path"], "w", newline="", encoding="utf-8")
+        started = time.perf_counter()
+        try:
+            rows = export_rows(Listing.objects.all(), chunk_size=options["chunk_size"])
+            count = WRITERS[options["format"]](stream, rows)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        elapsed = time.perf_counter() - started
+        # keep stdout clean for the feed itself
+        self.stderr.write(
+            f"exported {count} listings in {elapsed:.1f}s ({count / elapsed if elapsed else 0:,.0f} rows/s)"
+        )
@@ -0,0 +1,52 @@
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from listings.models import Listing
+from listings.versions import bump_listings_generation
+
+
+class Command(BaseCommand):
+    help = "Locate listings from the offline zipcode centroid table (see listings.geo)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="re-geocode located listings too")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        queryset = Listing.objects.only("id", "zipcode", "state", "latitude", "longitude")
+        if not options["all"]:
+            queryset = queryset.filter(latitude__isnull=True)
+        started = time.perf_counter()
+        located = missing = 0
+        last = 0
+        while True:
+            # pk ranges, rows updated by a batch may leave the filtered set
+            batch = list(queryset.filter(pk__gt=last).order_by("pk")[: options["batch_size"]])
+            if not batch:
+                break
+            # listings share centroids: one UPDATE per distinct location
+            # rather than a CASE per row
+            locations = defaultdict(list)
+            for listing in batch:
+                if options["all"]:
+                    listing.latitude = listing.longitude = None
+                listing.locate()
+                if listing.latitude is None:
+                    missing += 1
+                else:
+                    located += 1
+                locations[listing.latitude, listing.longitude, listing.geohash].append(listing.pk)
+            for (latitude, longitude, geohash), ids in locations.items():
+                Listing.objects.filter(pk__in=ids).update(
+                    latitude=latitude, longitude=longitude, geohash=geohash
+                )
+            last = batch[-1].pk
+        # update() skips the model signals that invalidate cached pages
+        bump_listings_generation()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"located {located} listings, {missing} without a known zipcode or state "
+            f"in {elapsed:.1f}s"
+        )
@@ -0,0 +1,79 @@
+import itertools
+import sys
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from listings.feeds import FORMATS, READERS, FeedError, to_listing, upsert
+from listings.models import Realtor
+from listings.versions import bump_listings_generation
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV/JSONL/fixture listing feed into the database, upserting by external_id"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="feed file, - for stdin")
+        parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--max-errors", type=int, default=20, help="rejected rows reported")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or self.guess_format(options["path"])
+        # one query for every realtor instead of one per row
+        realtor_ids = {
+            email.lower(): pk for email, pk in Realtor.objects.values_list("email", "id")
+        }
+
+        if options["path"] == "-":
+            stream = sys.stdin
+        else:
+            stream = open(options["path"], newline="", encoding="utf-8")
+        started = time.perf_counter()
+        upserted = rejected = 0
+        try:
+            records = enumerate(READERS[fmt](stream), 1)
+            while True:
+                chunk = list(itertools.islice(records, options["batch_size"]))
+                if not chunk:
+                    break
+                batch = []
+                for number, record in chunk:
+                    try:
+                        batch.append(to_listing(record, realtor_ids))
+                    except FeedError as error:
+                        rejected += 1
+                        self.reject(number, str(error), rejected, options)
+                    except ValidationError as error:
+                        rejected += 1
+                        self.reject(number, "; ".join(error.messages), rejected, options)
+                if batch:
+                    with transaction.atomic():
+                        upserted += upsert(batch)
+        except FeedError as error:
+            raise CommandError(str(error))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        # bulk upserts skip the model signals that invalidate cached pages
+        bump_listings_generation()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"upserted {upserted} listings, rejected {rejected} records "
+            f"in {elapsed:.1f}s ({upserted / elapsed if elapsed else 0:,.0f} rows/s)"
+        )
+
+    def reject(self, number, reason, rejected, options):
+        if rejected <= options["max_errors"]:
+            self.stderr.write(f"record {number}: {reason}")
+
+    @staticmethod
+    def guess_format(path):
+        extensions = {"csv": (".csv",), "jsonl": (".jsonl", ".ndjson"), "fixture": (".json",)}
+        for fmt, suffixes in extensions.items():
+            if path.endswith(suffixes):
+                return fmt
+        raise CommandError("can't tell the feed format, pass --format")
@@ -1,290 +1,514 @@
 import datetime
-from django.core.management.base import BaseCommand
-from listings.models import Listing, Realtor
+import itertools
+import multiprocessing
+import random
+import time
+from array import array
 
-import json
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Max
+
+from listings import fulltext, geo, inbox, realtor_stats, summaries
+from listings.choices import state_choices
+from listings.models import Contact, Listing, ListingPhoto, Realtor
+from listings.versions import bump_listings_generation
+
+
+SAMPLE_REALTORS = [
+    {
+        "name": "John Smith",
+        "photo": "photos/realtors/agent1.jpg",
+        "description": "Top performing agent with 10 years of experience",
+        "email": "john.smith@realestate.com",
+        "phone": "555-111-2222",
+        "is_mvp": True,
+        "hire_date": datetime.datetime.strptime("2020-01-15", "%Y-%m-%d"),
+    },
+    {
+        "name": "Sarah Johnson",
+        "photo": "photos/realtors/agent2.jpg",
+        "description": "Specializing in luxury properties",
+        "email": "sarah.j@realestate.com",
+        "phone": "555-333-4444",
+        "is_mvp": False,
+        "hire_date": datetime.datetime.strptime("2021-03-20", "%Y-%m-%d"),
+    },
+    # Add more realtors as needed
+]
+
+SAMPLE_REALTORS.extend(
+    [
+        {
+            "name": "Emily Davis",
+            "photo": "photos/realtors/agent3.jpg",
+            "description": "Expert in first-time homebuyers and affordable housing",
+            "email": "emily.davis@realestate.com",
+            "phone": "555-555-6666",
+            "is_mvp": True,
+            "hire_date": datetime.datetime.strptime(
+                "2018-06-25", "%Y-%m-%d"
+            ),
+        },
+        {
+            "name": "Michael Brown",
+            "photo": "photos/realtors/agent4.jpg",
+            "description": "Specializing in commercial real estate and investment properties",
+            "email": "michael.brown@realestate.com",
+            "phone": "555-777-8888",
+            "is_mvp": False,
+            "hire_date": datetime.datetime.strptime(
+                "2022-02-10", "%Y-%m-%d"
+            ),
+        },
+        {
+            "name": "Olivia Green",
+            "photo": "photos/realtors/agent5.jpg",
+            "description": "Focused on family homes and neighborhood communities",
+            "email": "olivia.green@realestate.com",
+            "phone": "555-999-0000",
+            "is_mvp": False,
+            "hire_date": datetime.datetime.strptime(
+                "2019-11-05", "%Y-%m-%d"
+            ),
+        },
+        {
+            "name": "David Wilson",
+            "photo": "photos/realtors/agent6.jpg",
+            "description": "Leading agent for waterfront and luxury properties",
+            "email": "david.wilson@realestate.com",
+            "phone": "555-123-4567",
+            "is_mvp": True,
+            "hire_date": datetime.datetime.strptime(
+                "2017-08-22", "%Y-%m-%d"
+            ),
+        },
+        {
+            "name": "Sophia Martinez",
+            "photo": "photos/realtors/agent7.jpg",
+            "description": "Expert in relocation and corporate real estate services",
+            "email": "sophia.martinez@realestate.com",
+            "phone": "555-555-7777",
+            "is_mvp": False,
+            "hire_date": datetime.datetime.strptime(
+                "2020-04-30", "%Y-%m-%d"
+            ),
+        },
+    ]
+)
+
+
+SAMPLE_LISTINGS = [
+    {
+        "realtor": 0,  # John Smith
+        "title": "Beautiful Family Home",
+        "address": "123 Main Street",
+        "city": "Beverly Hills",
+        "state": "CA",
+        "zipcode": "90210",
+        "description": "Stunning 4-bedroom home with modern amenities",
+        "price": 750000,
+        "bedrooms": 4,
+        "bathrooms": 3,
+        "garage": 2,
+        "sqft": 2500,
+        "lot_size": 0.5,
+        "list_date": datetime.datetime.strptime("2024-01-01", "%Y-%m-%d"),
+        "photo_main": "photos/homes/home1_main.jpg",
+        "gallery": [f"photos/homes/home1_{i}.jpg" for i in range(1, 7)],
+    },
+    {
+        "realtor": 1,  # Sarah Johnson
+        "title": "Modern Downtown Condo",
+        "address": "456 Park Avenue",
+        "city": "Los Angeles",
+        "state": "CA",
+        "zipcode": "90001",
+        "description": "Luxurious 2-bedroom condo in prime location",
+        "price": 500000,
+        "bedrooms": 2,
+        "bathrooms": 2,
+        "garage": 1,
+        "sqft": 1200,
+        "lot_size": 0.0,
+        "list_date": datetime.datetime.strptime("2024-01-15", "%Y-%m-%d"),
+        "photo_main": "photos/homes/home2_main.jpg",
+        "gallery": [f"photos/homes/home2_{i}.jpg" for i in range(1, 7)],
+    },
+    # Add more listings as needed
+]
+
+SAMPLE_LISTINGS.extend(
+    [
+        {
+            "realtor": 2,  # Emily Davis
+            "title": "Cozy Suburban Cottage",
+            "address": "789 Elm Street",
+            "city": "San Diego",
+            "state": "CA",
+            "zipcode": "92101",
+            "description": "Charming 3-bedroom cottage with a large backyard",
+            "price": 400000,
+            "bedrooms": 3,
+            "bathrooms": 2,
+            "garage": 1,
+            "sqft": 1500,
+            "lot_size": 0.3,
+            "list_date": datetime.datetime.strptime(
+                "2024-02-01", "%Y-%m-%d"
+            ),
+            "photo_main": "photos/homes/home3_main.jpg",
+            "gallery": [f"photos/homes/home3_{i}.jpg" for i in range(1, 7)],
+        },
+        {
+            "realtor": 3,  # Michael Brown
+            "title": "Commercial Office Space",
+            "address": "1010 Market Street",
+            "city": "San Francisco",
+            "state": "CA",
+            "zipcode": "94103",
+            "description": "Spacious office building ideal for startups",
+            "price": 1200000,
+            "bedrooms": 0,
+            "bathrooms": 4,
+            "garage": 5,
+            "sqft": 5000,
+            "lot_size": 1.0,
+            "list_date": datetime.datetime.strptime(
+                "2024-02-15", "%Y-%m-%d"
+            ),
+            "photo_main": "photos/homes/home4_main.jpg",
+            "gallery": [f"photos/homes/home4_{i}.jpg" for i in range(1, 7)],
+        },
+        {
+            "realtor": 4,  # Olivia Green
+            "title": "Spacious Family Home",
+            "address": "222 Oak Drive",
+            "city": "Sacramento",
+            "state": "CA",
+            "zipcode": "95814",
+            "description": "Beautiful 5-bedroom home with a pool",
+            "price": 850000,
+            "bedrooms": 5,
+            "bathrooms": 4,
+            "garage": 2,
+            "sqft": 3200,
+            "lot_size": 0.8,
+            "list_date": datetime.datetime.strptime(
+                "2024-03-01", "%Y-%m-%d"
+            ),
+            "photo_main": "photos/homes/home5_main.jpg",
+            "gallery": [f"photos/homes/home5_{i}.jpg" for i in range(1, 7)],
+        },
+        {
+            "realtor": 5,  # David Wilson
+            "title": "Luxury Beachfront Villa",
+            "address": "333 Ocean Avenue",
+            "city": "Malibu",
+            "state": "CA",
+            "zipcode": "90265",
+            "description": "Exclusive villa with stunning ocean views",
+            "price": 3000000,
+            "bedrooms": 6,
+            "bathrooms": 5,
+            "garage": 3,
+            "sqft": 4500,
+            "lot_size": 1.5,
+            "list_date": datetime.datetime.strptime(
+                "2024-03-15", "%Y-%m-%d"
+            ),
+            "photo_main": "photos/homes/home6_main.jpg",
+            "gallery": [f"photos/homes/home6_{i}.jpg" for i in range(1, 7)],
+        },
+        {
+            "realtor": 6,  # Sophia Martinez
+            "title": "Modern Apartment in Downtown",
+            "address": "555 City Center Blvd",
+            "city": "Los Angeles",
+            "state": "CA",
+            "zipcode": "90015",
+            "description": "Contemporary 1-bedroom apartment with city views",
+            "price": 350000,
+            "bedrooms": 1,
+            "bathrooms": 1,
+            "garage": 1,
+            "sqft": 800,
+            "lot_size": 0.0,
+            "list_date": datetime.datetime.strptime(
+                "2024-04-01", "%Y-%m-%d"
+            ),
+            "photo_main": "photos/homes/home7_main.jpg",
+            "gallery": [f"photos/homes/home7_{i}.jpg" for i in range(1, 7)],
+        },
+    ]
+)
+
+
+# building blocks for synthetic rows, see fake_realtors/fake_listings/fake_contacts
+FIRST_NAMES = [
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda",
+    "David", "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+    "Rodriguez", "Martinez", "Hernandez", "Lopez", "Wilson", "Anderson", "Thomas", "Moore",
+]
+CITIES = [
+    "Springfield", "Riverside", "Franklin", "Greenville", "Bristol", "Clinton",
+    "Fairview", "Salem", "Madison", "Georgetown", "Arlington", "Ashland",
+    "Oxford", "Jackson", "Burlington", "Manchester", "Milton", "Newport",
+]
+STREETS = ["Main", "Oak", "Pine", "Maple", "Cedar", "Elm", "Washington", "Lake", "Hill", "Park"]
+STREET_TYPES = ["Street", "Avenue", "Drive", "Road", "Lane", "Court", "Boulevard"]
+ADJECTIVES = ["Beautiful", "Spacious", "Cozy", "Modern", "Charming", "Luxury", "Renovated", "Sunny"]
+KINDS = ["Family Home", "Condo", "Cottage", "Villa", "Townhouse", "Bungalow", "Apartment", "Ranch"]
+FEATURES = [
+    "a pool", "a large backyard", "ocean views", "a two car garage", "hardwood floors",
+    "an open kitchen", "a finished basement", "mountain views", "a wine cellar", "solar panels",
+]
+STATES = list(state_choices)
+
+
+def fake_realtors(rng, count):
+    for _ in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield Realtor(
+            name=f"{first} {last}",
+            photo=f"photos/realtors/agent{rng.randint(1, 7)}.jpg",
+            description=f"Helping buyers in {rng.choice(CITIES)} for {rng.randint(1, 30)} years",
+            email=f"{first}.{last}{rng.randint(1, 99999)}@realestate.com".lower(),
+            phone=f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+            is_mvp=rng.random() < 0.1,
+        )
+
+
+def fake_listings(rng, count, realtor_ids):
+    for _ in range(count):
+        bedrooms = rng.randint(1, 10)
+        sqft = rng.randint(500, 1200) + bedrooms * rng.randint(250, 600)
+        photo = rng.randint(1, 7)
+        state = rng.choice(STATES)
+        listing = Listing(
+            realtor_id=rng.choice(realtor_ids),
+            title=f"{rng.choice(ADJECTIVES)} {rng.choice(KINDS)}",
+            address=f"{rng.randint(1, 9999)} {rng.choice(STREETS)} {rng.choice(STREET_TYPES)}",
+            city=rng.choice(CITIES),
+            state=state,
+            # a real zipcode of the state, located at its centroid by locate()
+            zipcode=rng.choice(geo.zipcodes_by_state()[state]),
+            description=(
+                f"{bedrooms}-bedroom home with {rng.choice(FEATURES)} and {rng.choice(FEATURES)}"
+            ),
+            price=rng.randint(50, 2000) * 1000,
+            bedrooms=bedrooms,
+            bathrooms=rng.randint(1, max(1, bedrooms)),
+            garage=rng.randint(0, 3),
+            sqft=sqft,
+            lot_size=round(rng.uniform(0, 2), 2),
+            photo_main=f"photos/homes/home{photo}_main.jpg",
+        )
+        listing.locate()
+        listing.gallery = [
+            f"photos/homes/home{photo}_main.jpg",
+            *(f"photos/homes/home{photo}_{i}.jpg" for i in range(1, 7)),
+        ]
+        yield listing
+
+
+def fake_contacts(rng, count, listing_ids):
+    for _ in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield Contact(
+            listing_id=rng.choice(listing_ids),
+            name=f"{first} {last}",
+            email=f"{first}.{last}@example.com".lower(),
+            phone=f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+            message=f"I'd like to schedule a visit, is {rng.choice(FEATURES)} included?",
+        )
+
+
+GENERATORS = {
+    "realtors": (Realtor, fake_realtors),
+    "listings": (Listing, fake_listings),
+    "contacts": (Contact, fake_contacts),
+}
+
+
+# set in each worker process by _init_worker so the (possibly huge) id arrays
+# are sent once per process instead of once per chunk
+_worker_ids = None
+
+
+def _init_worker(ids):
+    global _worker_ids
+    _worker_ids = ids
+
+
+def build_chunk(task):
+    """
+    Synthetic rows of one chunk. Every chunk has its own seed, so a given
+    --seed produces the same data whatever the number of workers.
+    """
+    kind, size, seed, chunk = task
+    model, factory = GENERATORS[kind]
+    rng = random.Random(f"{seed}:{kind}:{chunk}")
+    args = (_worker_ids,) if _worker_ids is not None else ()
+    return list(factory(rng, size, *args))
+
+
+def gallery_photos(listings):
+    """ListingPhoto rows for the ``gallery`` names of freshly inserted listings."""
+    return [
+        ListingPhoto(listing=listing, image=name, position=position)
+        for listing in listings
+        for position, name in enumerate(listing.gallery)
+    ]
+
+
+def insert_gallery(listings):
+    """
+    The gallery rows of freshly inserted listings, as plain tuples: there are
+    7 per listing, and building and compiling ListingPhoto instances for them
+    cost more than the insert itself.
+    """
+    table = ListingPhoto._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            # no variants recorded yet, build_thumbnails backfills them
+            f"INSERT INTO {table} (listing_id, image, image_variants, position) "
+            "VALUES (%s, %s, '', %s)",
+            [
+                (listing.pk, name, position)
+                for listing in listings
+                for position, name in enumerate(listing.gallery)
+            ],
+        )
+
+
+def insert_chunk(kind, rows):
+    # summaries, realtor stats and the full text index are rebuilt once
+    # after all the chunks, see Command.populate_synthetic
+    with transaction.atomic():
+        GENERATORS[kind][0].objects.bulk_create(rows, batch_size=len(rows))
+        if kind == "listings":
+            insert_gallery(rows)
+    return len(rows)
+
+
+def build_and_insert_chunk(task):
+    return insert_chunk(task[0], build_chunk(task))
 
 
 class Command(BaseCommand):
-    help = "Populate database with sample realtors and listings"
-
-    def handle(self, *args, **kwargs):
-        def populate_database():
-            # Create Realtors
-            realtors_data = [
-                {
-                    "name": "John Smith",
-                    "photo": "photos/realtors/agent1.jpg",
-                    "description": "Top performing agent with 10 years of experience",
-                    "email": "john.smith@realestate.com",
-                    "phone": "555-111-2222",
-                    "is_mvp": True,
-                    "hire_date": datetime.datetime.strptime("2020-01-15", "%Y-%m-%d"),
-                },
-                {
-                    "name": "Sarah Johnson",
-                    "photo": "photos/realtors/agent2.jpg",
-                    "description": "Specializing in luxury properties",
-                    "email": "sarah.j@realestate.com",
-                    "phone": "555-333-4444",
-                    "is_mvp": False,
-                    "hire_date": datetime.datetime.strptime("2021-03-20", "%Y-%m-%d"),
-                },
-                # Add more realtors as needed
-            ]
-
-            realtors_data.extend(
-                [
-                    {
-                        "name": "Emily Davis",
-                        "photo": "photos/realtors/agent3.jpg",
-                        "description": "Expert in first-time homebuyers and affordable housing",
-                        "email": "emily.davis@realestate.com",
-                        "phone": "555-555-6666",
-                        "is_mvp": True,
-                        "hire_date": datetime.datetime.strptime(
-                            "2018-06-25", "%Y-%m-%d"
-                        ),
-                    },
-                    {
-                        "name": "Michael Brown",
-                        "photo": "photos/realtors/agent4.jpg",
-                        "description": "Specializing in commercial real estate and investment properties",
-                        "email": "michael.brown@realestate.com",
-                        "phone": "555-777-8888",
-                        "is_mvp": False,
-                        "hire_date": datetime.datetime.strptime(
-                            "2022-02-10", "%Y-%m-%d"
-                        ),
-                    },
-                    {
-                        "name": "Olivia Green",
-                        "photo": "photos/realtors/agent5.jpg",
-                        "description": "Focused on family homes and neighborhood communities",
-                        "email": "olivia.green@realestate.com",
-                        "phone": "555-999-0000",
-                        "is_mvp": False,
-                        "hire_date": datetime.datetime.strptime(
-                            "2019-11-05", "%Y-%m-%d"
-                        ),
-                    },
-                    {
-                        "name": "David Wilson",
-                        "photo": "photos/realtors/agent6.jpg",
-                        "description": "Leading agent for waterfront and luxury properties",
-                        "email": "david.wilson@realestate.com",
-                        "phone": "555-123-4567",
-                        "is_mvp": True,
-                        "hire_date": datetime.datetime.strptime(
-                            "2017-08-22", "%Y-%m-%d"
-                        ),
-                    },
-                    {
-                        "name": "Sophia Martinez",
-                        "photo": "photos/realtors/agent7.jpg",
-                        "description": "Expert in relocation and corporate real estate services",
-                        "email": "sophia.martinez@realestate.com",
-                        "phone": "555-555-7777",
-                        "is_mvp": False,
-                        "hire_date": datetime.datetime.strptime(
-                            "2020-04-30", "%Y-%m-%d"
-                        ),
-                    },
-                ]
-            )
+    help = (
+        "Populate database with sample realtors and listings, or with synthetic "
+        "data when --realtors/--listings/--contacts are given"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--realtors", type=int, default=0)
+        parser.add_argument("--listings", type=int, default=0)
+        parser.add_argument("--contacts", type=int, default=0)
+        parser.add_argument("--seed", default=None, help="seed for reproducible data")
+        parser.add_argument("--batch-size", type=int, default=20000)
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="processes inserting listings/contacts in parallel (best on PostgreSQL, "
+            "SQLite serializes writers)",
+        )
+
+    def handle(self, *args, **options):
+        if not (options["realtors"] or options["listings"] or options["contacts"]):
+            self.populate_samples()
+        else:
+            self.populate_synthetic(options)
+        # bulk_create skips the model signals that invalidate cached pages
+        bump_listings_generation()
 
-            # Create realtors
-            created_realtors = []
-            for realtor_data in realtors_data:
-                realtor = Realtor.objects.create(**realtor_data)
-                created_realtors.append(realtor)
-                print(f"Created realtor: {realtor.name}")
-
-            # Create Listings
-            listings_data = [
-                {
-                    "realtor": created_realtors[0],  # John Smith
-                    "title": "Beautiful Family Home",
-                    "address": "123 Main Street",
-                    "city": "Beverly Hills",
-                    "state": "CA",
-                    "zipcode": "90210",
-                    "description": "Stunning 4-bedroom home with modern amenities",
-                    "price": 750000,
-                    "bedrooms": 4,
-                    "bathrooms": 3,
-                    "garage": 2,
-                    "sqft": 2500,
-                    "lot_size": 0.5,
-                    "list_date": datetime.datetime.strptime("2024-01-01", "%Y-%m-%d"),
-                    "photo_main": "photos/homes/home1_main.jpg",
-                    "photo_1": "photos/homes/home1_1.jpg",
-                    "photo_2": "photos/homes/home1_2.jpg",
-                    "photo_3": "photos/homes/home1_3.jpg",
-                    "photo_4": "photos/homes/home1_4.jpg",
-                    "photo_5": "photos/homes/home1_5.jpg",
-                    "photo_6": "photos/homes/home1_6.jpg",
-                },
-                {
-                    "realtor": created_realtors[1],  # Sarah Johnson
-                    "title": "Modern Downtown Condo",
-                    "address": "456 Park Avenue",
-                    "city": "Los Angeles",
-                    "state": "CA",
-                    "zipcode": "90001",
-                    "description": "Luxurious 2-bedroom condo in prime location",
-                    "price": 500000,
-                    "bedrooms": 2,
-                    "bathrooms": 2,
-                    "garage": 1,
-                    "sqft": 1200,
-                    "lot_size": 0.0,
-                    "list_date": datetime.datetime.strptime("2024-01-15", "%Y-%m-%d"),
-                    "photo_main": "photos/homes/home2_main.jpg",
-                    "photo_1": "photos/homes/home2_1.jpg",
-                    "photo_2": "photos/homes/home2_2.jpg",
-                    "photo_3": "photos/homes/home2_3.jpg",
-                    "photo_4": "photos/homes/home2_4.jpg",
-                    "photo_5": "photos/homes/home2_5.jpg",
-                    "photo_6": "photos/homes/home2_6.jpg",
-                },
-                # Add more listings as needed
-            ]
-
-            listings_data.extend(
-                [
-                    {
-                        "realtor": created_realtors[2],  # Emily Davis
-                        "title": "Cozy Suburban Cottage",
-                        "address": "789 Elm Street",
-                        "city": "San Diego",
-                        "state": "CA",
-                        "zipcode": "92101",
-                        "description": "Charming 3-bedroom cottage with a large backyard",
-                        "price": 400000,
-                        "bedrooms": 3,
-                        "bathrooms": 2,
-                        "garage": 1,
-                        "sqft": 1500,
-                        "lot_size": 0.3,
-                        "list_date": datetime.datetime.strptime(
-                            "2024-02-01", "%Y-%m-%d"
-                        ),
-                        "photo_main": "photos/homes/home3_main.jpg",
-                        "photo_1": "photos/homes/home3_1.jpg",
-                        "photo_2": "photos/homes/home3_2.jpg",
-                        "photo_3": "photos/homes/home3_3.jpg",
-                        "photo_4": "photos/homes/home3_4.jpg",
-                        "photo_5": "photos/homes/home3_5.jpg",
-                        "photo_6": "photos/homes/home3_6.jpg",
-                    },
-                    {
-                        "realtor": created_realtors[3],  # Michael Brown
-                        "title": "Commercial Office Space",
-                        "address": "1010 Market Street",
-                        "city": "San Francisco",
-                        "state": "CA",
-                        "zipcode": "94103",
-                        "description": "Spacious office building ideal for startups",
-                        "price": 1200000,
-                        "bedrooms": 0,
-                        "bathrooms": 4,
-                        "garage": 5,
-                        "sqft": 5000,
-                        "lot_size": 1.0,
-                        "list_date": datetime.datetime.strptime(
-                            "2024-02-15", "%Y-%m-%d"
-                        ),
-                        "photo_main": "photos/homes/home4_main.jpg",
-                        "photo_1": "photos/homes/home4_1.jpg",
-                        "photo_2": "photos/homes/home4_2.jpg",
-                        "photo_3": "photos/homes/home4_3.jpg",
-                        "photo_4": "photos/homes/home4_4.jpg",
-                        "photo_5": "photos/homes/home4_5.jpg",
-                        "photo_6": "photos/homes/home4_6.jpg",
-                    },
-                    {
-                        "realtor": created_realtors[4],  # Olivia Green
-                        "title": "Spacious Family Home",
-                        "address": "222 Oak Drive",
-                        "city": "Sacramento",
-                        "state": "CA",
-                        "zipcode": "95814",
-                        "description": "Beautiful 5-bedroom home with a pool",
-                        "price": 850000,
-                        "bedrooms": 5,
-                        "bathrooms": 4,
-                        "garage": 2,
-                        "sqft": 3200,
-                        "lot_size": 0.8,
-                        "list_date": datetime.datetime.strptime(
-                            "2024-03-01", "%Y-%m-%d"
-                        ),
-                        "photo_main": "photos/homes/home5_main.jpg",
-                        "photo_1": "photos/homes/home5_1.jpg",
-                        "photo_2": "photos/homes/home5_2.jpg",
-                        "photo_3": "photos/homes/home5_3.jpg",
-                        "photo_4": "photos/homes/home5_4.jpg",
-                        "photo_5": "photos/homes/home5_5.jpg",
-                        "photo_6": "photos/homes/home5_6.jpg",
-                    },
-                    {
-                        "realtor": created_realtors[5],  # David Wilson
-                        "title": "Luxury Beachfront Villa",
-                        "address": "333 Ocean Avenue",
-                        "city": "Malibu",
-                        "state": "CA",
-                        "zipcode": "90265",
-                        "description": "Exclusive villa with stunning ocean views",
-                        "price": 3000000,
-                        "bedrooms": 6,
-                        "bathrooms": 5,
-                        "garage": 3,
-                        "sqft": 4500,
-                        "lot_size": 1.5,
-                        "list_date": datetime.datetime.strptime(
-                            "2024-03-15", "%Y-%m-%d"
-                        ),
-                        "photo_main": "photos/homes/home6_main.jpg",
-                        "photo_1": "photos/homes/home6_1.jpg",
-                        "photo_2": "photos/homes/home6_2.jpg",
-                        "photo_3": "photos/homes/home6_3.jpg",
-                        "photo_4": "photos/homes/home6_4.jpg",
-                        "photo_5": "photos/homes/home6_5.jpg",
-                        "photo_6": "photos/homes/home6_6.jpg",
-                    },
-                    {
-                        "realtor": created_realtors[6],  # Sophia Martinez
-                        "title": "Modern Apartment in Downtown",
-                        "address": "555 City Center Blvd",
-                        "city": "Los Angeles",
-                        "state": "CA",
-                        "zipcode": "90015",
-                        "description": "Contemporary 1-bedroom apartment with city views",
-                        "price": 350000,
-                        "bedrooms": 1,
-                        "bathrooms": 1,
-                        "garage": 1,
-                        "sqft": 800,
-                        "lot_size": 0.0,
-                        "list_date": datetime.datetime.strptime(
-                            "2024-04-01", "%Y-%m-%d"
-                        ),
-                        "photo_main": "photos/homes/home7_main.jpg",
-                        "photo_1": "photos/homes/home7_1.jpg",
-                        "photo_2": "photos/homes/home7_2.jpg",
-                        "photo_3": "photos/homes/home7_3.jpg",
-                        "photo_4": "photos/homes/home7_4.jpg",
-                        "photo_5": "photos/homes/home7_5.jpg",
-                        "photo_6": "photos/homes/home7_6.jpg",
-                    },
-                ]
+    def populate_samples(self):
+        realtors = Realtor.objects.bulk_create(Realtor(**data) for data in SAMPLE_REALTORS)
+        listings = []
+        for data in SAMPLE_LISTINGS:
+            data = {**data, "realtor": realtors[data["realtor"]]}
+            gallery = data.pop("gallery")
+            listing = Listing(**data)
+            listing.locate()
+            listing.gallery = [data["photo_main"], *gallery]
+            listings.append(listing)
+        Listing.objects.bulk_create(listings)
+        ListingPhoto.objects.bulk_create(gallery_photos(listings))
+        summaries.refresh(listing.pk for listing in listings)
+        realtor_stats.refresh(realtor.pk for realtor in realtors)
+        self.stdout.write(f"Created {len(realtors)} realtors and {len(listings)} listings")
+
+    def populate_synthetic(self, options):
+        seed = options["seed"] if options["seed"] is not None else random.randrange(2**32)
+        self.stdout.write(f"seed {seed}")
+        started = time.perf_counter()
+        total = 0
+
+        total += self.run("realtors", options["realtors"], seed, None, options, workers=1)
+        if options["listings"]:
+            realtor_ids = array("q", Realtor.objects.values_list("id", flat=True).iterator())
+            if not realtor_ids:
+                raise CommandError("listings need realtors, pass --realtors")
+            last_id = Listing.objects.aggregate(last=Max("id"))["last"] or 0
+            # one full text rebuild at the end instead of a trigger insert per row
+            with fulltext.suspended(connection):
+                total += self.run("listings", options["listings"], seed, realtor_ids, options)
+                started_rebuild = time.perf_counter()
+            written = summaries.rebuild(after=last_id)
+            self.stdout.write(
+                f"summaries and full text index: {written} listings in "
+                f"{time.perf_counter() - started_rebuild:.1f}s"
             )
+        if options["realtors"] or options["listings"]:
+            realtor_stats.rebuild()
+        if options["contacts"]:
+            listing_ids = array(
+                "q", Listing.objects.values_list("id", flat=True).iterator(chunk_size=50000)
+            )
+            if not listing_ids:
+                raise CommandError("contacts need listings, pass --listings")
+            total += self.run("contacts", options["contacts"], seed, listing_ids, options)
+            # bulk_create skips Contact.save and the signals keeping the counters
+            inbox.assign_realtors()
+            inbox.recount()
 
-            # Create listings
-            for listing_data in listings_data:
-                listing = Listing.objects.create(**listing_data)
-                print(f"Created listing: {listing.title}")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"total: {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
 
-        # Then just call it
-        populate_database()
+    def run(self, kind, count, seed, ids, options, workers=None):
+        if not count:
+            return 0
+        workers = workers or options["workers"]
+        batch_size = options["batch_size"]
+        tasks = (
+            (kind, min(batch_size, count - start), seed, chunk)
+            for chunk, start in enumerate(range(0, count, batch_size))
+        )
+        started = time.perf_counter()
+        inserted = 0
+        if workers == 1:
+            _init_worker(ids)
+            for task in tasks:
+                inserted += build_and_insert_chunk(task)
+        else:
+            # forked children must open their own database connections
+            connections.close_all()
+            pool = multiprocessing.get_context("fork").Pool(
+                workers, initializer=_init_worker, initargs=(ids,)
+            )
+            with pool:
+                if connections["default"].vendor == "sqlite":
+                    # SQLite has a single writer: build rows in the workers,
+                    # insert them here
+                    for rows in pool.imap_unordered(build_chunk, tasks):
+                        inserted += insert_chunk(kind, rows)
+                else:
+                    inserted = sum(pool.imap_unordered(build_and_insert_chunk, tasks))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{kind}: {inserted} rows in {elapsed:.1f}s ({inserted / elapsed:,.0f} rows/s)"
+        )
+        return inserted
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings import realtor_stats
+from listings.versions import bump_listings_generation, bump_object_version
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the median price (and counts) of the realtors whose listings were "
+        "repriced, added or removed since the last run; meant to run every few minutes"
+    )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        realtor_ids = realtor_stats.recount()
+        if realtor_ids:
+            # realtor pages and the directory show the median
+            for realtor_id in realtor_ids:
+                bump_object_version("realtor", realtor_id)
+            bump_listings_generation()
+        self.stdout.write(
+            f"recounted {len(realtor_ids)} realtors in {time.perf_counter() - start:.2f}s"
+        )
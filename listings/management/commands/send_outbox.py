@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbox emails in batches over one mail connection per batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--max-attempts", type=int, default=outbox.MAX_ATTEMPTS)
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="seconds between empty polls")
+        parser.add_argument("--once", action="store_true", help="drain what is due now and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, retried, failed = outbox.deliver_due(
+                batch_size=options["batch_size"], max_attempts=options["max_attempts"]
+            )
+            if sent or retried or failed:
+                self.stdout.write(f"sent {sent}, retrying {retried}, failed {failed}")
+            elif options["once"]:
+                return
+            else:
+                time.sleep(options["poll_interval"])
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from listings import alerts, outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Match the listings added since the last run against the saved searches and "
+        "queue one digest email per user"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=alerts.CHUNK_SIZE)
+        parser.add_argument(
+            "--send", action="store_true", help="deliver the queued emails now instead of send_outbox"
+        )
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        scanned, matched, queued = alerts.run(chunk_size=options["chunk_size"])
+        self.stdout.write(
+            f"{scanned} new listings, {matched} searches matched, {queued} digests queued"
+        )
+        if options["send"]:
+            while True:
+                sent, retried, failed = outbox.deliver_due(batch_size=options["batch_size"])
+                if not (sent or retried or failed):
+                    break
+                self.stdout.write(f"sent {sent}, retrying {retried}, failed {failed}")
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:11
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_listing_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['state', 'bedrooms', 'price'], name='listing_state_beds_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(django.db.models.functions.text.Lower('city'), models.F('bedrooms'), models.F('price'), name='listing_city_beds_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['bedrooms', 'price'], name='listing_beds_price_idx'),
+        ),
+    ]
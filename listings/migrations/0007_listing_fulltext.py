@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from listings import fulltext
+
+
+def forward(apps, schema_editor):
+    fulltext.install(schema_editor.connection)
+
+
+def backward(apps, schema_editor):
+    fulltext.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, backward),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listing',
+            name='photo_main',
+            field=models.ImageField(blank=True, editable=False, upload_to='listings/%Y/%M/%d'),
+        ),
+        migrations.CreateModel(
+            name='ListingPhoto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to='listings/%Y/%M/%d')),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('width', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+                'indexes': [models.Index(fields=['listing', 'position'], name='listingphoto_order_idx')],
+            },
+        ),
+        # blank so that reversing 0013 can add them back to a filled table
+        migrations.AlterField(
+            model_name='listing',
+            name='photo_1',
+            field=models.ImageField(blank=True, upload_to='listings/%Y/%M/%d'),
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='photo_2',
+            field=models.ImageField(blank=True, upload_to='listings/%Y/%M/%d'),
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='photo_3',
+            field=models.ImageField(blank=True, upload_to='listings/%Y/%M/%d'),
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='photo_4',
+            field=models.ImageField(blank=True, upload_to='listings/%Y/%M/%d'),
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='photo_5',
+            field=models.ImageField(blank=True, upload_to='listings/%Y/%M/%d'),
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='photo_6',
+            field=models.ImageField(blank=True, upload_to='listings/%Y/%M/%d'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+
+COLUMNS = ("photo_main", "photo_1", "photo_2", "photo_3", "photo_4", "photo_5", "photo_6")
+BATCH_SIZE = 2000
+
+
+def batches(Listing, fields):
+    # pk ranges, so every batch is an index seek however large the table
+    last = 0
+    while True:
+        batch = list(
+            Listing.objects.filter(pk__gt=last).order_by("pk").values_list("pk", *fields)[:BATCH_SIZE]
+        )
+        if not batch:
+            return
+        yield batch
+        last = batch[-1][0]
+
+
+def move_photos(apps, schema_editor):
+    Listing = apps.get_model("listings", "Listing")
+    ListingPhoto = apps.get_model("listings", "ListingPhoto")
+    for batch in batches(Listing, COLUMNS):
+        ListingPhoto.objects.bulk_create(
+            ListingPhoto(listing_id=pk, image=name, position=position)
+            for pk, *names in batch
+            for position, name in enumerate(name for name in names if name)
+        )
+
+
+def restore_photos(apps, schema_editor):
+    Listing = apps.get_model("listings", "Listing")
+    ListingPhoto = apps.get_model("listings", "ListingPhoto")
+    for batch in batches(Listing, ()):
+        ids = [pk for (pk,) in batch]
+        galleries = {}
+        for listing_id, name in ListingPhoto.objects.filter(listing_id__in=ids).values_list(
+            "listing_id", "image"
+        ):
+            galleries.setdefault(listing_id, []).append(name)
+        listings = []
+        for pk in ids:
+            names = galleries.get(pk, [])[: len(COLUMNS)]
+            names += [""] * (len(COLUMNS) - len(names))
+            listings.append(Listing(pk=pk, **dict(zip(COLUMNS, names))))
+        Listing.objects.bulk_update(listings, COLUMNS)
+    ListingPhoto.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_listingphoto'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_photos, restore_photos),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:25
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_move_listing_photos'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='listing',
+            name='photo_1',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='photo_2',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='photo_3',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='photo_4',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='photo_5',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='photo_6',
+        ),
+    ]
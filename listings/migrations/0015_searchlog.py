@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0014_listing_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=32)),
+                ('params', models.JSONField()),
+                ('results', models.PositiveIntegerField()),
+                ('source', models.CharField(max_length=10)),
+                ('duration_ms', models.FloatField()),
+                ('searched_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['searched_at', 'key'], name='searchlog_time_key_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0015_searchlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingSummary',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='listings.listing')),
+                ('realtor_name', models.CharField(max_length=200)),
+                ('title', models.CharField(max_length=200)),
+                ('price', models.IntegerField()),
+                ('bedrooms', models.IntegerField()),
+                ('bathrooms', models.IntegerField()),
+                ('garage', models.IntegerField()),
+                ('sqft', models.IntegerField()),
+                ('list_date', models.DateTimeField()),
+                ('photo_main', models.ImageField(blank=True, upload_to='')),
+                ('realtor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='listings.realtor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['list_date', 'listing'], name='summary_date_idx'), models.Index(fields=['price', 'listing'], name='summary_price_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations
+
+
+FIELDS = (
+    "realtor_id", "realtor__name", "title", "price", "bedrooms", "bathrooms",
+    "garage", "sqft", "list_date", "photo_main",
+)
+BATCH_SIZE = 2000
+
+
+def fill_summaries(apps, schema_editor):
+    Listing = apps.get_model("listings", "Listing")
+    ListingSummary = apps.get_model("listings", "ListingSummary")
+    # pk ranges, so every batch is an index seek however large the table
+    last = 0
+    while True:
+        batch = list(
+            Listing.objects.filter(pk__gt=last).order_by("pk").values_list("pk", *FIELDS)[:BATCH_SIZE]
+        )
+        if not batch:
+            return
+        ListingSummary.objects.bulk_create(
+            ListingSummary(
+                listing_id=pk,
+                realtor_id=realtor_id,
+                realtor_name=realtor_name,
+                title=title,
+                price=price,
+                bedrooms=bedrooms,
+                bathrooms=bathrooms,
+                garage=garage,
+                sqft=sqft,
+                list_date=list_date,
+                photo_main=photo_main,
+            )
+            for pk, realtor_id, realtor_name, title, price, bedrooms, bathrooms, garage, sqft,
+            list_date, photo_main in batch
+        )
+        last = batch[-1][0]
+
+
+def empty_summaries(apps, schema_editor):
+    apps.get_model("listings", "ListingSummary").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0016_listingsummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_summaries, empty_summaries),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0017_fill_listing_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RealtorStats',
+            fields=[
+                ('realtor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='listings.realtor')),
+                ('listing_count', models.PositiveIntegerField(default=0)),
+                ('median_price', models.IntegerField(blank=True, null=True)),
+                ('latest_listing_ids', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['realtor', 'price'], name='listing_realtor_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsummary',
+            index=models.Index(fields=['realtor', '-list_date', '-listing'], name='summary_realtor_date_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+import itertools
+
+from django.db import migrations
+
+
+LATEST_LISTINGS = 3
+
+
+def fill_realtor_stats(apps, schema_editor):
+    Listing = apps.get_model("listings", "Listing")
+    ListingSummary = apps.get_model("listings", "ListingSummary")
+    Realtor = apps.get_model("listings", "Realtor")
+    RealtorStats = apps.get_model("listings", "RealtorStats")
+    stats = {pk: RealtorStats(realtor_id=pk) for pk in Realtor.objects.values_list("pk", flat=True)}
+    rows = Listing.objects.order_by("realtor_id", "price").values_list("realtor_id", "price")
+    for realtor_id, group in itertools.groupby(rows.iterator(chunk_size=10000), key=lambda row: row[0]):
+        prices = [price for _, price in group]
+        middle = len(prices) // 2
+        stats[realtor_id].listing_count = len(prices)
+        stats[realtor_id].median_price = (
+            prices[middle] if len(prices) % 2 else (prices[middle - 1] + prices[middle]) // 2
+        )
+        stats[realtor_id].latest_listing_ids = list(
+            ListingSummary.objects.filter(realtor_id=realtor_id)
+            .order_by("-list_date", "-listing")
+            .values_list("listing_id", flat=True)[:LATEST_LISTINGS]
+        )
+    RealtorStats.objects.bulk_create(stats.values())
+
+
+def empty_realtor_stats(apps, schema_editor):
+    apps.get_model("listings", "RealtorStats").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0018_realtorstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_realtor_stats, empty_realtor_stats),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0019_fill_realtor_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='is_read',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='realtor',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='listings.realtor'),
+        ),
+        migrations.AddField(
+            model_name='realtorstats',
+            name='unread_contacts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['listing', 'contact_date', 'id'], name='contact_listing_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['realtor', 'contact_date', 'id'], name='contact_realtor_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['contact_date', 'id'], name='contact_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['realtor', 'contact_date', 'id'], name='contact_unread_idx'),
+        ),
+    ]
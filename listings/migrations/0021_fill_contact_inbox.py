@@ -0,0 +1,32 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+
+
+def fill_contact_inbox(apps, schema_editor):
+    Contact = apps.get_model("listings", "Contact")
+    Listing = apps.get_model("listings", "Listing")
+    RealtorStats = apps.get_model("listings", "RealtorStats")
+    Contact.objects.filter(listing__isnull=False).update(
+        realtor_id=Subquery(Listing.objects.filter(pk=OuterRef("listing_id")).values("realtor_id"))
+    )
+    # nothing read them so far, every existing inquiry is unread
+    counts = (
+        Contact.objects.filter(realtor__isnull=False)
+        .order_by()
+        .values("realtor_id")
+        .annotate(count=Count("id"))
+        .values_list("realtor_id", "count")
+    )
+    for realtor_id, count in counts:
+        RealtorStats.objects.filter(pk=realtor_id).update(unread_contacts=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0020_contact_inbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_contact_inbox, migrations.RunPython.noop),
+    ]
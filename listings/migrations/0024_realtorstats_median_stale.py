@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0023_listing_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='realtorstats',
+            name='median_stale',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0024_realtorstats_median_stale'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='photo_main_variants',
+            field=models.CharField(blank=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='listingphoto',
+            name='image_variants',
+            field=models.CharField(blank=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='listingsummary',
+            name='photo_main_variants',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='realtor',
+            name='photo_variants',
+            field=models.CharField(blank=True, default='', editable=False, max_length=50),
+        ),
+    ]
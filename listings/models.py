@@ -1,29 +1,127 @@
+from django.conf import settings
+from django.core.files.images import get_image_dimensions
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
 
+from . import geo
 
-class Realtor(models.Model):
+
+class DerivedImagesMixin:
+    """
+    A model with derived variants (listings.images) of its ``IMAGE_FIELDS``.
+    Each has a ``<field>_variants`` column listing the formats generated for
+    its current file, so rendering never asks the storage; saving another
+    file in the field blanks it until the new variants are recorded.
+    """
+
+    IMAGE_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_images = instance.image_names()
+        return instance
+
+    def image_names(self):
+        deferred = self.get_deferred_fields()
+        return {name: getattr(self, name).name for name in self.IMAGE_FIELDS if name not in deferred}
+
+    def changed_images(self, update_fields=None):
+        """The image fields this save writes another file to."""
+        stored = getattr(self, "_stored_images", {})
+        return [
+            name
+            for name, file_name in self.image_names().items()
+            if file_name != stored.get(name, "")
+            and (update_fields is None or name in update_fields)
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        # read by the derive_images signal, which only schedules these
+        self._changed_images = self.changed_images(update_fields)
+        for name in self._changed_images:
+            setattr(self, f"{name}_variants", "")
+        if update_fields is not None and self._changed_images:
+            kwargs["update_fields"] = {
+                *update_fields, *(f"{name}_variants" for name in self._changed_images)
+            }
+        super().save(*args, **kwargs)
+        self._stored_images = self.image_names()
+
+
+class Realtor(DerivedImagesMixin, models.Model):
+
+    IMAGE_FIELDS = ("photo",)
 
     name = models.CharField(max_length=200)
+    # the account that reads this realtor's inbox, linked by staff: the
+    # public email isn't proof of identity
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="realtor",
+    )
     photo = models.ImageField(upload_to="realtors/%Y/%M/%d")
+    # formats of the photo's derived variants, see DerivedImagesMixin
+    photo_variants = models.CharField(max_length=50, blank=True, default="", editable=False)
     description = models.TextField()
     email = models.EmailField()
     phone = models.CharField(max_length=20)
     is_mvp = models.BooleanField(default=False)
     hire_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
 
+# fields a listing card needs; everything else (description, ...) stays
+# deferred when browsing, the gallery lives in ListingPhoto
+CARD_FIELDS = (
+    "id",
+    "title",
+    "price",
+    "sqft",
+    "garage",
+    "bedrooms",
+    "bathrooms",
+    "list_date",
+    "photo_main",
+    "photo_main_variants",
+    "realtor__name",
+)
+
+
+class ListingQuerySet(models.QuerySet):
+
+    def cards(self):
+        """Narrow projection used by browse/home/search cards, realtor joined."""
+        return self.select_related("realtor").only(*CARD_FIELDS)
+
+    def newest(self):
+        return self.order_by("-list_date", "-id")
+
+
 # Create your models here.
 class Listing(models.Model):
 
     realtor = models.ForeignKey(Realtor, on_delete=models.CASCADE)
+    # key of the listing in a partner feed, see listings.feeds
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
     title = models.CharField(max_length=200)
     address = models.CharField(max_length=200)
     city = models.CharField(max_length=100)
     state = models.CharField(max_length=100)
     zipcode = models.CharField(max_length=20)
+    # from the zipcode centroid table when left blank, see listings.geo
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default="", editable=False)
     description = models.TextField()
     price = models.IntegerField()
     bedrooms = models.IntegerField()
@@ -32,27 +130,302 @@ class Listing(models.Model):
     sqft = models.IntegerField()
     lot_size = models.FloatField()
     list_date = models.DateTimeField(auto_now_add=True)
-    photo_main = models.ImageField(upload_to="listings/%Y/%M/%d")
-    photo_1 = models.ImageField(upload_to="listings/%Y/%M/%d")
-    photo_2 = models.ImageField(upload_to="listings/%Y/%M/%d")
-    photo_3 = models.ImageField(upload_to="listings/%Y/%M/%d")
-    photo_4 = models.ImageField(upload_to="listings/%Y/%M/%d")
-    photo_5 = models.ImageField(upload_to="listings/%Y/%M/%d")
-    photo_6 = models.ImageField(upload_to="listings/%Y/%M/%d")
+    updated_at = models.DateTimeField(auto_now=True)
+    # cover photo: copy of the first ListingPhoto, kept by update_cover so
+    # cards read one column instead of joining the gallery
+    photo_main = models.ImageField(upload_to="listings/%Y/%M/%d", blank=True, editable=False)
+    photo_main_variants = models.CharField(max_length=50, blank=True, default="", editable=False)
+
+    objects = ListingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination seeks on (list_date, id)
+            models.Index(fields=["list_date", "id"], name="listing_date_id_idx"),
+            # structured search filters, see listings.search.filter_listings
+            models.Index(
+                fields=["state", "bedrooms", "price"],
+                name="listing_state_beds_price_idx",
+            ),
+            models.Index(
+                Lower("city"), F("bedrooms"), F("price"),
+                name="listing_city_beds_price_idx",
+            ),
+            models.Index(fields=["bedrooms", "price"], name="listing_beds_price_idx"),
+            # radius/bbox search probes geohash prefix ranges
+            models.Index(fields=["geohash"], name="listing_geohash_idx"),
+            # newest write, and the rows written since, for listings.snapshots
+            models.Index(fields=["updated_at"], name="listing_updated_idx"),
+            # a realtor's prices in order, for the median of RealtorStats
+            models.Index(fields=["realtor", "price"], name="listing_realtor_price_idx"),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"zipcode", "latitude", "longitude"} & set(update_fields):
+            self.locate()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "latitude", "longitude", "geohash"}
+        super().save(*args, **kwargs)
+
+    def locate(self):
+        """Geocode blank coordinates from the zipcode and (re)compute the geohash."""
+        if self.latitude is None or self.longitude is None:
+            self.latitude, self.longitude = geo.geocode(self.zipcode, self.state) or (None, None)
+        if self.latitude is None:
+            self.geohash = ""
+        else:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+
+    def update_cover(self):
+        self.photo_main, self.photo_main_variants = (
+            self.photos.values_list("image", "image_variants").first() or ("", "")
+        )
+        # a regular save, so the cache/index signals see the gallery change
+        self.save(update_fields=["photo_main", "photo_main_variants", "updated_at"])
+
+
+class ListingPhoto(DerivedImagesMixin, models.Model):
+
+    IMAGE_FIELDS = ("image",)
+
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="photos")
+    image = models.ImageField(upload_to="listings/%Y/%M/%d")
+    image_variants = models.CharField(max_length=50, blank=True, default="", editable=False)
+    position = models.PositiveSmallIntegerField(default=0)
+    # read from the image header on save; NULL for rows bulk inserted
+    # without opening the file (migration, feeds)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        ordering = ["position", "id"]
+        indexes = [
+            models.Index(fields=["listing", "position"], name="listingphoto_order_idx"),
+        ]
+
+    def __str__(self):
+        return self.image.name
+
+    def save(self, *args, **kwargs):
+        if self.image and (self.width is None or "image" in self.changed_images()):
+            try:
+                self.width, self.height = get_image_dimensions(self.image)
+            except OSError:
+                pass
+        super().save(*args, **kwargs)
+        self.listing.update_cover()
+
+    def delete(self, *args, **kwargs):
+        listing = self.listing
+        result = super().delete(*args, **kwargs)
+        listing.update_cover()
+        return result
+
+
+class ListingSummaryQuerySet(models.QuerySet):
+
+    def newest(self):
+        return self.order_by("-list_date", "-listing")
+
+    def cheapest(self):
+        return self.order_by("price", "listing")
+
+    def priciest(self):
+        return self.order_by("-price", "-listing")
+
+
+class ListingSummary(models.Model):
+    """
+    Read model of a listing card: the card fields with the realtor name and
+    the cover photo copied in, so browse/home/search cards read one narrow
+    row per listing without joining Realtor or touching the TEXT columns.
+    Kept up to date by listings.summaries (signals, feed imports) and rebuilt
+    by the build_summaries command. Its pk is the listing's id.
+    """
+
+    listing = models.OneToOneField(
+        Listing, on_delete=models.CASCADE, primary_key=True, related_name="summary"
+    )
+    realtor = models.ForeignKey(Realtor, on_delete=models.CASCADE, related_name="+")
+    realtor_name = models.CharField(max_length=200)
+    title = models.CharField(max_length=200)
+    price = models.IntegerField()
+    bedrooms = models.IntegerField()
+    bathrooms = models.IntegerField()
+    garage = models.IntegerField()
+    sqft = models.IntegerField()
+    list_date = models.DateTimeField()
+    photo_main = models.ImageField(blank=True)
+    photo_main_variants = models.CharField(max_length=50, blank=True, default="")
+
+    objects = ListingSummaryQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # newest first (keyset pagination), cheapest/priciest first
+            models.Index(fields=["list_date", "listing"], name="summary_date_idx"),
+            models.Index(fields=["price", "listing"], name="summary_price_idx"),
+            # a realtor's newest listings (profile pages, realtor directory)
+            models.Index(fields=["realtor", "-list_date", "-listing"], name="summary_realtor_date_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class RealtorStats(models.Model):
+    """
+    Listing figures of a realtor for the realtor directory and profiles. A
+    median isn't an SQL aggregate and a page of realtors with their newest
+    listings would read every listing of those realtors, so rather than on
+    each page view they are computed by listings.realtor_stats, the median
+    periodically.
+    """
+
+    realtor = models.OneToOneField(
+        Realtor, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    listing_count = models.PositiveIntegerField(default=0)
+    median_price = models.IntegerField(null=True, blank=True)
+    # prices changed since median_price was computed, see realtor_stats.recount
+    median_stale = models.BooleanField(default=False)
+    # newest first
+    latest_listing_ids = models.JSONField(default=list)
+    # kept by the Contact signals and listings.inbox.mark_read
+    unread_contacts = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.realtor_id}: {self.listing_count} listings"
 
 
 class Contact(models.Model):
     listing = models.ForeignKey(Listing, on_delete=models.SET_NULL, null=True)
+    # copy of the listing's realtor when the inquiry was sent, so a realtor's
+    # inbox is a range of one index instead of a join through Listing; set
+    # on save, by listings.inbox.assign_realtors after bulk inserts
+    realtor = models.ForeignKey(
+        Realtor, on_delete=models.SET_NULL, null=True, blank=True, db_index=False, related_name="+"
+    )
     name = models.CharField(max_length=200)
     email = models.CharField(max_length=100)
     phone = models.CharField(max_length=100)
     message = models.TextField()
     contact_date = models.DateTimeField(auto_now_add=True)
+    # flipped by listings.inbox.mark_read, which keeps the unread counters
+    is_read = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # inbox pages, newest first: of a listing, of a realtor, of everyone
+            models.Index(fields=["listing", "contact_date", "id"], name="contact_listing_date_idx"),
+            models.Index(fields=["realtor", "contact_date", "id"], name="contact_realtor_date_idx"),
+            models.Index(fields=["contact_date", "id"], name="contact_date_idx"),
+            # unread only, a fraction of the table
+            models.Index(
+                fields=["realtor", "contact_date", "id"],
+                condition=models.Q(is_read=False),
+                name="contact_unread_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.realtor_id is None and self.listing_id is not None:
+            self.realtor_id = Listing.objects.filter(pk=self.listing_id).values_list(
+                "realtor_id", flat=True
+            ).first()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+class OutboundEmail(models.Model):
+    """
+    Outbox row for an email to send, written in the same transaction as the
+    row that caused it and delivered later by the send_outbox command.
+    """
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, "Pending"), (SENT, "Sent"), (FAILED, "Failed")]
+
+    contact = models.ForeignKey(Contact, on_delete=models.SET_NULL, null=True, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.TextField(help_text="comma separated recipients")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # due time of the next attempt; while a worker holds the row it is the
+    # end of that worker's lease
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=36, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
+
+
+class SearchLog(models.Model):
+    """
+    One submitted search, appended in batches by listings.search_log and
+    aggregated by the aggregate_searches command. Rows are never updated.
+    """
+
+    # digest of the normalized parameters, see listings.search.canonical_key
+    key = models.CharField(max_length=32)
+    params = models.JSONField()
+    results = models.PositiveIntegerField()
+    # what answered it: "cache", "index" or "database"
+    source = models.CharField(max_length=10)
+    duration_ms = models.FloatField()
+    searched_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["searched_at", "key"], name="searchlog_time_key_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.params} ({self.results})"
+
+
+class SavedSearch(models.Model):
+    """
+    A user's search, stored as the normalized parameters of the search page
+    (listings.search.normalize_params). The send_search_alerts command emails
+    the listings added since ``last_listing_id`` that match it, see
+    listings.alerts.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="saved_searches"
+    )
+    name = models.CharField(max_length=100, blank=True)
+    params = models.JSONField()
+    # digest of params, see listings.search.canonical_key
+    key = models.CharField(max_length=32)
+    # watermark: listings up to this id were already considered; starts at
+    # the newest settled listing when the search is saved
+    last_listing_id = models.BigIntegerField(default=0)
+    last_notified = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="savedsearch_user_key_uniq"),
+        ]
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name or ", ".join(f"{name} {value}" for name, value in self.params.items())
@@ -0,0 +1,126 @@
+"""
+Transactional outbox for emails.
+
+Views call ``enqueue`` inside the transaction that saves the row the email is
+about, so either both are stored or neither is, and the request never waits
+on SMTP. ``deliver_due`` (run by the send_outbox command) claims a batch of
+due rows, sends them over a single connection of the configured
+``EMAIL_BACKEND`` and reschedules failures with exponential backoff.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+
+LEASE = timedelta(minutes=5)
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=6)
+MAX_ATTEMPTS = 8
+
+
+def enqueue(subject, body, from_email, to, contact=None):
+    return OutboundEmail.objects.create(
+        contact=contact,
+        subject=subject,
+        body=body,
+        from_email=from_email,
+        to=",".join(to),
+    )
+
+
+def enqueue_many(emails):
+    """Queue (subject, body, from_email, to) tuples with one insert."""
+    return OutboundEmail.objects.bulk_create(
+        OutboundEmail(subject=subject, body=body, from_email=from_email, to=",".join(to))
+        for subject, body, from_email, to in emails
+    )
+
+
+def enqueue_contact(contact):
+    return enqueue(
+        subject=f" contact about {contact.listing.title}",
+        body=f"Name: {contact.name}\nPhone: {contact.phone} \n{contact.message}",
+        from_email=contact.email,
+        to=[settings.EMAIL_HOST_USER],
+        contact=contact,
+    )
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def claim(batch_size, now=None):
+    """
+    Lease up to ``batch_size`` due emails to this worker. Pushing
+    next_attempt_at past the lease hides them from other workers; if this
+    one dies they become due again when the lease runs out.
+    """
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        due = (
+            OutboundEmail.objects.filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        OutboundEmail.objects.filter(
+            id__in=list(due), status=OutboundEmail.PENDING, next_attempt_at__lte=now
+        ).update(claimed_by=token, next_attempt_at=now + LEASE)
+    return list(OutboundEmail.objects.filter(claimed_by=token, status=OutboundEmail.PENDING))
+
+
+def deliver_due(batch_size=100, max_attempts=MAX_ATTEMPTS, connection=None):
+    """Send one batch of due emails. Returns (sent, retried, failed)."""
+    emails = claim(batch_size)
+    if not emails:
+        return 0, 0, 0
+
+    sent = retried = failed = 0
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for email in emails:
+            message = EmailMessage(
+                email.subject, email.body, email.from_email, email.to.split(","),
+                connection=connection,
+            )
+            email.attempts += 1
+            try:
+                message.send(fail_silently=False)
+            except Exception as error:
+                email.last_error = f"{type(error).__name__}: {error}"
+                if email.attempts >= max_attempts:
+                    email.status = OutboundEmail.FAILED
+                    failed += 1
+                else:
+                    email.next_attempt_at = timezone.now() + backoff(email.attempts)
+                    retried += 1
+            else:
+                email.status = OutboundEmail.SENT
+                email.sent_at = timezone.now()
+                email.last_error = ""
+                sent += 1
+            email.claimed_by = ""
+    except Exception as error:
+        # couldn't even connect: the whole batch is retried later
+        for email in emails:
+            if email.status == OutboundEmail.PENDING and email.claimed_by:
+                email.attempts += 1
+                email.last_error = f"{type(error).__name__}: {error}"
+                email.next_attempt_at = timezone.now() + backoff(email.attempts)
+                email.claimed_by = ""
+                retried += 1
+    finally:
+        connection.close()
+        OutboundEmail.objects.bulk_update(
+            emails,
+            ["status", "attempts", "next_attempt_at", "claimed_by", "last_error", "sent_at"],
+        )
+    return sent, retried, failed
@@ -0,0 +1,110 @@
+"""
+Maintenance of ``RealtorStats``: the listing count, median price and newest
+listings of each realtor.
+
+``refresh(realtor_ids)`` recomputes the figures of some realtors from their
+prices, read in order from the (realtor, price) index, and their newest
+summaries, read from the (realtor, -list_date) index, and writes them with
+one upsert. ``rebuild()`` recomputes every realtor, for populate_db and the
+build_summaries command.
+
+A listing write can't afford to read all of its realtor's prices, so the
+Listing signals, and feed imports once per batch, call
+``listings_changed``: it moves the counts by the listings added or removed,
+re-reads the few newest ids and flags the realtors whose median is stale. ``recount()`` (the recount_realtor_stats
+command, run every few minutes) refreshes the flagged realtors; until then
+they show the previous median.
+"""
+import itertools
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Listing, ListingSummary, Realtor, RealtorStats
+
+
+# newest listings kept per realtor, shown by the realtor directory
+LATEST_LISTINGS = 3
+
+
+def median(prices):
+    """Median of a sorted list of prices, rounded down; None when empty."""
+    if not prices:
+        return None
+    middle = len(prices) // 2
+    if len(prices) % 2:
+        return prices[middle]
+    return (prices[middle - 1] + prices[middle]) // 2
+
+
+def _latest(realtor_id):
+    return list(
+        ListingSummary.objects.filter(realtor_id=realtor_id)
+        .newest()
+        .values_list("listing_id", flat=True)[:LATEST_LISTINGS]
+    )
+
+
+def _upsert(realtor_ids, rows):
+    stats = {realtor_id: RealtorStats(realtor_id=realtor_id) for realtor_id in realtor_ids}
+    for realtor_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+        prices = [price for _, price in group]
+        stats[realtor_id].listing_count = len(prices)
+        stats[realtor_id].median_price = median(prices)
+    for realtor_id, realtor in stats.items():
+        if realtor.listing_count:
+            realtor.latest_listing_ids = _latest(realtor_id)
+    RealtorStats.objects.bulk_create(
+        stats.values(),
+        update_conflicts=True,
+        unique_fields=["realtor"],
+        update_fields=["listing_count", "median_price", "latest_listing_ids"],
+    )
+    return len(stats)
+
+
+def refresh(realtor_ids):
+    """Recompute the figures of the realtors ``realtor_ids``."""
+    # a deleted realtor's stats went with it
+    realtor_ids = list(Realtor.objects.filter(id__in=set(realtor_ids)).values_list("id", flat=True))
+    if not realtor_ids:
+        return 0
+    rows = (
+        Listing.objects.filter(realtor_id__in=realtor_ids)
+        .order_by("realtor_id", "price")
+        .values_list("realtor_id", "price")
+    )
+    return _upsert(realtor_ids, rows.iterator(chunk_size=10000))
+
+
+def rebuild():
+    """Recompute the figures of every realtor; returns how many were written."""
+    rows = Listing.objects.order_by("realtor_id", "price").values_list("realtor_id", "price")
+    return _upsert(Realtor.objects.values_list("id", flat=True), rows.iterator(chunk_size=10000))
+
+
+def listings_changed(counts, repriced):
+    """
+    Apply a listing write: ``counts`` maps realtor ids to the number of
+    listings they gained (or lost, negative; 0 when a batch moved as many
+    in as out), ``repriced`` the realtors whose prices changed and whose
+    median ``recount()`` must recompute.
+    """
+    with transaction.atomic():
+        for realtor_id, delta in counts.items():
+            RealtorStats.objects.filter(pk=realtor_id).update(
+                listing_count=F("listing_count") + delta,
+                latest_listing_ids=_latest(realtor_id),
+            )
+        if repriced:
+            RealtorStats.objects.filter(pk__in=repriced).update(median_stale=True)
+
+
+def recount():
+    """Refresh the realtors flagged by ``listings_changed``; returns their ids."""
+    realtor_ids = list(RealtorStats.objects.filter(median_stale=True).values_list("pk", flat=True))
+    if realtor_ids:
+        # cleared first: a write during the refresh flags its realtor again
+        RealtorStats.objects.filter(pk__in=realtor_ids).update(median_stale=False)
+        refresh(realtor_ids)
+    return realtor_ids
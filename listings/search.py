@@ -0,0 +1,281 @@
+"""
+Structured + full text listing search.
+
+``normalize_params`` turns raw form data into a canonical dict, ``filter_listings``
+applies the structured filters (served by the composite indexes declared on
+``Listing``) and the radius/bounding-box filters (``listings.geo``), and the
+keyword part is delegated to a pluggable full text backend:
+
+* ``SqliteFTSBackend``  - FTS5 virtual table kept in sync by triggers
+* ``PostgresFTSBackend`` - generated ``tsvector`` column with a GIN index
+* ``ContainsBackend``    - the original ``__icontains`` chain, used as fallback
+
+The backend is picked from ``settings.SEARCH_BACKEND`` (dotted path) or, by
+default, from the database vendor.
+"""
+import hashlib
+import json
+import math
+import re
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+from django.utils.module_loading import import_string
+
+from . import geo
+from .fulltext import FTS_TABLE
+from .models import Listing, Realtor
+
+
+SEARCH_FIELDS = ("keywords", "city", "state", "bedrooms", "price", "near", "radius", "bbox")
+# filters the in-process index can't answer
+SPATIAL_PARAMS = ("radius", "bbox")
+DEFAULT_RADIUS = 10
+# keyword hits ordered by relevance, the others by date
+RANKED_MATCHES = 1000
+
+_token_re = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return _token_re.findall((text or "").lower())
+
+
+def normalize_params(data):
+    """
+    Canonical form of the search form: stripped strings, upper-case state,
+    lower-case city, ints for bedrooms/price. Empty or invalid values are
+    dropped so equivalent searches compare equal.
+    """
+    params = {}
+    keywords = " ".join((data.get("keywords") or "").split())
+    if keywords:
+        params["keywords"] = keywords.lower()
+    city = " ".join((data.get("city") or "").split())
+    if city:
+        params["city"] = city.lower()
+    state = (data.get("state") or "").strip()
+    if state:
+        params["state"] = state.upper()
+    for name in ("bedrooms", "price"):
+        try:
+            value = int(float(data.get(name) or ""))
+        except (TypeError, ValueError):
+            continue
+        if value >= 0:
+            params[name] = value
+
+    # "within radius miles of" a zipcode or a lat/lng point
+    near = (data.get("near") or "").strip()
+    point = geo.geocode_zipcode(near) if near else None
+    if point is not None:
+        params["near"] = near[:5]
+    else:
+        lat, lng = _float(data.get("lat")), _float(data.get("lng"))
+        if lat is not None and lng is not None and -90 <= lat <= 90 and -180 <= lng <= 180:
+            point = (lat, lng)
+    if point is not None:
+        radius = _float(data.get("radius")) or DEFAULT_RADIUS
+        params["lat"], params["lng"] = round(point[0], 5), round(point[1], 5)
+        params["radius"] = round(min(max(radius, 0.1), geo.MAX_RADIUS_MILES), 1)
+
+    # map viewport, "south,west,north,east", west > east across the antimeridian
+    try:
+        south, west, north, east = (
+            round(_float(value), 5) for value in (data.get("bbox") or "").split(",")
+        )
+    except (TypeError, ValueError):
+        pass
+    else:
+        longitudes_valid = -180 <= west <= 180 and -180 <= east <= 180 and west != east
+        if -90 <= south < north <= 90 and longitudes_valid:
+            params["bbox"] = [south, west, north, east]
+    return params
+
+
+def canonical_key(params):
+    """Digest of normalized ``params``, the same for every equivalent search."""
+    return hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def canonical_query(params):
+    """
+    Query string of normalized ``params``: the form fields that produce them,
+    sorted, so every equivalent search has the same URL.
+    """
+    fields = [
+        (name, params[name])
+        for name in ("keywords", "city", "state", "bedrooms", "price")
+        if name in params
+    ]
+    if "radius" in params:
+        if "near" in params:
+            fields.append(("near", params["near"]))
+        else:
+            fields += [("lat", params["lat"]), ("lng", params["lng"])]
+        fields.append(("radius", params["radius"]))
+    if "bbox" in params:
+        fields.append(("bbox", ",".join(str(value) for value in params["bbox"])))
+    return urlencode(sorted(fields))
+
+
+def _float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def filter_listings(queryset, params):
+    """Apply the structured (non keyword) filters of normalized ``params``."""
+    if "state" in params:
+        queryset = queryset.filter(state=params["state"])
+    if "city" in params:
+        # matches the Lower("city") expression index
+        queryset = queryset.alias(city_lower=Lower("city")).filter(
+            city_lower=params["city"]
+        )
+    if "bedrooms" in params:
+        queryset = queryset.filter(bedrooms=params["bedrooms"])
+    if "price" in params:
+        queryset = queryset.filter(price__lte=params["price"])
+    if "bbox" in params:
+        queryset = geo.within_box(queryset, *params["bbox"])
+    if "radius" in params:
+        queryset = geo.within_radius(queryset, params["lat"], params["lng"], params["radius"])
+    return queryset
+
+
+def _realtor_ids(keywords):
+    # realtors are a handful of rows, matching them by name is cheap and
+    # keeps the listing side of the OR on the full text index
+    return Realtor.objects.filter(name__icontains=keywords).values("id")
+
+
+class ContainsBackend:
+    """The original leading-wildcard LIKE chain; works everywhere, scans."""
+
+    ranked = False
+
+    def matches(self, queryset, keywords):
+        return queryset.filter(
+            Q(title__icontains=keywords)
+            | Q(description__icontains=keywords)
+            | Q(address__icontains=keywords)
+            | Q(realtor__name__icontains=keywords)
+        )
+
+    def search(self, queryset, keywords):
+        return self.matches(queryset, keywords)
+
+
+class SqliteFTSBackend:
+    """FTS5 over title/description/address/city, ranked with bm25."""
+
+    ranked = True
+
+    @staticmethod
+    def match_expression(keywords):
+        # quote every token so user input can't inject FTS5 syntax, and
+        # prefix-match so "gar" finds "garage"
+        return " ".join(f'"{token}"*' for token in tokenize(keywords))
+
+    def matches(self, queryset, keywords):
+        match = self.match_expression(keywords)
+        if not match:
+            return ContainsBackend().matches(queryset, keywords)
+        matched_ids = RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,)
+        )
+        return queryset.filter(Q(id__in=matched_ids) | Q(realtor_id__in=_realtor_ids(keywords)))
+
+    def search(self, queryset, keywords):
+        match = self.match_expression(keywords)
+        if not match:
+            return ContainsBackend().search(queryset, keywords)
+        # one MATCH for the whole query: the best RANKED_MATCHES hits with
+        # their bm25, which SQLite materializes once and probes per row.
+        # Ranking inside the per-row subquery re-ran the MATCH for every
+        # candidate (45 s for "pool" on 70k listings).
+        rank = RawSQL(
+            f"SELECT ranked.rank FROM ("
+            f"SELECT rowid AS id, bm25({FTS_TABLE}, 10.0, 1.0, 4.0, 4.0) AS rank "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT {RANKED_MATCHES}"
+            f") ranked WHERE ranked.id = {Listing._meta.db_table}.id",
+            (match,),
+        )
+        # bm25 is negative, lower is better; hits past the ranked ones and
+        # realtor-only hits follow newest first
+        return (
+            self.matches(queryset, keywords)
+            .annotate(rank=rank)
+            .order_by(F("rank").asc(nulls_last=True), "-list_date", "-id")
+        )
+
+
+class PostgresFTSBackend:
+    """Generated ``search_vector`` tsvector column + GIN index, ts_rank ordering."""
+
+    ranked = True
+
+    query = "websearch_to_tsquery('english', %s)"
+
+    def matches(self, queryset, keywords):
+        matched_ids = RawSQL(
+            f"SELECT id FROM {Listing._meta.db_table} WHERE search_vector @@ {self.query}",
+            (keywords,),
+        )
+        return queryset.filter(Q(id__in=matched_ids) | Q(realtor_id__in=_realtor_ids(keywords)))
+
+    def search(self, queryset, keywords):
+        rank = RawSQL(
+            f"ts_rank({Listing._meta.db_table}.search_vector, {self.query})", (keywords,)
+        )
+        return (
+            self.matches(queryset, keywords)
+            .annotate(rank=rank)
+            .order_by("-rank", "-list_date", "-id")
+        )
+
+
+_vendor_backends = {
+    "sqlite": SqliteFTSBackend,
+    "postgresql": PostgresFTSBackend,
+}
+
+
+def get_backend():
+    path = getattr(settings, "SEARCH_BACKEND", "")
+    if path:
+        return import_string(path)()
+    return _vendor_backends.get(connection.vendor, ContainsBackend)()
+
+
+def match_listings(params, queryset=None, backend=None):
+    """Unordered, unranked matches of ``params``; the base for counts/aggregates."""
+    if queryset is None:
+        queryset = Listing.objects.all()
+    queryset = filter_listings(queryset, params)
+    if "keywords" in params:
+        return (backend or get_backend()).matches(queryset, params["keywords"])
+    return queryset
+
+
+def search_listings(params, queryset=None, backend=None):
+    """
+    Listings matching normalized ``params``; ranked when keywords are given,
+    nearest first for a radius search.
+    """
+    if queryset is None:
+        queryset = Listing.objects.all()
+    queryset = filter_listings(queryset, params)
+    if "keywords" in params:
+        return (backend or get_backend()).search(queryset, params["keywords"])
+    if "radius" in params:
+        return queryset.order_by("distance", "-list_date", "-id")
+    return queryset.order_by("-list_date", "-id")
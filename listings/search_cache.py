@@ -0,0 +1,74 @@
+"""
+Shared cache of search result ids.
+
+The first run of a search stores its result ids under the canonical key of
+its parameters (``store``), so every worker then pages over the stored ids
+(``cached_entry`` and ``entry_page``) and loads only that page's rows
+instead of running the search again for page 2. The aggregate_searches
+command precomputes the most submitted searches of the search log the same
+way (``warm``). Like the facet counts, entries are keyed on the listings
+generation, so a listing write retires them all.
+
+Only the first ``MAX_CACHED_IDS`` ids are kept: later pages of a large
+result run the id query for their page only, and take the result count
+from the entry instead of counting again. Radius searches store
+``(id, distance)`` pairs, their cards show the distance.
+"""
+from django.core.cache import cache
+from django.core.paginator import Paginator
+
+from .pagination import PER_PAGE
+from .search import canonical_key, match_listings, search_listings
+from .versions import listings_generation
+
+
+MAX_CACHED_IDS = 1000
+
+
+class CachedResults:
+    """The first ids of a result of ``total`` listings, as a Paginator source."""
+
+    def __init__(self, ids, total):
+        self.ids = ids
+        self.total = total
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, index):
+        return self.ids[index]
+
+
+def cache_key(params):
+    return f"search:results:{listings_generation()}:{canonical_key(params)}"
+
+
+def store(params):
+    """Run the search of ``params`` and store its first result ids."""
+    results = search_listings(params)
+    if "radius" in params:
+        ids = list(results.values_list("id", "distance")[:MAX_CACHED_IDS])
+    else:
+        ids = list(results.values_list("id", flat=True)[:MAX_CACHED_IDS])
+    total = len(ids) if len(ids) < MAX_CACHED_IDS else match_listings(params).count()
+    entry = {"ids": ids, "total": total}
+    cache.set(cache_key(params), entry, None)
+    return entry
+
+
+def warm(params):
+    """Store the result ids of ``params``; returns how many listings match."""
+    return store(params)["total"]
+
+
+def cached_entry(params):
+    """The stored ids of ``params`` and their total, None if not stored."""
+    return cache.get(cache_key(params))
+
+
+def entry_page(entry, number, per_page=PER_PAGE):
+    """Page ``number`` of a stored entry, None past the stored ids."""
+    page = Paginator(CachedResults(entry["ids"], entry["total"]), per_page).get_page(number)
+    if page.end_index() > len(entry["ids"]):
+        return None
+    return page
@@ -0,0 +1,291 @@
+"""
+In-process inverted index for listing keyword search, for deployments where
+the database can't host full text search.
+
+Every listing is a document made of the tokens of its title, description,
+address, city and realtor name, plus facet terms (``state:CA``,
+``city:los angeles``, ``beds:3``). Keywords match token prefixes, as the
+full text backends do ("gar" finds "garage"), through a sorted list of the
+tokens. Posting lists are sorted ``array("q")`` of listing ids, so a
+million-listing index costs 8 bytes per posting instead of a Python int
+object each. Queries intersect the posting lists (shortest first, then
+binary search the longer ones) and return ids ordered newest first; the
+caller fetches only the rows of the page it shows.
+
+The index is updated incrementally by the ``post_save``/``post_delete``
+receivers in ``listings.signals``. Each worker process holds its own copy,
+loaded and kept in line with the table in the background by a
+``listings.snapshots.Refresher``: a write made by another process or by a
+bulk import is picked up within ``CHECK_INTERVAL`` seconds. Snapshots
+(``manage.py build_search_index``) let workers start without scanning the
+table. They hold only data: a JSON header followed by the raw posting
+arrays.
+"""
+import json
+import os
+import sys
+import threading
+from array import array
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from .models import Listing
+from .search import tokenize
+from .snapshots import Refresher
+
+
+SNAPSHOT_VERSION = 3
+
+INDEXED_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "address",
+    "city",
+    "state",
+    "bedrooms",
+    "price",
+    "list_date",
+    "updated_at",
+    "realtor_id",
+    "realtor__name",
+)
+
+
+def _contains(postings, doc_id):
+    i = bisect_left(postings, doc_id)
+    return i < len(postings) and postings[i] == doc_id
+
+
+def facet_terms(state, city, bedrooms):
+    return (
+        f"state:{(state or '').upper()}",
+        f"city:{' '.join((city or '').lower().split())}",
+        f"beds:{bedrooms}",
+    )
+
+
+def _is_keyword(term):
+    # facet and realtor terms have a colon, tokenize never produces one
+    return ":" not in term
+
+
+class InvertedIndex:
+
+    def __init__(self):
+        self.postings = {}
+        # id -> (terms, price, sort key, state, bedrooms); terms are needed to
+        # undo a document, the rest answers price filters, ordering and facets
+        self.docs = {}
+        # keyword terms in order, for prefix matching
+        self.terms = []
+        # newest updated_at indexed, where catch_up resumes
+        self.updated = 0.0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, row):
+        """Index (or re-index) a listing given as a dict of ``INDEXED_FIELDS``."""
+        doc_id = row["id"]
+        terms = set(
+            tokenize(
+                " ".join(
+                    str(row[name] or "")
+                    for name in ("title", "description", "address", "city", "realtor__name")
+                )
+            )
+        )
+        terms.update(facet_terms(row["state"], row["city"], row["bedrooms"]))
+        terms.add(f"realtor:{row['realtor_id']}")
+        sort_key = (row["list_date"].timestamp(), doc_id)
+        with self.lock:
+            self.remove(doc_id)
+            for term in terms:
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = array("q")
+                    if _is_keyword(term):
+                        insort(self.terms, term)
+                insort(postings, doc_id)
+            self.docs[doc_id] = (
+                tuple(terms), row["price"], sort_key, (row["state"] or "").upper(), row["bedrooms"]
+            )
+            self.updated = max(self.updated, row["updated_at"].timestamp())
+
+    def remove(self, doc_id):
+        with self.lock:
+            doc = self.docs.pop(doc_id, None)
+            if doc is None:
+                return
+            for term in doc[0]:
+                postings = self.postings[term]
+                i = bisect_left(postings, doc_id)
+                if i < len(postings) and postings[i] == doc_id:
+                    del postings[i]
+                if not postings:
+                    del self.postings[term]
+                    if _is_keyword(term):
+                        del self.terms[bisect_left(self.terms, term)]
+
+    def prefix_postings(self, prefix):
+        """Sorted ids of the documents with a keyword starting with ``prefix``."""
+        with self.lock:
+            terms = self.terms
+            i = bisect_left(terms, prefix)
+            matched = []
+            while i < len(terms) and terms[i].startswith(prefix):
+                matched.append(self.postings[terms[i]])
+                i += 1
+        if len(matched) == 1:
+            return matched[0]
+        return sorted(set().union(*matched))
+
+    def search(self, params):
+        """Ids of listings matching normalized search ``params``, newest first."""
+        terms = []
+        if "state" in params:
+            terms.append(f"state:{params['state']}")
+        if "city" in params:
+            terms.append(f"city:{params['city']}")
+        if "bedrooms" in params:
+            terms.append(f"beds:{params['bedrooms']}")
+
+        with self.lock:
+            lists = []
+            for term in set(terms):
+                postings = self.postings.get(term)
+                if not postings:
+                    return []
+                lists.append(postings)
+            for token in set(tokenize(params.get("keywords", ""))):
+                postings = self.prefix_postings(token)
+                if not postings:
+                    return []
+                lists.append(postings)
+
+            if lists:
+                lists.sort(key=len)
+                ids = [
+                    doc_id for doc_id in lists[0]
+                    if all(_contains(other, doc_id) for other in lists[1:])
+                ]
+            else:
+                ids = list(self.docs)
+
+            max_price = params.get("price")
+            docs = self.docs
+            if max_price is not None:
+                ids = [doc_id for doc_id in ids if docs[doc_id][1] <= max_price]
+            ids.sort(key=lambda doc_id: docs[doc_id][2], reverse=True)
+        return ids
+
+    def facet_rows(self, ids):
+        """(state, bedrooms, price) of each id, for listings.facets.count_facets."""
+        docs = self.docs
+        for doc_id in ids:
+            doc = docs[doc_id]
+            yield doc[3], doc[4], doc[1]
+
+    @classmethod
+    def build(cls, queryset=None):
+        index = cls()
+        if queryset is None:
+            queryset = Listing.objects.all()
+        for row in queryset.values(*INDEXED_FIELDS).iterator(chunk_size=2000):
+            index.add(row)
+        return index
+
+    def catch_up(self):
+        """Re-index the listings written since the newest one indexed."""
+        since = datetime.fromtimestamp(self.updated, tz=timezone.utc)
+        rows = Listing.objects.filter(updated_at__gte=since).values(*INDEXED_FIELDS)
+        for row in rows.iterator(chunk_size=2000):
+            self.add(row)
+
+    # snapshots
+
+    def fingerprint(self):
+        return len(self.docs), max(self.docs, default=0), self.updated
+
+    def save(self, path):
+        with self.lock:
+            terms = list(self.postings)
+            header = {
+                "version": SNAPSHOT_VERSION,
+                "byteorder": sys.byteorder,
+                "updated": self.updated,
+                "terms": [[term, len(self.postings[term])] for term in terms],
+                # id, price, list date, state, bedrooms; the terms of a
+                # document are read back from the postings
+                "docs": [
+                    [doc_id, doc[1], doc[2][0], doc[3], doc[4]] for doc_id, doc in self.docs.items()
+                ],
+            }
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as snapshot:
+                snapshot.write(json.dumps(header).encode() + b"\n")
+                for term in terms:
+                    snapshot.write(self.postings[term].tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a snapshot written by ``save``; None if missing or incompatible."""
+        try:
+            with open(path, "rb") as snapshot:
+                header = json.loads(snapshot.readline())
+                if (
+                    header.get("version") != SNAPSHOT_VERSION
+                    or header.get("byteorder") != sys.byteorder
+                ):
+                    return None
+                index = cls()
+                doc_terms = {}
+                for term, length in header["terms"]:
+                    postings = array("q")
+                    postings.frombytes(snapshot.read(length * postings.itemsize))
+                    index.postings[term] = postings
+                    for doc_id in postings:
+                        doc_terms.setdefault(doc_id, []).append(term)
+        except (OSError, ValueError, KeyError):
+            return None
+        index.terms = sorted(term for term in index.postings if _is_keyword(term))
+        index.docs = {
+            doc_id: (tuple(doc_terms.get(doc_id, ())), price, (listed, doc_id), state, bedrooms)
+            for doc_id, price, listed, state, bedrooms in header["docs"]
+        }
+        index.updated = header["updated"]
+        return index
+
+
+_refresher = Refresher(InvertedIndex, "SEARCH_INDEX_SNAPSHOT")
+
+
+def is_enabled():
+    return getattr(settings, "SEARCH_INDEX_ENABLED", False)
+
+
+def get_index():
+    """
+    The process-wide index, None while it is first loaded in the background;
+    the caller searches the database meanwhile.
+    """
+    return _refresher.get()
+
+
+def refresh_index():
+    """Load or catch up the index now, in this thread (commands, tests)."""
+    return _refresher.refresh()
+
+
+def loaded_index():
+    """The index if this process has already loaded it, without loading it."""
+    return _refresher.loaded()
+
+
+def reset_index():
+    _refresher.reset()
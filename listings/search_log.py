@@ -0,0 +1,74 @@
+"""
+Append-only log of submitted searches (``SearchLog``).
+
+``SearchLogHandler`` receives the "listings.search" records the search view
+logs, buffers them in memory and writes each batch with one bulk insert, once
+``capacity`` records are waiting or with the first record ``interval``
+seconds after the last batch, and on shutdown. It runs behind a
+``listings.logs.BackgroundHandler`` (see ``settings.LOGGING``), so the inserts
+happen in the listener thread and never on the request path. A batch that
+meets a locked database is retried on a fresh connection a few times before
+it is reported and dropped. The test runner detaches the handler, tests
+flush it themselves.
+"""
+import logging.handlers
+import time
+from datetime import datetime, timezone
+
+from django.db import OperationalError, connection
+
+
+RETRIES = 3
+RETRY_DELAY = 0.2
+
+
+class SearchLogHandler(logging.handlers.BufferingHandler):
+
+    def __init__(self, capacity=500, interval=5.0):
+        super().__init__(capacity)
+        self.interval = interval
+        self.flushed_at = time.monotonic()
+
+    def shouldFlush(self, record):
+        return (
+            super().shouldFlush(record)
+            or time.monotonic() - self.flushed_at >= self.interval
+        )
+
+    def flush(self):
+        # imported here: handlers are built while logging is configured,
+        # before the models are loaded
+        from .models import SearchLog
+        from .search import canonical_key
+
+        with self.lock:
+            records, self.buffer = self.buffer, []
+            self.flushed_at = time.monotonic()
+            rows = [
+                SearchLog(
+                    key=canonical_key(record.data["params"]),
+                    params=record.data["params"],
+                    results=record.data["results"],
+                    source=record.data["source"],
+                    duration_ms=record.data["ms"],
+                    searched_at=datetime.fromtimestamp(record.created, timezone.utc),
+                )
+                for record in records
+                if "params" in (getattr(record, "data", None) or {})
+            ]
+            if not rows:
+                return
+            for attempt in range(1, RETRIES + 1):
+                try:
+                    SearchLog.objects.bulk_create(rows)
+                    return
+                except OperationalError:
+                    # "database is locked": give the writer holding it a
+                    # moment, on a connection without a failed transaction
+                    if attempt == RETRIES:
+                        break
+                    connection.close()
+                    time.sleep(RETRY_DELAY * attempt)
+                except Exception:
+                    break
+            self.handleError(records[-1])
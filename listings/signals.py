@@ -0,0 +1,159 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Contact, Listing, ListingPhoto, ListingSummary, Realtor
+from . import analytics, images, inbox, realtor_stats, search_index, summaries
+from .versions import bump_listings_generation, bump_object_version
+
+
+# connected first: receivers run in order, and the version bump below must
+# not let a card be rendered (and cached) from the old summary
+@receiver(post_save, sender=Listing)
+def update_summary(sender, instance, **kwargs):
+    summaries.refresh([instance.pk])
+
+
+@receiver(post_save, sender=Realtor)
+def update_realtor_name(sender, instance, created, **kwargs):
+    if not created:
+        summaries.rename_realtor(instance)
+
+
+def _changes_stats(update_fields):
+    return update_fields is None or bool({"price", "realtor"} & set(update_fields))
+
+
+@receiver(pre_save, sender=Listing)
+def remember_realtor(sender, instance, update_fields=None, **kwargs):
+    # a listing moved to another realtor changes the old realtor's stats too
+    instance._stored_realtor_price = None
+    if instance.pk and _changes_stats(update_fields):
+        instance._stored_realtor_price = (
+            Listing.objects.filter(pk=instance.pk).values_list("realtor_id", "price").first()
+        )
+
+
+@receiver(post_save, sender=Listing)
+def update_realtor_stats(sender, instance, created, update_fields=None, **kwargs):
+    if not _changes_stats(update_fields):
+        return
+    if created or instance._stored_realtor_price is None:
+        realtor_stats.listings_changed({instance.realtor_id: 1}, [instance.realtor_id])
+        return
+    previous, price = instance._stored_realtor_price
+    if previous != instance.realtor_id:
+        realtor_stats.listings_changed(
+            {instance.realtor_id: 1, previous: -1}, [instance.realtor_id, previous]
+        )
+    elif price != instance.price:
+        realtor_stats.listings_changed({}, [instance.realtor_id])
+
+
+@receiver(post_delete, sender=Listing)
+def remove_from_realtor_stats(sender, instance, **kwargs):
+    realtor_stats.listings_changed({instance.realtor_id: -1}, [instance.realtor_id])
+
+
+@receiver(post_save, sender=Realtor)
+def create_realtor_stats(sender, instance, created, **kwargs):
+    if created:
+        realtor_stats.refresh([instance.pk])
+
+
+@receiver(post_save, sender=Contact)
+def count_new_contact(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        inbox.count_unread({instance.realtor_id: 1})
+
+
+@receiver(post_delete, sender=Contact)
+def uncount_contact(sender, instance, **kwargs):
+    if not instance.is_read:
+        inbox.count_unread({instance.realtor_id: -1})
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+@receiver(post_save, sender=Realtor)
+@receiver(post_delete, sender=Realtor)
+def invalidate_listing_caches(sender, instance, **kwargs):
+    bump_listings_generation()
+    bump_object_version(sender._meta.model_name, instance.pk)
+
+
+@receiver(post_save, sender=Listing)
+def index_listing(sender, instance, **kwargs):
+    index = search_index.loaded_index()
+    if index is not None:
+        index.add(
+            Listing.objects.filter(pk=instance.pk)
+            .values(*search_index.INDEXED_FIELDS)
+            .get()
+        )
+
+
+@receiver(post_delete, sender=Listing)
+def unindex_listing(sender, instance, **kwargs):
+    index = search_index.loaded_index()
+    if index is not None:
+        index.remove(instance.pk)
+
+
+@receiver(post_save, sender=Listing)
+def update_analytics(sender, instance, **kwargs):
+    snapshot = analytics.loaded_snapshot()
+    if snapshot is not None:
+        snapshot.upsert(Listing.objects.filter(pk=instance.pk).values(*analytics.FIELDS).get())
+
+
+@receiver(post_delete, sender=Listing)
+def remove_from_analytics(sender, instance, **kwargs):
+    snapshot = analytics.loaded_snapshot()
+    if snapshot is not None:
+        snapshot.remove(instance.pk)
+
+
+@receiver(post_save, sender=Realtor)
+def reindex_realtor_listings(sender, instance, created, **kwargs):
+    # the realtor name is part of every one of their listings' documents
+    index = search_index.loaded_index()
+    if index is not None and not created:
+        rows = Listing.objects.filter(realtor=instance).values(*search_index.INDEXED_FIELDS)
+        for row in rows.iterator(chunk_size=2000):
+            index.add(row)
+
+
+# a listing's cover is a copy of its first photo's file and variants, see
+# Listing.update_cover, so only the photos are derived
+@receiver(post_save, sender=ListingPhoto)
+@receiver(post_save, sender=Realtor)
+def derive_images(sender, instance, raw=False, **kwargs):
+    # saves that keep the same files have nothing to derive; fixtures don't
+    # go through Model.save
+    changed = getattr(instance, "_changed_images", ())
+    if not settings.IMAGE_WORKERS or raw or not changed:
+        return
+
+    if sender is ListingPhoto:
+        kind, pk = "listing", instance.listing_id
+        # the cover and its card show the same file
+        rows = [
+            (ListingPhoto, "image", [instance.pk]),
+            (Listing, "photo_main", [pk]),
+            (ListingSummary, "photo_main", [pk]),
+        ]
+    else:
+        kind, pk = "realtor", instance.pk
+        rows = [(Realtor, "photo", [pk])]
+    images_to_derive = [(getattr(instance, name).name, rows) for name in changed]
+
+    def variants_recorded():
+        # cached fragments rendered the plain originals, re-render them
+        bump_listings_generation()
+        bump_object_version(kind, pk)
+
+    # after commit: the worker processes read the row's files, and a rolled
+    # back save shouldn't leave variants behind
+    transaction.on_commit(lambda: images.schedule(images_to_derive, variants_recorded))
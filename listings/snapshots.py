@@ -0,0 +1,117 @@
+"""
+Process-wide structures derived from the listings table and saved to files:
+the keyword index of ``listings.search_index`` and the price columns of
+``listings.analytics``.
+
+A ``Refresher`` holds one process's copy of a structure. Requests only read
+the copy already held (``get``) and never load or build one. Loading and
+checking run in a background thread:
+
+* loading uses the snapshot file, caught up with the rows changed since it
+  was written, or builds the structure from the table when there is no file;
+* every ``settings.SNAPSHOT_CHECK_INTERVAL`` seconds the thread checks
+  whether the table changed behind the process's back, through other
+  processes or bulk writes that skip the signals. None turns the
+  background thread off, ``refresh()`` is then called explicitly (tests).
+
+Until a new copy is ready, the old one keeps answering. Only the management
+commands write snapshot files.
+
+A structure class provides ``load(path)`` and ``build()``. Its instances
+provide ``fingerprint()``, ``catch_up()`` and ``__len__``.
+
+Every write, including bulk ones, sets the listing's ``updated_at``, so the
+rows a copy lacks are those updated after the newest ``updated_at`` it has
+seen. A row deleted by another process is different: it only shows up as a
+count mismatch, and that costs a rebuild.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Max
+
+from .models import Listing
+
+
+CHECK_INTERVAL = 30
+
+logger = logging.getLogger(__name__)
+
+
+def table_state():
+    """(count, last id, newest updated_at timestamp) of the listings table."""
+    state = Listing.objects.aggregate(
+        count=Count("id"), last_id=Max("id"), updated=Max("updated_at")
+    )
+    updated = state["updated"].timestamp() if state["updated"] else 0.0
+    return state["count"], state["last_id"] or 0, updated
+
+
+class Refresher:
+    """The copy of ``structure`` this process serves, kept in line with the table."""
+
+    def __init__(self, structure, path_setting):
+        self.structure = structure
+        self.path_setting = path_setting
+        self.value = None
+        self.checked_at = None
+        self.running = False
+        self.lock = threading.Lock()
+
+    def get(self):
+        """
+        The structure, or None until its first load has finished. Starts a
+        background refresh when a check is due.
+        """
+        interval = getattr(settings, "SNAPSHOT_CHECK_INTERVAL", CHECK_INTERVAL)
+        if interval is None:
+            return self.value
+        with self.lock:
+            due = not self.running and (
+                self.checked_at is None or time.monotonic() - self.checked_at >= interval
+            )
+            if due:
+                self.running = True
+                self.checked_at = time.monotonic()
+        if due:
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+        return self.value
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("refreshing %s failed", self.structure.__name__)
+        finally:
+            connections.close_all()
+            with self.lock:
+                self.running = False
+
+    def refresh(self):
+        """Load, catch up or rebuild the structure so it matches the table; returns it."""
+        value = self.value
+        if value is None:
+            path = getattr(settings, self.path_setting, "")
+            value = self.structure.load(path) if path else None
+        if value is None:
+            value = self.structure.build()
+        elif value.fingerprint() != table_state():
+            value.catch_up()
+            last_id = value.fingerprint()[1]
+            # rows deleted elsewhere are invisible to the catch up
+            if len(value) != Listing.objects.filter(id__lte=last_id).count():
+                value = self.structure.build()
+        self.value = value
+        self.checked_at = time.monotonic()
+        return value
+
+    def loaded(self):
+        """The structure if this process holds one, without loading it."""
+        return self.value
+
+    def reset(self):
+        self.value = None
+        self.checked_at = None
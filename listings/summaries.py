@@ -0,0 +1,88 @@
+"""
+Maintenance of ``ListingSummary``, the card read model.
+
+``refresh(ids)`` recomputes the summaries of some listings with one select
+(joining the realtor) and one upsert; the Listing signal calls it for a
+single listing, feed imports once per batch. A realtor
+rename is one UPDATE of ``realtor_name`` over the realtor's summaries, and
+deleting a listing deletes its summary through the one-to-one cascade.
+``rebuild()`` copies every listing in pk ranges with INSERT ... SELECT
+upserts, for the build_summaries command and, past the ids it started
+from, populate_db.
+"""
+from django.db import connection
+from django.db.models import Max
+
+from .models import Listing, ListingSummary
+
+
+# summary field -> Listing lookup it is copied from
+SOURCES = {
+    "listing_id": "id",
+    "realtor_id": "realtor_id",
+    "realtor_name": "realtor__name",
+    "title": "title",
+    "price": "price",
+    "bedrooms": "bedrooms",
+    "bathrooms": "bathrooms",
+    "garage": "garage",
+    "sqft": "sqft",
+    "list_date": "list_date",
+    "photo_main": "photo_main",
+    "photo_main_variants": "photo_main_variants",
+}
+UPDATE_FIELDS = [name for name in SOURCES if name != "listing_id"]
+BATCH_SIZE = 50000
+
+
+def _upsert(rows):
+    ListingSummary.objects.bulk_create(
+        [
+            ListingSummary(**{name: row[source] for name, source in SOURCES.items()})
+            for row in rows
+        ],
+        update_conflicts=True,
+        unique_fields=["listing"],
+        update_fields=UPDATE_FIELDS,
+    )
+    return len(rows)
+
+
+def refresh(ids):
+    """Recompute the summaries of the listings ``ids``; returns how many exist."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    return _upsert(list(Listing.objects.filter(id__in=ids).values(*SOURCES.values())))
+
+
+def rename_realtor(realtor):
+    return ListingSummary.objects.filter(realtor_id=realtor.pk).update(realtor_name=realtor.name)
+
+
+def _copy(listings):
+    """Upsert the summaries of the ``listings`` queryset with one INSERT ... SELECT."""
+    quote = connection.ops.quote_name
+    select, params = listings.order_by().values(*SOURCES.values()).query.sql_with_params()
+    columns = [quote(ListingSummary._meta.get_field(name).column) for name in SOURCES]
+    updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(ListingSummary._meta.db_table)} ({', '.join(columns)}) "
+            f"{select} ON CONFLICT ({columns[0]}) DO UPDATE SET {updates}",
+            params,
+        )
+        return cursor.rowcount
+
+
+def rebuild(batch_size=BATCH_SIZE, after=0):
+    """
+    Refresh the summary of every listing with an id above ``after``, copying
+    pk ranges inside the database; returns how many were written.
+    """
+    last = Listing.objects.aggregate(last=Max("id"))["last"] or 0
+    written = 0
+    for start in range(after, last, batch_size):
+        # the WHERE also keeps SQLite from reading ON CONFLICT as a join constraint
+        written += _copy(Listing.objects.filter(id__gt=start, id__lte=start + batch_size))
+    return written
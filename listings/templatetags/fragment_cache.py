@@ -0,0 +1,43 @@
+"""
+Django's ``{% cache %}`` tag, releasing the stampede lock a miss on a
+``listings.cache.TwoTierCache`` takes when rendering the fragment raises.
+Otherwise the lock would stay held for its whole timeout while the other
+workers wait on it.
+"""
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.template import Library
+from django.templatetags import cache
+
+
+register = Library()
+
+
+class CacheNode(cache.CacheNode):
+
+    def render(self, context):
+        try:
+            return super().render(context)
+        finally:
+            self.release(context)
+
+    def release(self, context):
+        if self.cache_name is None:
+            return
+        try:
+            fragment_cache = caches[self.cache_name.resolve(context)]
+            vary_on = [var.resolve(context) for var in self.vary_on]
+        except Exception:
+            # the tag failed before it looked the fragment up
+            return
+        release = getattr(fragment_cache, "release", None)
+        if release is not None:
+            release(make_template_fragment_key(self.fragment_name, vary_on))
+
+
+@register.tag("cache")
+def do_cache(parser, token):
+    node = cache.do_cache(parser, token)
+    return CacheNode(
+        node.nodelist, node.expire_time_var, node.fragment_name, node.vary_on, node.cache_name
+    )
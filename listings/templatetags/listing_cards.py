@@ -0,0 +1,37 @@
+from django import template
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+
+from listings.versions import object_versions
+
+
+register = template.Library()
+
+
+@register.filter
+def with_card_versions(listings):
+    """
+    The listings (summaries or Listing rows) as a list, each with the
+    ``listing_version`` and ``realtor_version`` that key its cached card.
+    The versions are fetched in one cache round trip for the whole page, and
+    so are the cards already rendered, which the "cards" cache then holds
+    locally while the page's {% cache %} tags read them one by one.
+    """
+    listings = list(listings)
+    if not listings:
+        return listings
+    keys = []
+    for listing in listings:
+        keys += [("listing", listing.pk), ("realtor", listing.realtor_id)]
+    versions = iter(object_versions(*keys))
+    cards = []
+    for listing in listings:
+        listing.listing_version = next(versions)
+        listing.realtor_version = next(versions)
+        cards.append(
+            make_template_fragment_key(
+                "listing_card", [listing.pk, listing.listing_version, listing.realtor_version]
+            )
+        )
+    caches["cards"].get_many(cards)
+    return listings
@@ -0,0 +1,51 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from listings.images import MIME_TYPES, WIDTHS, has_variants, variant_formats, variant_name
+
+
+register = template.Library()
+
+
+def srcset(name, fmt):
+    return ", ".join(
+        f"{default_storage.url(variant_name(name, width, fmt))} {width}w" for width in WIDTHS
+    )
+
+
+@register.simple_tag
+def picture(image, css_class="", sizes="100vw", alt=""):
+    """
+    ``<picture>`` for an ImageField value with AVIF/WebP/JPEG srcsets of its
+    derived variants, falling back to the original until they are recorded.
+    """
+    if not image:
+        return ""
+    name = image.name
+    formats = variant_formats(image)
+    if not formats:
+        return format_html('<img class="{}" src="{}" alt="{}" loading="lazy">', css_class, image.url, alt)
+    sources = format_html_join(
+        "", '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[fmt], srcset(name, fmt), sizes) for fmt in formats if fmt != "jpeg"),
+    )
+    return format_html(
+        '<picture>{}<img class="{}" src="{}" srcset="{}" sizes="{}" alt="{}" loading="lazy"></picture>',
+        sources,
+        css_class,
+        default_storage.url(variant_name(name, WIDTHS[0], "jpeg")),
+        srcset(name, "jpeg"),
+        sizes,
+        alt,
+    )
+
+
+@register.simple_tag
+def thumbnail_url(image, width=WIDTHS[0]):
+    """URL of the JPEG variant of ``image`` at ``width``, or the original's."""
+    if not image:
+        return ""
+    if has_variants(image):
+        return default_storage.url(variant_name(image.name, width, "jpeg"))
+    return image.url
@@ -0,0 +1,55 @@
+import logging
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from . import instrumentation
+
+
+class BudgetTestRunner(DiscoverRunner):
+    """
+    The default test runner, failing requests that go over their budget.
+    Tests get a process-local "default" cache instead of the shared one the
+    dev server uses, as they get the locmem email backend, static URLs
+    that don't need collectstatic's manifest, and no snapshot files or
+    background snapshot threads: tests load them with refresh_*(). The
+    search log handler is detached, its inserts would run in a thread
+    outside the test's transaction.
+    """
+
+    detached_handlers = {"listings.search": "search_log"}
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(
+            CACHES={
+                **settings.CACHES,
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            },
+            STORAGES={
+                **settings.STORAGES,
+                "staticfiles": {
+                    "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+                },
+            },
+            ANALYTICS_SNAPSHOT="",
+            SEARCH_INDEX_SNAPSHOT="",
+            SNAPSHOT_CHECK_INTERVAL=None,
+        )
+        self.test_settings.enable()
+        self.detached = []
+        for logger_name, handler_name in self.detached_handlers.items():
+            logger = logging.getLogger(logger_name)
+            for handler in list(logger.handlers):
+                if handler.name == handler_name:
+                    logger.removeHandler(handler)
+                    self.detached.append((logger, handler))
+        instrumentation.enforce_budgets()
+
+    def teardown_test_environment(self, **kwargs):
+        instrumentation.enforce_budgets(False)
+        for logger, handler in self.detached:
+            logger.addHandler(handler)
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,980 @@
-from django.test import TestCase
+import datetime
+import importlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.core.cache.utils import make_template_fragment_key
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import alerts, analytics, geo, images, outbox, realtor_stats, search_cache, summaries
+from .cache import FileCache
+from .facets import aggregate_facets, count_facets
+from .logs import JsonFormatter, SampledFilter
+from .models import (
+    Listing,
+    ListingPhoto,
+    ListingSummary,
+    OutboundEmail,
+    Realtor,
+    RealtorStats,
+    SavedSearch,
+    SearchLog,
+)
+from .pagination import akeyset_page, decode_cursor, keyset_page
+from .search import canonical_key, match_listings, normalize_params, search_listings
+from .search_index import InvertedIndex, refresh_index, reset_index
+from .search_log import SearchLogHandler
+from .versions import bump_object_version
+
+
+def make_realtor(**fields):
+    return Realtor.objects.create(**{
+        "name": "Kyle Brown",
+        "photo": "realtors/kyle.jpg",
+        "description": "Realtor",
+        "email": "kyle@example.com",
+        "phone": "555-555-5555",
+        **fields,
+    })
+
+
+def make_listing(realtor, **fields):
+    return Listing.objects.create(**{
+        "realtor": realtor,
+        "title": "Family Home",
+        "address": "1 Main St",
+        "city": "Boston",
+        "state": "MA",
+        "zipcode": "02101",
+        "description": "A house",
+        "price": 300000,
+        "bedrooms": 3,
+        "bathrooms": 2,
+        "garage": 1,
+        "sqft": 1500,
+        "lot_size": 0.25,
+        **fields,
+    })
+
+
+class FreshCacheTestCase(TestCase):
+    """Row ids are reused between tests, so cache entries keyed on them aren't."""
+
+    def setUp(self):
+        self.clear_caches()
+
+    def clear_caches(self):
+        for alias in ("default", "fragments", "cards"):
+            caches[alias].clear()
+
+
+class SearchTests(FreshCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.realtor = make_realtor()
+        self.title_hit = make_listing(self.realtor, title="Pool House")
+        self.description_hit = make_listing(self.realtor, description="Has a pool out back")
+        self.miss = make_listing(self.realtor, title="Garden Flat")
+
+    def search(self, **data):
+        return list(search_listings(normalize_params(data)).values_list("id", flat=True))
+
+    def test_keywords_ranked_by_relevance(self):
+        self.assertEqual(self.search(keywords="pool"), [self.title_hit.pk, self.description_hit.pk])
+
+    def test_keywords_match_prefixes(self):
+        self.assertEqual(self.search(keywords="gard"), [self.miss.pk])
+
+    def test_structured_filters_apply_to_ranked_hits(self):
+        make_listing(self.realtor, title="Pool Cottage", state="CA")
+        self.assertEqual(
+            self.search(keywords="pool", state="ma"), [self.title_hit.pk, self.description_hit.pk]
+        )
+
+    def test_hits_past_the_ranked_ones_follow_newest_first(self):
+        newer = make_listing(self.realtor, title="Pool Pool Pool")
+        with mock.patch("listings.search.RANKED_MATCHES", 1):
+            self.assertEqual(
+                self.search(keywords="pool"), [newer.pk, self.description_hit.pk, self.title_hit.pk]
+            )
+
+    def test_facet_counts_in_one_query_match_the_index_counts(self):
+        make_listing(self.realtor, state="CA", bedrooms=2, price=100000)
+        make_listing(self.realtor, price=2000000)
+        listings = match_listings(normalize_params({}))
+        with self.assertNumQueries(1):
+            facets = aggregate_facets(listings)
+        self.assertEqual(facets["total"], 5)
+        self.assertEqual((facets["state"]["MA"], facets["state"]["CA"], facets["state"]["NY"]), (4, 1, 0))
+        self.assertEqual((facets["bedrooms"]["3"], facets["bedrooms"]["2"]), (4, 1))
+        # at or under each max price, the open-ended bucket only in the total
+        self.assertEqual(
+            (facets["price"]["100000"], facets["price"]["300000"], facets["price"]["1000000"]), (1, 4, 4)
+        )
+        self.assertEqual(count_facets(listings.values_list("state", "bedrooms", "price")), facets)
+
+        response = self.client.get(reverse("search"), {"state": "CA"})
+        states = {value: count for value, _, count, _ in response.context["options"]["state"]}
+        self.assertEqual((states["MA"], states["CA"]), (0, 1))
+
+
+class GeoTests(FreshCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.realtor = make_realtor()
+        # Adak, on the Aleutians, and Amchitka, 170 miles west, past the antimeridian
+        self.adak = make_listing(self.realtor, state="AK", zipcode="99546")
+        self.amchitka = make_listing(self.realtor, latitude=51.5, longitude=179.0, state="AK")
+        self.boston = make_listing(self.realtor)
+
+    def search(self, **data):
+        return set(search_listings(normalize_params(data)).values_list("id", flat=True))
+
+    def test_bundled_table_covers_every_state(self):
+        self.assertEqual(geo.geocode("99546"), (51.8549, -177.0888))
+        self.assertGreater(len(geo.zipcode_centroids()), 40000)
+        self.assertLessEqual(set(geo.state_centroids()), set(geo.zipcodes_by_state()))
+
+    def test_bounding_box_wraps_across_the_antimeridian(self):
+        south, west, north, east = geo.bounding_box(51.85, -177.09, 200)
+        self.assertGreater(west, east)
+        self.assertTrue(geo.in_box(51.5, 179.0, south, west, north, east))
+        self.assertFalse(geo.in_box(51.5, 0.0, south, west, north, east))
+        self.assertEqual(geo.bounding_box(89.5, 10.0, 50)[1::2], (-180.0, 180.0))
+
+    def test_radius_search_across_the_antimeridian(self):
+        self.assertEqual(self.search(near="99546", radius="200"), {self.adak.pk, self.amchitka.pk})
+        self.assertEqual(self.search(near="99546", radius="50"), {self.adak.pk})
+
+    def test_viewport_across_the_antimeridian(self):
+        self.assertEqual(self.search(bbox="50,170,55,-170"), {self.adak.pk, self.amchitka.pk})
+        self.assertEqual(self.search(bbox="50,-170,55,170"), set())
+
+
+class PopulateTests(FreshCacheTestCase):
+
+    def test_synthetic_listings_are_summarized_indexed_and_located(self):
+        call_command("populate_db", realtors=3, listings=50, seed="1", stdout=io.StringIO())
+        listings = Listing.objects.all()
+        self.assertEqual(ListingSummary.objects.count(), 50)
+        self.assertEqual(
+            set(ListingSummary.objects.values_list("realtor_name", "title", "price")),
+            set(listings.values_list("realtor__name", "title", "price")),
+        )
+        for listing in listings:
+            self.assertEqual(
+                (listing.latitude, listing.longitude), geo.geocode_zipcode(listing.zipcode)
+            )
+        adjective = listings.first().title.split()[0]
+        self.assertEqual(
+            set(search_listings(normalize_params({"keywords": adjective})).values_list("id", flat=True)),
+            set(listings.filter(title__startswith=adjective).values_list("id", flat=True)),
+        )
+
+
+class FeedTests(FreshCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.realtor = make_realtor()
+        self.partner = make_listing(self.realtor, external_id="acme-1", title="Partner Home")
+        self.local = make_listing(self.realtor, title="Local Home")
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def round_trip(self, fmt, extension):
+        path = os.path.join(self.directory.name, f"feed.{extension}")
+        call_command("export_listings", path, format=fmt, stderr=io.StringIO())
+        for _ in range(2):
+            out, err = io.StringIO(), io.StringIO()
+            call_command("import_listings", path, stdout=out, stderr=err)
+            self.assertIn("upserted 2 listings, rejected 0 records", out.getvalue())
+            self.assertEqual(err.getvalue(), "")
+        return path
+
+    def test_export_import_round_trip_updates_in_place(self):
+        for fmt, extension in (("jsonl", "jsonl"), ("csv", "csv"), ("fixture", "json")):
+            with self.subTest(fmt):
+                self.round_trip(fmt, extension)
+                self.assertEqual(
+                    dict(Listing.objects.values_list("title", "external_id")),
+                    {"Partner Home": "acme-1", "Local Home": f"pk:{self.local.pk}"},
+                )
+
+    def test_pk_keys_upsert_into_another_database(self):
+        path = self.round_trip("jsonl", "jsonl")
+        # as if imported elsewhere: the pk key is just an external_id there
+        Listing.objects.filter(pk=self.local.pk).delete()
+        for _ in range(2):
+            call_command("import_listings", path, stdout=io.StringIO())
+        self.assertEqual(Listing.objects.filter(external_id=f"pk:{self.local.pk}").count(), 1)
+
+    def test_a_new_cover_drops_the_old_covers_variants(self):
+        Listing.objects.filter(pk=self.partner.pk).update(
+            photo_main="photos/old.jpg", photo_main_variants="jpeg"
+        )
+        path = os.path.join(self.directory.name, "feed.jsonl")
+        call_command("export_listings", path, format="jsonl", stderr=io.StringIO())
+
+        def cover():
+            summary = ListingSummary.objects.get(pk=self.partner.pk)
+            return summary.photo_main.name, summary.photo_main_variants
+
+        call_command("import_listings", path, stdout=io.StringIO())
+        self.assertEqual(cover(), ("photos/old.jpg", "jpeg"))
+        with open(path) as feed:
+            records = [json.loads(line) for line in feed]
+        with open(path, "w") as feed:
+            for record in records:
+                if record["external_id"] == "acme-1":
+                    record["photo_main"] = "photos/new.jpg"
+                feed.write(json.dumps(record) + "\n")
+        call_command("import_listings", path, stdout=io.StringIO())
+        self.assertEqual(cover(), ("photos/new.jpg", ""))
+
+    def test_imports_move_counts_and_leave_medians_to_recount(self):
+        other = make_realtor(name="Jenny Johnson", email="jenny@example.com")
+        realtor_stats.recount()
+        path = os.path.join(self.directory.name, "feed.jsonl")
+        call_command("export_listings", path, format="jsonl", stderr=io.StringIO())
+        with open(path) as feed:
+            records = {record["external_id"]: record for record in map(json.loads, feed)}
+        records["acme-1"]["realtor_email"] = "jenny@example.com"
+        records[f"pk:{self.local.pk}"]["price"] = 100000
+        records["acme-2"] = {
+            **records["acme-1"], "external_id": "acme-2", "realtor_email": "kyle@example.com"
+        }
+        with open(path, "w") as feed:
+            feed.writelines(json.dumps(record) + "\n" for record in records.values())
+
+        with mock.patch.object(realtor_stats, "refresh") as refresh:
+            call_command("import_listings", path, stdout=io.StringIO())
+        refresh.assert_not_called()
+        added = Listing.objects.get(external_id="acme-2")
+        stats = {stats.realtor_id: stats for stats in RealtorStats.objects.all()}
+        self.assertEqual(
+            (stats[self.realtor.pk].listing_count, stats[self.realtor.pk].median_stale), (2, True)
+        )
+        self.assertEqual(stats[self.realtor.pk].latest_listing_ids, [added.pk, self.local.pk])
+        self.assertEqual((stats[other.pk].listing_count, stats[other.pk].median_stale), (1, True))
+        self.assertEqual(stats[other.pk].latest_listing_ids, [self.partner.pk])
+        realtor_stats.recount()
+        self.assertEqual(RealtorStats.objects.get(pk=self.realtor.pk).median_price, 200000)
+
+
+class AnalyticsTests(FreshCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        analytics.reset_snapshot()
+        self.addCleanup(analytics.reset_snapshot)
+        self.realtor = make_realtor()
+        self.small = make_listing(self.realtor, sqft=1000, price=200000)
+        self.large = make_listing(self.realtor, sqft=2000, price=500000)
+        self.other = make_listing(self.realtor, sqft=1100, price=260000)
+
+    def test_requests_never_build_the_snapshot(self):
+        response = self.client.get(reverse("market_stats"), {"state": "MA"})
+        self.assertEqual(response.status_code, 503)
+        self.assertIsNone(analytics.get_snapshot())
+        # not cached without the section for good
+        self.assertNotContains(self.client.get(reverse("listing", args=[self.small.pk])), 'id="market"')
+        analytics.refresh_snapshot()
+        self.assertContains(self.client.get(reverse("listing", args=[self.small.pk])), 'id="market"')
+
+    def test_comparables_and_market(self):
+        analytics.refresh_snapshot()
+        result = analytics.describe(self.small.pk, k=1)
+        self.assertEqual([comparable["id"] for comparable in result["comparables"]], [self.other.pk])
+        self.assertEqual(result["market"]["count"], 3)
+
+    def test_snapshot_round_trip(self):
+        snapshot = analytics.refresh_snapshot()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "analytics.snapshot")
+            snapshot.save(path)
+            loaded = analytics.Snapshot.load(path)
+            self.assertEqual(loaded.fingerprint(), snapshot.fingerprint())
+            self.assertEqual(loaded.market(state="MA"), snapshot.market(state="MA"))
+            del loaded
+
+    @mock.patch.object(analytics, "COMPACT_AFTER", 2)
+    def test_writes_are_merged_once_and_compacted_into_the_base(self):
+        snapshot = analytics.refresh_snapshot()
+        self.assertIs(snapshot.columns, snapshot.columns)
+        self.large.price = 550000
+        self.large.save()
+        merged = snapshot.columns
+        self.assertIs(snapshot.columns, merged)
+        self.assertEqual(len(snapshot.overlay), 1)
+
+        newest = make_listing(self.realtor, sqft=1200, price=300000)
+        self.small.delete()
+        # compacted by the read that merges them
+        self.assertEqual(
+            snapshot.columns["id"].tolist(), [self.large.pk, self.other.pk, newest.pk]
+        )
+        self.assertEqual(snapshot.overlay, {})
+        self.assertEqual(snapshot.base["id"].tolist(), [self.large.pk, self.other.pk, newest.pk])
+        self.assertEqual(snapshot.base["price"].tolist(), [550000, 260000, 300000])
+        self.other.delete()
+        self.assertEqual(snapshot.columns["id"].tolist(), [self.large.pk, newest.pk])
+
+    def test_refresh_catches_up_with_writes_that_skip_the_signals(self):
+        analytics.refresh_snapshot()
+        updated_at = self.large.updated_at + datetime.timedelta(seconds=1)
+        Listing.objects.filter(pk=self.large.pk).update(price=900000, updated_at=updated_at)
+        snapshot = analytics.refresh_snapshot()
+        self.assertEqual(sorted(snapshot.columns["price"].tolist()), [200000, 260000, 900000])
+        self.assertEqual(snapshot.fingerprint()[2], updated_at.timestamp())
+
+
+class RealtorStatsTests(FreshCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.realtor = make_realtor()
+        self.other = make_realtor(email="other@example.com")
+        self.listings = [make_listing(self.realtor, price=price) for price in (100, 200, 300)]
+        realtor_stats.recount()
+
+    def stats(self, realtor):
+        return RealtorStats.objects.get(pk=realtor.pk)
+
+    def test_writes_move_counts_and_flag_the_median(self):
+        newest = make_listing(self.realtor, price=1000)
+        stats = self.stats(self.realtor)
+        self.assertEqual(stats.listing_count, 4)
+        self.assertEqual(stats.latest_listing_ids[0], newest.pk)
+        self.assertEqual((stats.median_price, stats.median_stale), (200, True))
+        self.assertEqual(realtor_stats.recount(), [self.realtor.pk])
+        stats = self.stats(self.realtor)
+        self.assertEqual((stats.median_price, stats.median_stale), (250, False))
+        self.assertEqual(realtor_stats.recount(), [])
+
+    def test_moves_and_deletes(self):
+        self.listings[0].realtor = self.other
+        self.listings[0].save()
+        self.listings[1].delete()
+        self.assertEqual(self.stats(self.realtor).listing_count, 1)
+        self.assertEqual(self.stats(self.other).listing_count, 1)
+        self.assertEqual(self.stats(self.other).latest_listing_ids, [self.listings[0].pk])
+        realtor_stats.recount()
+        self.assertEqual(self.stats(self.realtor).median_price, 300)
+        self.assertEqual(self.stats(self.other).median_price, 100)
+
+    def test_saves_that_keep_the_price_leave_the_median_alone(self):
+        self.listings[0].title = "Renamed"
+        self.listings[0].save()
+        self.assertFalse(self.stats(self.realtor).median_stale)
+
+    def test_summaries_follow_listing_and_realtor_writes(self):
+        listing = self.listings[0]
+        listing.title, listing.price = "Pool House", 150
+        listing.save()
+        self.realtor.name = "Jenny Johnson"
+        self.realtor.save()
+        self.listings[1].delete()
+        cards = ListingSummary.objects.filter(realtor=self.realtor).order_by("listing")
+        self.assertEqual(
+            list(cards.values_list("listing", "title", "price", "realtor_name")),
+            [
+                (listing.pk, "Pool House", 150, "Jenny Johnson"),
+                (self.listings[2].pk, "Family Home", 300, "Jenny Johnson"),
+            ],
+        )
+        # writes that skip the signals are caught up by a rebuild
+        Listing.objects.filter(pk=listing.pk).update(title="Garden Flat")
+        ListingSummary.objects.filter(pk=self.listings[2].pk).delete()
+        self.assertEqual(summaries.rebuild(batch_size=1), 2)
+        self.assertEqual(
+            list(cards.values_list("title", flat=True)), ["Garden Flat", "Family Home"]
+        )
+
+
+class SearchIndexTests(FreshCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        reset_index()
+        self.addCleanup(reset_index)
+        self.realtor = make_realtor()
+        self.garage = make_listing(self.realtor, title="Garage Loft", state="MA")
+        self.garden = make_listing(self.realtor, title="Garden Flat", state="CA")
+
+    def search(self, index, **data):
+        return index.search(normalize_params(data))
+
+    def test_keywords_match_prefixes_like_the_database(self):
+        index = refresh_index()
+        self.assertEqual(self.search(index, keywords="gar"), [self.garden.pk, self.garage.pk])
+        self.assertEqual(self.search(index, keywords="gara"), [self.garage.pk])
+        self.assertEqual(self.search(index, keywords="gar", state="CA"), [self.garden.pk])
+        # facet terms aren't keywords
+        self.assertEqual(self.search(index, keywords="state"), [])
+
+    def test_snapshot_round_trip(self):
+        index = InvertedIndex.build()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.snapshot")
+            index.save(path)
+            loaded = InvertedIndex.load(path)
+        self.assertEqual(loaded.fingerprint(), index.fingerprint())
+        self.assertEqual(loaded.terms, index.terms)
+        self.assertEqual(self.search(loaded, keywords="gar"), self.search(index, keywords="gar"))
+        loaded.remove(self.garage.pk)
+        self.assertEqual(self.search(loaded, keywords="gar"), [self.garden.pk])
+
+    def test_refresh_catches_up_with_writes_that_skip_the_signals(self):
+        refresh_index()
+        Listing.objects.bulk_create([Listing(
+            realtor=self.realtor, title="Garret Studio", address="2 Main St", city="Boston",
+            state="MA", zipcode="02101", description="Top floor", price=1, bedrooms=1,
+            bathrooms=1, garage=0, sqft=1, lot_size=0,
+        )])
+        studio = Listing.objects.get(title="Garret Studio")
+        Listing.objects.filter(pk=self.garage.pk).update(title="Attic Loft", updated_at=studio.updated_at)
+        index = refresh_index()
+        self.assertEqual(self.search(index, keywords="gar"), [studio.pk, self.garden.pk])
+
+    def test_refresh_rebuilds_after_deletes_elsewhere(self):
+        refresh_index()
+        # as another process would, unseen by this one's signals
+        with mock.patch("listings.search_index.loaded_index", return_value=None):
+            self.garden.delete()
+        index = refresh_index()
+        self.assertEqual(self.search(index, keywords="gar"), [self.garage.pk])
+
+
+class TwoTierCacheTests(FreshCacheTestCase):
+
+    def test_threads_share_the_local_tier_and_counters(self):
+        fragments = caches["fragments"]
+        fragments.set("greeting", "hello")
+        other = []
+        thread = threading.Thread(target=lambda: other.append(caches["fragments"]))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], fragments)
+        # gone from the shared tier, so only the local one can answer
+        caches["default"].delete(fragments.make_key("greeting"))
+        self.assertEqual(other[0].get("greeting"), "hello")
+        self.assertEqual(fragments.stats()["local_hits"], other[0].stats()["local_hits"])
+
+    def test_failed_render_releases_the_lock(self):
+        template = Template(
+            '{% load fragment_cache %}{% cache None boom using="fragments" %}{{ explode }}{% endcache %}'
+        )
+
+        def explode():
+            raise RuntimeError("render failed")
+
+        with self.assertRaises(RuntimeError):
+            template.render(Context({"explode": explode}))
+        lock = "lock:" + caches["fragments"].make_key(make_template_fragment_key("boom"))
+        self.assertIsNone(caches["default"].get(lock))
+        self.assertEqual(template.render(Context({"explode": "ok"})), "ok")
+
+    def test_file_cache_counts_its_files_every_cull_every_sets(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FileCache(directory, {"OPTIONS": {"MAX_ENTRIES": 4, "CULL_EVERY": 5}})
+            with mock.patch.object(cache, "_list_cache_files", wraps=cache._list_cache_files) as listed:
+                for number in range(10):
+                    cache.set(f"key{number}", number)
+            self.assertEqual(listed.call_count, 2)
+            self.assertLess(len(cache._list_cache_files()), 10)
+
+    def test_listing_save_invalidates_its_cached_page(self):
+        listing = make_listing(make_realtor(), title="Before Title")
+        url = reverse("listing", args=[listing.pk])
+        self.assertContains(self.client.get(url), "Before Title")
+        listing.title = "After Title"
+        listing.save()
+        response = self.client.get(url)
+        self.assertContains(response, "After Title")
+        self.assertNotContains(response, "Before Title")
+
+    def test_cards_stay_cached_until_their_versions_move(self):
+        listing = make_listing(make_realtor(), title="Before Title")
+        template = Template(
+            "{% load listing_cards %}{% for listing in listings|with_card_versions %}"
+            '{% include "partials/__listing_card.html" %}{% endfor %}'
+        )
+
+        def render():
+            return template.render(Context({"listings": ListingSummary.objects.all()}))
+
+        self.assertIn("Before Title", render())
+        # behind the signals' back, so only a version bump shows it
+        ListingSummary.objects.update(title="After Title")
+        self.assertIn("Before Title", render())
+        bump_object_version("listing", listing.pk)
+        self.assertIn("After Title", render())
+        ListingSummary.objects.update(realtor_name="Jenny Johnson")
+        self.assertNotIn("Jenny Johnson", render())
+        bump_object_version("realtor", listing.realtor_id)
+        self.assertIn("Jenny Johnson", render())
+
+    def test_unchanged_pages_answer_not_modified(self):
+        listing = make_listing(make_realtor())
+        # the listing page's validators are one narrow lookup, the browse
+        # page's come from the cache
+        for url, queries in ((reverse("listing", args=[listing.pk]), 1), (reverse("listings"), 0)):
+            with self.subTest(url):
+                response = self.client.get(url)
+                etag, modified = response["ETag"], response["Last-Modified"]
+                with self.assertNumQueries(queries):
+                    not_modified = self.client.get(url, headers={"if-none-match": etag})
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(
+                    self.client.get(url, headers={"if-modified-since": modified}).status_code, 304
+                )
+                listing.realtor.name = "Jenny Johnson"
+                listing.realtor.save()
+                response = self.client.get(url, headers={"if-none-match": etag})
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], etag)
+
+
+class AlertTests(FreshCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.realtor = make_realtor()
+        make_listing(self.realtor, title="Old Pool House")
+        self.user = User.objects.create_user("buyer", "buyer@example.com", "password")
+        params = normalize_params({"keywords": "pool", "state": "MA"})
+        # a run late enough for every listing of the test to have settled
+        self.settled = timezone.now() + alerts.SETTLE_TIME + datetime.timedelta(minutes=1)
+        self.search = SavedSearch.objects.create(
+            user=self.user, name="Pools", params=params, key=canonical_key(params),
+            last_listing_id=alerts.newest_listing_id(self.settled),
+        )
+
+    def test_new_matching_listings_are_queued_once(self):
+        pool = make_listing(self.realtor, title="Pool Cottage")
+        make_listing(self.realtor, title="Garden Flat")
+        make_listing(self.realtor, title="Pool Villa", state="CA")
+        self.assertEqual(alerts.run(now=self.settled), (3, 1, 1))
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.to, "buyer@example.com")
+        self.assertIn("Pool Cottage", email.body)
+        self.assertNotIn("Old Pool House", email.body)
+        self.assertNotIn("Garden Flat", email.body)
+        self.assertNotIn("Pool Villa", email.body)
+        self.search.refresh_from_db()
+        self.assertEqual(self.search.last_listing_id, pool.pk + 2)
+        self.assertIsNotNone(self.search.last_notified)
+
+        self.assertEqual(alerts.run(now=self.settled), (0, 0, 0))
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    def test_watermarks_move_without_matches(self):
+        garden = make_listing(self.realtor, title="Garden Flat")
+        self.assertEqual(alerts.run(now=self.settled), (1, 0, 0))
+        self.assertFalse(OutboundEmail.objects.exists())
+        self.search.refresh_from_db()
+        self.assertEqual(self.search.last_listing_id, garden.pk)
+        self.assertIsNone(self.search.last_notified)
+
+    def test_a_failed_enqueue_keeps_the_watermarks(self):
+        make_listing(self.realtor, title="Pool Cottage")
+        with mock.patch("listings.outbox.enqueue_many", side_effect=RuntimeError("full")):
+            with self.assertRaises(RuntimeError):
+                alerts.run(now=self.settled)
+        self.search.refresh_from_db()
+        self.assertLess(self.search.last_listing_id, alerts.newest_listing_id(self.settled))
+        self.assertEqual(alerts.run(now=self.settled), (1, 1, 1))
+
+    def test_a_lower_id_committed_late_is_not_skipped(self):
+        # the insert of "late" got its id first but is still uncommitted
+        late = make_listing(self.realtor, title="Pool Cottage")
+        late_pk = late.pk
+        late.delete()
+        early = make_listing(self.realtor, title="Pool Villa")
+        self.assertEqual(alerts.run(), (0, 0, 0))
+        self.search.refresh_from_db()
+        self.assertLess(self.search.last_listing_id, late_pk)
+
+        make_listing(self.realtor, pk=late_pk, title="Pool Cottage")
+        # as listed when it was inserted
+        Listing.objects.filter(pk=late_pk).update(list_date=late.list_date)
+        self.assertEqual(alerts.run(now=self.settled), (2, 1, 1))
+        email = OutboundEmail.objects.get()
+        self.assertIn("Pool Cottage", email.body)
+        self.assertIn("Pool Villa", email.body)
+        self.search.refresh_from_db()
+        self.assertEqual(self.search.last_listing_id, early.pk)
+
+
+class ImageTests(FreshCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for name, color in (("photos/house.jpg", "red"), ("photos/house.png", "blue")):
+            path = os.path.join(media.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            Image.new("RGB", (400, 300), color).save(path)
+        self.listing = make_listing(make_realtor())
+        self.photo = ListingPhoto.objects.create(listing=self.listing, image="photos/house.jpg")
+
+    def picture(self, image):
+        return Template("{% load listing_images %}{% picture image %}").render(Context({"image": image}))
+
+    def test_the_cover_follows_the_first_gallery_photo(self):
+        def cover():
+            summary = ListingSummary.objects.get(pk=self.listing.pk)
+            return Listing.objects.get(pk=self.listing.pk).photo_main.name, summary.photo_main.name
+
+        self.assertEqual(cover(), ("photos/house.jpg", "photos/house.jpg"))
+        self.assertEqual((self.photo.width, self.photo.height), (400, 300))
+        first = ListingPhoto.objects.create(listing=self.listing, image="photos/house.png")
+        self.photo.position = 1
+        self.photo.save()
+        self.assertEqual(cover(), ("photos/house.png", "photos/house.png"))
+        first.delete()
+        self.assertEqual(cover(), ("photos/house.jpg", "photos/house.jpg"))
+        ListingPhoto.objects.get(pk=self.photo.pk).delete()
+        self.assertEqual(cover(), ("", ""))
+
+    def test_extensions_get_their_own_variants(self):
+        self.assertNotEqual(
+            images.variant_name("photos/house.jpg", 320, "jpeg"),
+            images.variant_name("photos/house.png", 320, "jpeg"),
+        )
+
+    def test_rendering_reads_the_recorded_variants_not_the_storage(self):
+        summary = ListingSummary.objects.get(pk=self.listing.pk)
+        with mock.patch.object(images.default_storage, "exists") as exists:
+            self.assertNotIn("<picture>", self.picture(summary.photo_main))
+            rows = [
+                (ListingPhoto, "image", [self.photo.pk]),
+                (Listing, "photo_main", [self.listing.pk]),
+                (ListingSummary, "photo_main", [self.listing.pk]),
+            ]
+            exists.return_value = False
+            self.assertEqual(images.derive("photos/missing.jpg", rows), 0)
+            self.assertEqual(images.derive("photos/house.jpg", rows), 3)
+            summary.refresh_from_db()
+            exists.reset_mock()
+            html = self.picture(summary.photo_main)
+            exists.assert_not_called()
+        self.assertIn("<picture>", html)
+        self.assertIn(images.variant_name("photos/house.jpg", 320, "jpeg"), html)
+        self.listing.refresh_from_db()
+        self.assertEqual(images.variant_formats(self.listing.photo_main), list(images.FORMATS))
+
+    def test_only_saves_of_another_file_are_derived(self):
+        self.photo.image_variants = "jpeg"
+        self.photo.save()
+        with mock.patch.object(images, "schedule") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                photo = ListingPhoto.objects.get(pk=self.photo.pk)
+                photo.position = 2
+                photo.save()
+            schedule.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                photo.image = "photos/house.png"
+                photo.save(update_fields=["image"])
+        [(derived, _)] = schedule.call_args.args[0]
+        self.assertEqual(derived, "photos/house.png")
+        photo.refresh_from_db()
+        self.assertEqual(photo.image_variants, "")
+
+    def test_backfill_records_every_row_showing_a_file(self):
+        other = make_listing(make_realtor(), photo_main="photos/house.jpg")
+        changed = images.record_derived({"photos/house.jpg"})
+        self.assertEqual(changed, {("listing", self.listing.pk), ("listing", other.pk)})
+        self.assertEqual(
+            images.variant_formats(ListingSummary.objects.get(pk=other.pk).photo_main),
+            list(images.FORMATS),
+        )
+        self.assertTrue(images.has_variants(ListingPhoto.objects.get(pk=self.photo.pk).image))
+        self.assertEqual(images.record_derived({"photos/house.jpg"}), set())
+
+    def test_backfill_binds_only_each_chunks_names(self):
+        names = {f"photos/unused-{number}.jpg" for number in range(2000)} | {"photos/house.jpg"}
+        with CaptureQueriesContext(connection) as queries:
+            images.record_derived(names, chunk_size=10)
+        updates = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertTrue(updates)
+        self.assertTrue(all("unused" not in sql for sql in updates))
+
+
+class PhotoMigrationTests(TransactionTestCase):
+    """0012 moves the gallery columns into ListingPhoto rows, batch by batch."""
+
+    before = [("listings", "0011_listingphoto")]
+    after = [("listings", "0012_move_listing_photos")]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        self.addCleanup(self.migrate_to_latest)
+        self.apps = executor.loader.project_state(self.before).apps
+
+    def migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_gallery_columns_become_ordered_photos(self):
+        Realtor = self.apps.get_model("listings", "Realtor")
+        Listing = self.apps.get_model("listings", "Listing")
+        realtor = Realtor.objects.create(name="Kyle Brown", photo="realtors/kyle.jpg")
+        fields = {
+            "realtor": realtor, "title": "Family Home", "address": "1 Main St", "city": "Boston",
+            "state": "MA", "zipcode": "02101", "price": 300000, "bedrooms": 3, "bathrooms": 2,
+            "garage": 1, "sqft": 1500, "lot_size": 0.25,
+        }
+        full = Listing.objects.create(
+            photo_main="photos/a.jpg", photo_1="photos/b.jpg", photo_3="photos/c.jpg", **fields
+        )
+        bare = Listing.objects.create(photo_main="", **fields)
+        cover_only = Listing.objects.create(photo_main="photos/d.jpg", **fields)
+
+        migration = importlib.import_module("listings.migrations.0012_move_listing_photos")
+        with mock.patch.object(migration, "BATCH_SIZE", 2):
+            executor = MigrationExecutor(connection)
+            executor.migrate(self.after)
+        ListingPhoto = executor.loader.project_state(self.after).apps.get_model("listings", "ListingPhoto")
+        self.assertEqual(
+            list(ListingPhoto.objects.order_by("listing_id", "position").values_list(
+                "listing_id", "image", "position", "width"
+            )),
+            [
+                (full.pk, "photos/a.jpg", 0, None),
+                (full.pk, "photos/b.jpg", 1, None),
+                (full.pk, "photos/c.jpg", 2, None),
+                (cover_only.pk, "photos/d.jpg", 0, None),
+            ],
+        )
+        self.assertFalse(ListingPhoto.objects.filter(listing_id=bare.pk).exists())
+
+
+class OutboxTests(FreshCacheTestCase):
+
+    def enqueue(self, count):
+        return outbox.enqueue_many(
+            (f"Subject {number}", "Body", "from@example.com", [f"to{number}@example.com"])
+            for number in range(count)
+        )
+
+    def test_due_emails_are_delivered_over_one_connection(self):
+        self.enqueue(3)
+        self.assertEqual(outbox.deliver_due(batch_size=2), (2, 0, 0))
+        self.assertEqual(outbox.deliver_due(batch_size=2), (1, 0, 0))
+        self.assertEqual(outbox.deliver_due(), (0, 0, 0))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [
+            "to0@example.com", "to1@example.com", "to2@example.com",
+        ])
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.SENT).exists())
+
+    def test_claimed_emails_are_hidden_until_the_lease_runs_out(self):
+        self.enqueue(2)
+        self.assertEqual(len(outbox.claim(10)), 2)
+        self.assertEqual(outbox.claim(10), [])
+        later = timezone.now() + outbox.LEASE + datetime.timedelta(seconds=1)
+        self.assertEqual(len(outbox.claim(10, now=later)), 2)
+
+    def test_failures_back_off_then_give_up(self):
+        [email] = self.enqueue(1)
+        refused = mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=OSError("refused"),
+        )
+        with refused:
+            before = timezone.now()
+            self.assertEqual(outbox.deliver_due(max_attempts=2), (0, 1, 0))
+            email.refresh_from_db()
+            self.assertEqual(
+                (email.status, email.attempts, email.claimed_by), (OutboundEmail.PENDING, 1, "")
+            )
+            self.assertIn("refused", email.last_error)
+            self.assertGreaterEqual(email.next_attempt_at, before + outbox.backoff(1))
+            # not due yet
+            self.assertEqual(outbox.deliver_due(max_attempts=2), (0, 0, 0))
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(outbox.deliver_due(max_attempts=2), (0, 0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.FAILED)
+        self.assertEqual(mail.outbox, [])
+
+    def test_backoff_doubles_up_to_the_maximum(self):
+        self.assertEqual(outbox.backoff(1), outbox.BACKOFF_BASE)
+        self.assertEqual(outbox.backoff(3), outbox.BACKOFF_BASE * 4)
+        self.assertEqual(outbox.backoff(30), outbox.BACKOFF_MAX)
+
+
+class KeysetPaginationTests(FreshCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        realtor = make_realtor()
+        start = timezone.now()
+        for number in range(7):
+            make_listing(realtor, title=f"Home {number}")
+        # pairs sharing a list_date, the id breaks the tie
+        for listing in Listing.objects.all():
+            Listing.objects.filter(pk=listing.pk).update(
+                list_date=start - datetime.timedelta(days=listing.pk // 2)
+            )
+        self.newest_first = list(
+            Listing.objects.order_by("-list_date", "-id").values_list("id", flat=True)
+        )
+
+    def test_pages_walk_every_row_once_in_both_directions(self):
+        pages = [keyset_page(Listing.objects.all(), per_page=3)]
+        while pages[-1].has_next:
+            pages.append(keyset_page(Listing.objects.all(), after=pages[-1].next_cursor, per_page=3))
+        self.assertEqual([[row.pk for row in page] for page in pages], [
+            self.newest_first[:3], self.newest_first[3:6], self.newest_first[6:],
+        ])
+        self.assertFalse(pages[0].has_previous)
+        self.assertTrue(pages[-1].has_previous)
+
+        back = keyset_page(Listing.objects.all(), before=pages[-1].previous_cursor, per_page=3)
+        self.assertEqual([row.pk for row in back], self.newest_first[3:6])
+        self.assertTrue(back.has_previous and back.has_next)
+        first = keyset_page(Listing.objects.all(), before=back.previous_cursor, per_page=3)
+        self.assertEqual([row.pk for row in first], self.newest_first[:3])
+        self.assertFalse(first.has_previous)
+
+    def test_async_pages_match(self):
+        page = keyset_page(Listing.objects.all(), per_page=4)
+        apage = async_to_sync(akeyset_page)(Listing.objects.all(), after=page.next_cursor, per_page=4)
+        self.assertEqual([row.pk for row in apage], self.newest_first[4:])
+
+    def test_api_projects_fields_pages_by_cursor_and_streams(self):
+        url = reverse("api_listings")
+        # city is not a card field, so these pages read Listing itself
+        body = self.client.get(url, {"fields": "id,city", "per_page": 4}).json()
+        self.assertEqual(body["results"], [{"id": pk, "city": "Boston"} for pk in self.newest_first[:4]])
+        self.assertIsNone(body["previous"])
+        body = self.client.get(url, {"fields": "id,city", "per_page": 4, "after": body["next"]}).json()
+        self.assertEqual([row["id"] for row in body["results"]], self.newest_first[4:])
+        self.assertIsNone(body["next"])
+        self.assertIsNotNone(body["previous"])
+        self.assertEqual(self.client.get(url, {"fields": "id,password"}).status_code, 400)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"fields": "id,title", "format": "ndjson"})
+            lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [{"id": pk, "title": title} for pk, title in Listing.objects.order_by("pk").values_list("id", "title")],
+        )
+        # card fields only: the summaries, without the realtor join
+        [sql] = [query["sql"] for query in queries if "listings_" in query["sql"]]
+        self.assertIn("listings_listingsummary", sql)
+        self.assertNotIn("listings_realtor", sql)
+
+    def test_tampered_cursors_start_over(self):
+        self.assertIsNone(decode_cursor("not-a-cursor"))
+        page = keyset_page(Listing.objects.all(), after="not-a-cursor", per_page=3)
+        self.assertEqual([row.pk for row in page], self.newest_first[:3])
+
+
+class SearchLogTests(FreshCacheTestCase):
+
+    def record(self, params, source="database"):
+        record = logging.LogRecord("listings.search", logging.INFO, __file__, 0, "search", None, None)
+        record.data = {"params": params, "page": 1, "results": 3, "source": source, "ms": 1.5}
+        return record
+
+    def log(self, params, source="database", days_ago=0):
+        return SearchLog.objects.create(
+            key=canonical_key(params), params=params, results=3, source=source, duration_ms=1.5,
+            searched_at=timezone.now() - datetime.timedelta(days=days_ago),
+        )
+
+    def test_records_are_json_lines_and_sampled_below_warning(self):
+        record = self.record({"state": "MA"})
+        record.created = 0
+        self.assertEqual(json.loads(JsonFormatter().format(record)), {
+            "time": "1970-01-01T00:00:00+00:00", "level": "INFO", "logger": "listings.search",
+            "message": "search", "params": {"state": "MA"}, "page": 1, "results": 3,
+            "source": "database", "ms": 1.5,
+        })
+        sampled = SampledFilter("0.25")
+        warning = logging.LogRecord("listings.search", logging.WARNING, __file__, 0, "slow", None, None)
+        with mock.patch("listings.logs.random.random", return_value=0.5):
+            self.assertFalse(sampled.filter(record))
+            self.assertTrue(sampled.filter(warning))
+            self.assertTrue(SampledFilter("1.0").filter(record))
+        with mock.patch("listings.logs.random.random", return_value=0.1):
+            self.assertTrue(sampled.filter(record))
+
+    def test_searches_are_written_in_batches(self):
+        handler = SearchLogHandler(capacity=3, interval=60)
+        self.addCleanup(handler.close)
+        handler.handle(self.record({"state": "MA"}))
+        # not a search record, buffered but not written
+        handler.handle(logging.LogRecord("listings.search", logging.INFO, __file__, 0, "x", None, None))
+        self.assertFalse(SearchLog.objects.exists())
+        handler.handle(self.record({"state": "CA"}, source="cache"))
+        self.assertEqual(
+            sorted(SearchLog.objects.values_list("key", "source")),
+            sorted([
+                (canonical_key({"state": "MA"}), "database"),
+                (canonical_key({"state": "CA"}), "cache"),
+            ]),
+        )
+
+    def test_a_locked_database_is_retried_on_a_new_connection(self):
+        handler = SearchLogHandler(capacity=1)
+        self.addCleanup(handler.close)
+        locked = mock.patch.object(
+            SearchLog.objects, "bulk_create",
+            side_effect=[OperationalError("database table is locked"), []],
+        )
+        with (
+            locked as insert,
+            mock.patch("listings.search_log.connection") as db,
+            mock.patch("listings.search_log.time.sleep"),
+            mock.patch.object(handler, "handleError") as handle_error,
+        ):
+            handler.handle(self.record({"state": "MA"}))
+        self.assertEqual(insert.call_count, 2)
+        db.close.assert_called_once()
+        handle_error.assert_not_called()
+
+    def test_aggregate_searches_ranks_warms_and_prunes(self):
+        popular, rare = {"state": "MA"}, {"state": "CA"}
+        for source in ("cache", "database", "database"):
+            self.log(popular, source)
+        self.log(rare)
+        self.log(rare, days_ago=100)
+        out = io.StringIO()
+        call_command("aggregate_searches", top=1, stdout=out)
+        output = out.getvalue()
+        self.assertIn("4 searches in the last 7 days, 1 distinct in the top 1 cover 75.0%", output)
+        self.assertIn("result cache hit ratio: 25.0% (1 of 4)", output)
+        self.assertIn("deleted 1 log rows older than 90 days", output)
+        self.assertIsNotNone(search_cache.cached_entry(popular))
+        self.assertIsNone(search_cache.cached_entry(rare))
+        self.assertEqual(SearchLog.objects.count(), 4)
@@ -1,9 +1,19 @@
-from django.urls import path
+from django.urls import include, path
 from . import views
 
 urlpatterns = [
     path("listings/", views.listings, name="listings"),
     path("listing/<int:listing_id>/", views.listing, name="listing"),
     path("contact/<int:listing_id>", views.contact, name="contact"),
+    path("realtors/", views.realtors, name="realtors"),
+    path("realtor/<int:realtor_id>/", views.realtor, name="realtor"),
+    path(
+        "listing/<int:listing_id>/comparables/",
+        views.listing_comparables,
+        name="listing_comparables",
+    ),
+    path("market-stats/", views.market_stats, name="market_stats"),
+    path("cache-stats/", views.cache_stats, name="cache_stats"),
+    path("api/", include("listings.api.urls")),
     
 ]
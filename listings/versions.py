@@ -0,0 +1,75 @@
+"""
+Version numbers shared through the default (shared) cache backend.
+
+* the "listings generation" is bumped by the Listing/Realtor signals on every
+  write; anything derived from the whole table (facet counts, cached result
+  lists, the homepage) puts it in its cache key, so a write invalidates all
+  of it at once without tracking individual keys;
+* per-object versions (``listing:<id>``, ``realtor:<id>``) are bumped only
+  when that row changes, for fragments that depend on a single row.
+"""
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+
+
+GENERATION_KEY = "listings:generation"
+
+
+def _fresh_generation():
+    # never reuse a number handed out before the key was evicted
+    return time.time_ns() // 1000
+
+
+def listings_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, _fresh_generation(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_listings_generation():
+    # the generation is the microsecond timestamp of the last write, so it
+    # doubles as Last-Modified of pages derived from the whole table
+    generation = max(_fresh_generation(), (cache.get(GENERATION_KEY) or 0) + 1)
+    cache.set(GENERATION_KEY, generation, None)
+    return generation
+
+
+def generation_modified(generation):
+    return datetime.fromtimestamp(generation / 1_000_000, tz=timezone.utc)
+
+
+def _object_key(kind, pk):
+    return f"{kind}:{pk}:version"
+
+
+def object_versions(*objects):
+    """
+    Current versions of ``(kind, pk)`` pairs, in one cache round trip.
+    Unknown objects get a fresh version so they never match a stale key.
+    """
+    keys = [_object_key(kind, pk) for kind, pk in objects]
+    found = cache.get_many(keys)
+    missing = {key: _fresh_generation() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump_object_version(kind, pk):
+    key = _object_key(kind, pk)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _fresh_generation()
+        cache.set(key, version, None)
+        return version
+
+
+def forget_object_versions(objects):
+    """Invalidate ``(kind, pk)`` pairs in one round trip: the next read hands out fresh versions."""
+    cache.delete_many([_object_key(kind, pk) for kind, pk in objects])
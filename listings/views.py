@@ -1,22 +1,86 @@
 import datetime
-from pprint import pprint
-from django.shortcuts import redirect, render
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, redirect, render
 from django.contrib import messages
 from .models import *
+from . import analytics, outbox
+from .conditional import (
+    acondition,
+    listing_etag,
+    listing_last_modified,
+    listings_etag,
+    listings_last_modified,
+)
+from .pagination import akeyset_page, apage
+from .versions import listings_generation, object_versions
 from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+from django.db import transaction
+from django.http import Http404, JsonResponse
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import condition
 
-from django.core.mail import send_mail
 # Create your views here.
-def listings(request):
-    listings = Listing.objects.all()
-    return render(
+# The browse, detail and contact views are async: the ORM calls go through
+# the async ORM and rendering (which may touch the session, the user and the
+# lazy objects of cached fragments) runs in a worker thread, so under ASGI a
+# process isn't held by a slow client or a slow query.
+@acondition(etag_func=listings_etag, last_modified_func=listings_last_modified)
+async def listings(request):
+    page = await akeyset_page(
+        ListingSummary.objects.all(),
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+    )
+    return await sync_to_async(render)(
         request,
         "listings/listings.html",
         {
-            "listings": listings,
+            "listings": page.object_list,
+            "page": page,
         }
     )
 
+
+REALTORS_PER_PAGE = 12
+
+
+@acondition(etag_func=listings_etag, last_modified_func=listings_last_modified)
+async def realtors(request):
+    page = await apage(
+        Realtor.objects.select_related("stats").defer("description").order_by("-is_mvp", "name", "id"),
+        request.GET.get("page", 1),
+        per_page=REALTORS_PER_PAGE,
+    )
+    # the newest cards of every realtor of the page in one primary key
+    # lookup, their ids are kept in RealtorStats (listings.realtor_stats)
+    latest = {
+        realtor.pk: realtor.stats.latest_listing_ids if hasattr(realtor, "stats") else []
+        for realtor in page.object_list
+    }
+    cards = await ListingSummary.objects.ain_bulk([pk for ids in latest.values() for pk in ids])
+    for realtor in page.object_list:
+        realtor.latest_listings = [cards[pk] for pk in latest[realtor.pk] if pk in cards]
+    return await sync_to_async(render)(
+        request, "listings/realtors.html", {"realtors": page.object_list, "page": page}
+    )
+
+
+@acondition(etag_func=listings_etag, last_modified_func=listings_last_modified)
+async def realtor(request, realtor_id):
+    realtor = await aget_object_or_404(Realtor.objects.select_related("stats"), pk=realtor_id)
+    page = await akeyset_page(
+        ListingSummary.objects.filter(realtor_id=realtor_id),
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+    )
+    return await sync_to_async(render)(
+        request,
+        "listings/realtor.html",
+        {"realtor": realtor, "listings": page.object_list, "page": page},
+    )
+
 # def contact(request, listing_id):
 #     listing = Listing.objects.get(pk=listing_id)
 #     if request.method == "POST":
@@ -60,62 +124,110 @@ def listings(request):
         
 
 
-def contact(request, listing_id):
+@sync_to_async
+def save_contact(**fields):
+    # the email is queued in the same transaction and sent by the
+    # send_outbox worker, the request doesn't wait on SMTP
+    with transaction.atomic():
+        contact = Contact.objects.create(**fields)
+        outbox.enqueue_contact(contact)
+    return contact
+
+
+async def contact(request, listing_id):
     if request.method == "POST":
-        contact_listing = Listing.objects.get(id=listing_id)
+        contact_listing = await aget_object_or_404(
+            Listing.objects.only("id", "title", "realtor_id"), id=listing_id
+        )
         name = request.POST.get("name","")
         message = request.POST.get("message","")
         phone = request.POST.get("phone","")
         email = request.POST.get("email","")
-        
-        if name and message and phone and email and contact_listing:
-            
-            
-            contact = Contact(
+
+        if name and message and phone and email:
+            await save_contact(
                 name=name,
                 message=message,
                 phone=phone,
                 email=email,
                 listing=contact_listing,
+                realtor_id=contact_listing.realtor_id,
             )
-            
-            if send_mail(
-                subject=f" contact about {contact_listing.title}",
-                message=f"Name: {name}\nPhone: {phone} \n{message}",
-                from_email=email,
-                recipient_list=[settings.EMAIL_HOST_USER],
-                auth_password=settings.EMAIL_HOST_PASSWORD,
-                fail_silently=False
-            ):
-                
-                messages.success(
-                    request,
-                    "email sent successfully!"
-                )
-                contact.save()
-                if contact:
-                    messages.success(request, "contact saved into db!")
-                    
-                else:
-                    messages.error(request, "contact not saved into db!")
-            else:
-                messages.error(
-                    request,
-                    "email not sent!"
-                )
-                  
+            messages.success(request, "Your message has been sent!")
+        else:
+            messages.error(request, "Please fill out all fields!")
+
     return redirect("listing", listing_id)
-        
-        
 
-        
-        
-        
-        
 
-def listing(request, listing_id):
-    listing = Listing.objects.get(pk=listing_id)
-    return render(request, "listings/listing.html", {
-        "listing": listing,
+@acondition(etag_func=listing_etag, last_modified_func=listing_last_modified)
+async def listing(request, listing_id):
+    fragments = caches["fragments"]
+    (listing_version,) = await sync_to_async(object_versions)(("listing", listing_id))
+    meta_key = f"listing:{listing_id}:{listing_version}:meta"
+    meta = await fragments.aget(meta_key)
+    if meta is None:
+        meta = await Listing.objects.filter(pk=listing_id).values("id", "title", "realtor_id").afirst()
+        # remember misses too, a new listing with this id bumps the version
+        await fragments.aset(meta_key, meta or False)
+    if not meta:
+        raise Http404("No listing matches the given query.")
+    (realtor_version,) = await sync_to_async(object_versions)(("realtor", meta["realtor_id"]))
+    generation = await sync_to_async(listings_generation)()
 
+    return await sync_to_async(render)(request, "listings/listing.html", {
+        # only loaded if one of the cached fragments has to be rendered
+        "listing": SimpleLazyObject(
+            lambda: Listing.objects.select_related("realtor").prefetch_related("photos").get(
+                pk=listing_id
+            )
+        ),
+        "meta": meta,
+        "listing_version": listing_version,
+        "realtor_version": realtor_version,
+        # depends on every listing, cached per generation, and not cached
+        # empty for good while the snapshot loads
+        "generation": generation,
+        "analytics_ready": analytics.get_snapshot() is not None,
+        "analytics": SimpleLazyObject(lambda: analytics.describe(listing_id) or {}),
     })
+
+
+def _analytics_loading():
+    response = JsonResponse({"error": "Price analytics are loading, retry shortly."}, status=503)
+    response["Retry-After"] = "5"
+    return response
+
+
+@condition(etag_func=listings_etag, last_modified_func=listings_last_modified)
+def listing_comparables(request, listing_id):
+    try:
+        k = min(max(int(request.GET.get("k", 5)), 1), 50)
+    except ValueError:
+        k = 5
+    if analytics.get_snapshot() is None:
+        return _analytics_loading()
+    result = analytics.describe(listing_id, k)
+    if result is None:
+        raise Http404("No listing matches the given query.")
+    return JsonResponse(result)
+
+
+@condition(etag_func=listings_etag, last_modified_func=listings_last_modified)
+def market_stats(request):
+    """Price per sqft distribution of ?city= and/or ?state=."""
+    snapshot = analytics.get_snapshot()
+    if snapshot is None:
+        return _analytics_loading()
+    market = snapshot.market(
+        city=request.GET.get("city", "").strip(), state=request.GET.get("state", "").strip()
+    )
+    if market is None:
+        raise Http404("No listings in that market.")
+    return JsonResponse(market)
+
+
+@staff_member_required
+def cache_stats(request):
+    """Hit/miss counters of this worker's fragment cache."""
+    return JsonResponse(caches["fragments"].stats())
@@ -1,3 +1,189 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from listings import instrumentation, search_cache, search_index
+from listings.models import Contact, ListingPhoto
+from listings.search import normalize_params
+from listings.tests import FreshCacheTestCase, make_listing, make_realtor
+
+from .views import search_query
+
+
+@override_settings(SEARCH_INDEX_ENABLED=True)
+class IndexSearchTests(FreshCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        search_index.reset_index()
+        self.addCleanup(search_index.reset_index)
+        realtor = make_realtor()
+        self.pool = make_listing(realtor, title="Pool House")
+        make_listing(realtor, title="Garden Flat")
+
+    def test_index_searches_off_the_event_loop(self):
+        index = search_index.refresh_index()
+        on_loop = []
+        search = index.search
+
+        def recording_search(params):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                on_loop.append(False)
+            else:
+                on_loop.append(True)
+            return search(params)
+
+        with mock.patch.object(index, "search", recording_search):
+            response = self.client.get(reverse("search"), {"keywords": "pool"})
+        self.assertEqual(on_loop, [False])
+        self.assertEqual([card.pk for card in response.context["searched_listings"]], [self.pool.pk])
+
+
+class SearchPageTests(FreshCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        realtor = make_realtor()
+        self.listings = [make_listing(realtor, title=f"Home {number}") for number in range(12)]
+
+    @mock.patch.object(search_cache, "MAX_CACHED_IDS", 3)
+    def test_pages_past_the_stored_ids_neither_count_nor_store_again(self):
+        url = f"{reverse('search')}?{search_query(normalize_params({'state': 'MA'}), 2)}"
+        with mock.patch.object(search_cache, "store", wraps=search_cache.store) as store:
+            first = self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                again = self.client.get(url)
+        store.assert_called_once()
+        self.assertFalse([query for query in queries if "COUNT(" in query["sql"]])
+        self.assertEqual(again.context["page"].paginator.count, 12)
+        self.assertEqual(
+            [card.pk for card in again.context["searched_listings"]],
+            [card.pk for card in first.context["searched_listings"]],
+        )
+        self.assertEqual(len(again.context["searched_listings"]), 3)
+
+    def test_searches_redirect_to_one_canonical_url(self):
+        canonical = f"{reverse('search')}?{search_query(normalize_params({'keywords': 'home', 'state': 'MA'}))}"
+        for query in ("?state=ma&keywords=Home", "?keywords=home&state=MA&page=1&city="):
+            with self.subTest(query):
+                self.assertRedirects(
+                    self.client.get(reverse("search") + query), canonical, fetch_redirect_response=False
+                )
+        self.assertRedirects(
+            self.client.post(reverse("search"), {"state": "MA", "keywords": "home"}),
+            canonical, fetch_redirect_response=False,
+        )
+
+    @override_settings(SEARCH_MAX_AGE=60)
+    def test_only_anonymous_search_pages_are_publicly_cacheable(self):
+        url = f"{reverse('search')}?{search_query(normalize_params({'state': 'MA'}))}"
+
+        def cache_control():
+            return set(self.client.get(url)["Cache-Control"].split(", "))
+
+        self.assertEqual(cache_control(), {"public", "max-age=60"})
+        self.client.force_login(User.objects.create_user("buyer", "buyer@example.com", "password"))
+        self.assertEqual(cache_control(), {"private", "max-age=60"})
+
+
+class BudgetTests(FreshCacheTestCase):
+    """Every budgeted page, cold and warm, on enough rows to show an N+1."""
+
+    def setUp(self):
+        super().setUp()
+        self.realtors = [
+            make_realtor(name=f"Realtor {number}", email=f"realtor{number}@example.com")
+            for number in range(3)
+        ]
+        self.listings = []
+        for number in range(12):
+            listing = make_listing(
+                self.realtors[number % 3], title=f"Pool Home {number}", state="CA", city="Fresno"
+            )
+            for position in range(3):
+                ListingPhoto.objects.create(
+                    listing=listing, image=f"photos/homes/home1_{position}.jpg", position=position
+                )
+            Contact.objects.create(
+                listing=listing, realtor_id=listing.realtor_id, name="Ann",
+                email="ann@example.com", phone="555", message="Visit?",
+            )
+            self.listings.append(listing)
+        self.user = User.objects.create_user("realtor0", "realtor0@example.com", "password")
+        self.realtors[0].user = self.user
+        self.realtors[0].save(update_fields=["user"])
+
+    def requests(self):
+        """URL name -> (url, query, logged in) of every budgeted page."""
+        listing, realtor = self.listings[0], self.realtors[0]
+        search = {"keywords": "pool", "state": "CA", "bedrooms": "1", "price": "900000"}
+        return {
+            "home": (reverse("home"), {}, False),
+            "listings": (reverse("listings"), {}, False),
+            "listing": (reverse("listing", args=[listing.pk]), {}, False),
+            # the canonical URL, others redirect to it
+            "search": (f"{reverse('search')}?{search_query(normalize_params(search))}", {}, False),
+            "realtors": (reverse("realtors"), {}, False),
+            "realtor": (reverse("realtor", args=[realtor.pk]), {}, False),
+            "inbox": (reverse("inbox"), {}, True),
+            "api_listings": (reverse("api_listings"), {}, False),
+            "api_listing": (reverse("api_listing", args=[listing.pk]), {}, False),
+            "api_search": (reverse("api_search"), search, False),
+        }
+
+    def get(self, name):
+        url, query, logged_in = self.requests()[name]
+        if logged_in:
+            self.client.force_login(self.user)
+        response = self.client.get(url, query)
+        self.assertEqual(response.status_code, 200, name)
+        return response
+
+    def test_every_budget_has_a_request(self):
+        self.assertEqual(set(self.requests()), set(settings.REQUEST_BUDGETS))
+
+    def test_pages_stay_within_their_budgets(self):
+        for name, budget in settings.REQUEST_BUDGETS.items():
+            with self.subTest(name):
+                for _ in ("cold", "warm"):
+                    self.assertEqual(self.get(name).metrics.over_budget(budget), [])
+
+    def test_only_staff_see_the_timings_the_log_always_gets(self):
+        for staff, debug in ((False, False), (True, False), (False, True)):
+            with self.subTest(staff=staff, debug=debug), override_settings(DEBUG=debug):
+                self.user.is_staff = staff
+                self.user.save()
+                self.client.force_login(self.user)
+                with self.assertLogs("listings.requests", "INFO") as logs:
+                    response = self.client.get(reverse("listings"))
+                self.assertEqual("Server-Timing" in response, staff or debug)
+                self.assertEqual(logs.records[0].data["queries"], response.metrics.queries)
+        self.client.logout()
+        self.assertNotIn("Server-Timing", self.client.get(reverse("listings")))
+        # under ASGI the user is resolved with auser()
+        self.async_client.force_login(self.user)
+        self.assertNotIn("Server-Timing", async_to_sync(self.async_client.get)(reverse("listings")))
+        self.user.is_staff = True
+        self.user.save()
+        self.assertIn("Server-Timing", async_to_sync(self.async_client.get)(reverse("listings")))
+
+    def test_a_lowered_budget_fails_the_request(self):
+        queries = self.get("listing").metrics.queries
+        self.clear_caches()
+        budgets = {
+            **settings.REQUEST_BUDGETS,
+            "listing": {**settings.REQUEST_BUDGETS["listing"], "queries": queries - 1},
+        }
+        with override_settings(REQUEST_BUDGETS=budgets):
+            with self.assertRaisesMessage(instrumentation.BudgetExceeded, f"{queries} queries >"):
+                self.get("listing")
@@ -1,88 +1,164 @@
-from pprint import pprint
-from django.shortcuts import render
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.shortcuts import redirect, render
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
 from listings.models import *
-from django.db.models import Q
+from listings.choices import radius_choices
+from listings import search_cache, search_index
+from listings.conditional import acondition, listings_etag, listings_last_modified
+from listings.pagination import PER_PAGE, apage
+from listings.facets import aggregate_facets, count_facets, dropdown_options, facets_for
+from listings.search import (
+    SPATIAL_PARAMS,
+    canonical_query,
+    match_listings,
+    normalize_params,
+    search_listings,
+)
+from listings.versions import listings_generation
+
+
+logger = logging.getLogger("listings.search")
+
 
+async def cards(ids):
+    """The ListingSummary card rows of ``ids``, in that order."""
+    rows = await ListingSummary.objects.ain_bulk(ids)
+    return [rows[pk] for pk in ids if pk in rows]
 
 
 # Create your views here.
-def index(request):
-    listings = Listing.objects.all()
-    return render(
+# index and search are async like the listings views, see listings.views
+async def index(request):
+    # lazy: only evaluated (in the render thread) when the cached "latest
+    # listings" fragment misses
+    listings = ListingSummary.objects.newest()[:3]
+    generation = await sync_to_async(listings_generation)()
+    return await sync_to_async(render)(
         request,
         "pages/index.html",
-        {"listings": listings.order_by("list_date")[:3]},
+        {"listings": listings, "generation": generation},
     )
 
 
-def search(request):
-    if request.method == "POST":
-        listings = Listing.objects.all()
-        searched_listings = listings
-        pprint(
-            request.POST
-        )
-        keywords = request.POST.get("keywords", "")
-        city = request.POST.get("city", "")
-        state = request.POST.get("state", "")
-        bedrooms = request.POST.get("bedrooms", "")
-        price = request.POST.get("price", "")
-        pprint(searched_listings)
-        
-        
-        if keywords:
-            # realtor = Realtor.objects.get(name__icontains=keywords)
-            # if realtor:
-            #     searched_listings.filter(realtor=realtor.id)
-            #     pprint(searched_listings)
-            
-            # pprint(realtor)
-            searched_listings = listings.filter(
-                Q(title__icontains=keywords) |
-                Q(description__icontains=keywords) |
-                Q(address__icontains=keywords) |
-                Q(realtor__name__icontains=keywords)
-            )
-        else:
-            messages.info(request, "no keyword added")
-        if city:
-            searched_listings = searched_listings.filter(city=city.lower())
-        else:
-            messages.info(request, "no city added")
-
-        if state:
-            searched_listings = searched_listings.filter(state=state.lower())
-            
-        else:
-            messages.info(request, "no state added")
-            
-
-        if bedrooms:
-            bedrooms = int(bedrooms)
-            searched_listings = searched_listings.filter(bedrooms=bedrooms)
-            
-        else:
-            messages.info(request, "no bedroom field given")
-            
-
-        if price:
-            price = float(price)
-            searched_listings = searched_listings.filter(price__lte=price)
-            
-        else:
-            messages.info(request, "no bedroom field given")
-        
-        pprint(searched_listings)
-        
-        return render(request, "pages/search.html" , {
-            "searched_listings": searched_listings,
-        })
+def search_query(params, page=1):
+    """The canonical query string of a search: sorted normalized fields, page 1 implied."""
+    query = canonical_query(params)
+    if page != 1:
+        query = f"{query}&page={page}" if query else f"page={page}"
+    return query
 
 
+@acondition(etag_func=listings_etag, last_modified_func=listings_last_modified)
+async def search(request):
+    # the form used to POST, keep old forms working
+    data = request.POST if request.method == "POST" else request.GET
+    params = normalize_params(data)
+    try:
+        page_number = max(int(data.get("page", 1)), 1)
+    except ValueError:
+        page_number = 1
+    if data.get("near") and "near" not in params:
+        messages.warning(request, "unknown zipcode, searching everywhere")
+    # one URL, and so one browser/proxy cache entry, per distinct search
+    query = search_query(params, page_number)
+    if request.method != "GET" or request.GET.urlencode() != query:
+        return redirect(f"{reverse('search')}?{query}" if query else reverse("search"))
 
+    started = time.perf_counter()
+    if "keywords" not in params:
+        messages.info(request, "no keyword added")
+    if "city" not in params:
+        messages.info(request, "no city added")
+    if "state" not in params:
+        messages.info(request, "no state added")
+    if "bedrooms" not in params:
+        messages.info(request, "no bedroom field given")
+    if "price" not in params:
+        messages.info(request, "no price field given")
 
+    # result ids are shared by the workers (listings.search_cache), popular
+    # searches are precomputed by the aggregate_searches command
+    entry = await sync_to_async(search_cache.cached_entry)(params)
+    page = None if entry is None else search_cache.entry_page(entry, page_number)
+    index = None
+    # the in-process index has no notion of location
+    if search_index.is_enabled() and not any(name in params for name in SPATIAL_PARAMS):
+        # None while this worker is still loading it
+        index = search_index.get_index()
+    if page is not None:
+        source = "cache"
+        facets = await sync_to_async(facets_for)(
+            params, lambda: aggregate_facets(match_listings(params))
+        )
+    elif index is not None:
+        # answer from the in-process index, then load only this page's rows;
+        # off the event loop, a broad search walks long postings lists. It
+        # touches no database connection, so it needn't wait for the thread
+        # the ORM calls share
+        ids = await sync_to_async(index.search, thread_sensitive=False)(params)
+        page = Paginator(ids, PER_PAGE).get_page(page_number)
+        source = "index"
+        facets = await sync_to_async(facets_for)(
+            params, lambda: count_facets(index.facet_rows(ids))
+        )
+    else:
+        # rank/filter on Listing once, the next pages read the stored ids
+        if entry is None:
+            entry = await sync_to_async(search_cache.store)(params)
+            page = search_cache.entry_page(entry, page_number)
+        if page is None:
+            # deeper than the stored ids: only this page's ids are queried,
+            # the entry already counted them all
+            results = search_listings(params)
+            if "radius" in params:
+                results = results.values_list("id", "distance")
+            else:
+                results = results.values_list("id", flat=True)
+            page = await apage(results, page_number, count=entry["total"])
+        source = "database"
+        facets = await sync_to_async(facets_for)(
+            params, lambda: aggregate_facets(match_listings(params))
+        )
+    # radius searches page over (id, distance) pairs
+    if "radius" in params:
+        distances = dict(page.object_list)
+    else:
+        distances = dict.fromkeys(page.object_list)
+    searched_listings = await cards(list(distances))
+    for card in searched_listings:
+        card.distance = distances[card.pk]
+    logger.info("search", extra={"data": {
+        "params": params,
+        "page": page.number,
+        "results": page.paginator.count,
+        "source": source,
+        "ms": round((time.perf_counter() - started) * 1000, 2),
+    }})
 
+    response = await sync_to_async(render)(request, "pages/search.html" , {
+        "searched_listings": searched_listings,
+        "page": page,
+        "query": canonical_query(params),
+        "facets": facets,
+        "options": dropdown_options(facets, params),
+        "params": params,
+        "radius_choices": radius_choices,
+    })
+    # shared caches may keep anonymous pages, a logged in user's page shows
+    # their name and stays in their browser
+    user = await request.auser()
+    if user.is_authenticated:
+        patch_cache_control(response, private=True, max_age=settings.SEARCH_MAX_AGE)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.SEARCH_MAX_AGE)
+    return response
 
 
 def about(request):